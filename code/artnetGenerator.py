@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Local Art-Net (ArtDmx) packet generator, stands in for the lighting desk / media server when testing off-device
+# Sends one packet per universe per frame at a fixed frame rate, with a moving test pattern and the record trigger
+# value in channel 512 of universe 0, optionally followed by an ArtSync per frame
+#   python3 ./code/artnetGenerator.py --universes 4 --rate 40 --duration 10
+#   python3 ./code/artnetGenerator.py --universes 16 --sync
+#   python3 ./code/artnetGenerator.py --host 192.168.1.50 --trigger 255
+
+import time
+import socket
+import struct
+import argparse
+
+ARTNET_PORT = 6454
+ARTDMX_HEADER = b'Art-Net\x00' + struct.pack('<H', 0x5000) + struct.pack('>H', 14)     # ID, OpDmx, protocol version 14
+ARTSYNC_PACKET = b'Art-Net\x00' + struct.pack('<H', 0x5200) + struct.pack('>H', 14) + b'\x00\x00'
+
+
+def artDmxPacket(universe:int, sequence:int, data):
+    # data: up to 512 DMX channel values, padded to an even length as the spec requires
+    data = bytes(data)
+    if len(data) % 2: data += b'\x00'
+    return ARTDMX_HEADER + struct.pack('<BBH', sequence, 0, universe) + struct.pack('>H', len(data)) + data
+
+
+class ArtnetGenerator:
+    def __init__(self, universeCount:int = 1, rate:float = 40.0, host:str = "127.0.0.1", port:int = ARTNET_PORT,
+                 triggerVal:int = 0, sync:bool = False):
+        self.universeCount = universeCount
+        self.rate = rate
+        self.address = (host, port)
+        self.triggerVal = triggerVal
+        self.sync = sync
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+        if host.endswith(".255"):
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        self.sequence = 0
+        self.frameCount = 0
+        self.packetCount = 0
+        self.frameTimes = []        # perf_counter() after each frame's last packet was sent
+        self.patterns = [bytes((i*7 + 3*universe) & 0xFF for i in range(512)) for universe in range(universeCount)]
+
+    def frameData(self, universe:int, frame:int):
+        # pattern rotated by the frame number, so consecutive frames differ
+        pattern = self.patterns[universe]
+        shift = (3*frame) % 510
+        data = bytearray(pattern[shift:510] + pattern[:shift] + b'\x00\x00')
+        if universe == 0: data[511] = self.triggerVal
+        return data
+
+    def sendFrame(self):
+        self.sequence = self.sequence % 255 + 1         # 1-255, 0 means sequencing disabled
+        for universe in range(self.universeCount):
+            self.socket.sendto(artDmxPacket(universe, self.sequence, self.frameData(universe, self.frameCount)), self.address)
+            self.packetCount += 1
+        if self.sync:
+            self.socket.sendto(ARTSYNC_PACKET, self.address)
+        self.frameTimes.append(time.perf_counter())
+        self.frameCount += 1
+
+    def run(self, duration:float = None, frames:int = None):
+        # sends frames on a fixed schedule (no drift from send time), until duration seconds or frames frames
+        interval = 1/self.rate if self.rate else 0.0
+        start = time.perf_counter()
+        sent = 0
+        while (frames is None or sent < frames) and (duration is None or time.perf_counter() - start < duration):
+            if interval:
+                wait = start + sent*interval - time.perf_counter()
+                if wait > 0: time.sleep(wait)
+            self.sendFrame()
+            sent += 1
+        return time.perf_counter() - start
+
+    def close(self):
+        self.socket.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--universes', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=40.0, help='frames per second (0 sends as fast as possible)')
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=ARTNET_PORT)
+    parser.add_argument('--trigger', type=int, default=0, help='value sent in universe 0 channel 512')
+    parser.add_argument('--sync', action='store_true', help='send an ArtSync after every frame')
+    args = parser.parse_args()
+
+    generator = ArtnetGenerator(args.universes, args.rate, args.host, args.port, args.trigger, args.sync)
+    try:
+        elapsed = generator.run(args.duration)
+    except KeyboardInterrupt:
+        elapsed = None
+    print(f"  Sent {generator.packetCount} packets ({generator.frameCount} frames)"
+          + (f" in {elapsed:.1f} s" if elapsed else ""))
+    generator.close()
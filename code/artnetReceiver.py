@@ -0,0 +1,123 @@
+import time
+import socket
+import threading
+
+# Minimal Art-Net receiver (ArtDmx + ArtSync)
+# Replaces stupidArtnet's server, which copies every packet into a list, looks up the callback signature per packet
+# and drops ArtSync. Packets are received into one preallocated buffer and the DMX payload is handed to the callback
+# as a memoryview into it (only valid during the callback, copy it to keep it).
+
+ARTNET_PORT = 6454
+ARTNET_ID = b'Art-Net\x00'
+OP_DMX = 0x5000
+OP_SYNC = 0x5200
+DMX_HEADER_SIZE = 18
+MAX_PACKET_SIZE = 1024
+SEQUENCE_TIMEOUT = 1.0      # s without packets for a universe after which any sequence is accepted (sender restarted)
+ERROR_LOG_INTERVAL = 5.0    # s between printed callback exceptions, a bad sender can trigger one per packet
+
+
+class ArtnetReceiver:
+    def __init__(self, universeCount:int, dmxCallback, syncCallback = None, port:int = ARTNET_PORT, host:str = ""):
+        # dmxCallback(data, universe): data is a memoryview of the packet's DMX channels
+        # syncCallback():              ArtSync received, latch the buffered universes
+        self.universeCount = universeCount
+        self.dmxCallback = dmxCallback
+        self.syncCallback = syncCallback
+        self.port = port
+        self.buffer = bytearray(MAX_PACKET_SIZE)
+        self.view = memoryview(self.buffer)
+        self.sequences = [0] * universeCount
+        self.lastPacket = [0.0] * universeCount
+        self.packetCount = 0
+        self.syncCount = 0
+        self.outOfOrderCount = 0        # ArtDmx packets older than the last one of their universe, dropped
+        self.ignoredCount = 0           # not Art-Net, other opcodes, universes we don't drive
+        self.callbackErrors = 0         # exceptions raised by the callbacks, logged and skipped
+        self.lastErrorLog = -ERROR_LOG_INTERVAL
+        self.metrics = None             # ingestMetrics.IngestMetrics, can be set while running
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.socket.bind((host, port))
+        self.socket.settimeout(0.5)     # so close() is noticed
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="ArtnetReceiver", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        buffer = self.buffer
+        view = self.view
+        recv_into = self.socket.recv_into
+        sequences = self.sequences
+        lastPacket = self.lastPacket
+        perf_counter = time.perf_counter
+        universeCount = self.universeCount
+        while self.running:
+            try:
+                size = recv_into(buffer)
+            except socket.timeout:
+                continue
+            except OSError:
+                return          # socket closed
+            if size < 14 or buffer[:8] != ARTNET_ID:
+                self.ignoredCount += 1
+                continue
+            opCode = buffer[8] | buffer[9] << 8
+            if opCode == OP_DMX and size >= DMX_HEADER_SIZE:
+                universe = buffer[14] | buffer[15] << 8       # 15 bit port-address (net, sub-net, universe)
+                if universe >= universeCount:
+                    self.ignoredCount += 1
+                    continue
+                sequence = buffer[12]       # 0 disables sequencing, otherwise drop packets older than the last one
+                last = sequences[universe]
+                now = perf_counter()
+                if (sequence and last and sequence <= last and last - sequence < 0x80
+                        and now - lastPacket[universe] < SEQUENCE_TIMEOUT):
+                    self.outOfOrderCount += 1
+                    continue
+                sequences[universe] = sequence
+                lastPacket[universe] = now
+                length = min(buffer[16] << 8 | buffer[17], size - DMX_HEADER_SIZE)
+                self.packetCount += 1
+                metrics = self.metrics
+                try:
+                    if metrics is None:
+                        self.dmxCallback(view[DMX_HEADER_SIZE:DMX_HEADER_SIZE+length], universe)
+                        continue
+                    metrics.packet(universe, sequence, now)
+                    self.dmxCallback(view[DMX_HEADER_SIZE:DMX_HEADER_SIZE+length], universe)
+                    metrics.callbackDone(perf_counter() - now)
+                except Exception as e:
+                    self.callbackError(e, f"ArtDmx U{universe}, {length} channels")
+            elif opCode == OP_SYNC:
+                self.syncCount += 1
+                try:
+                    if self.metrics is not None: self.metrics.sync()
+                    if self.syncCallback is not None:
+                        self.syncCallback()
+                except Exception as e:
+                    self.callbackError(e, "ArtSync")
+            else:
+                self.ignoredCount += 1
+
+    def callbackError(self, error:Exception, packet:str):
+        # the receive thread is the session's only one and is never restarted, so it must outlive any packet
+        self.callbackErrors += 1
+        now = time.monotonic()
+        if now - self.lastErrorLog >= ERROR_LOG_INTERVAL:
+            self.lastErrorLog = now
+            print(f"  Art-Net callback failed on {packet}: {type(error).__name__}: {error} ({self.callbackErrors} errors so far)")
+
+    def stats(self):
+        return (f"{self.packetCount} ArtDmx packets, {self.syncCount} ArtSync, {self.outOfOrderCount} out of order, "
+                f"{self.ignoredCount} ignored, {self.callbackErrors} callback errors")
+
+    def close(self):
+        self.running = False
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+        if self.thread is not threading.current_thread():
+            self.thread.join()
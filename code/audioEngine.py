@@ -0,0 +1,130 @@
+import os
+import wave
+import threading
+
+# In-process audio playback whose output (DAC) time is the master clock for LED playback
+# Every PyAudio callback reports when the first sample of its buffer will reach the DAC (time_info), so
+# (dac time, take position of that sample) anchors the take timeline to the stream clock. clock() extrapolates
+# from the newest anchor, which re-locks on every buffer (~23 ms) instead of jumping with setpos() every 10 s.
+
+PA_CONTINUE = 0     # pyaudio.paContinue
+PA_COMPLETE = 1     # pyaudio.paComplete
+
+
+def openAudioDevice(quiet:bool = True):
+    # pyaudio.PyAudio(): PortAudio probes every ALSA/JACK device here (slow on the Zero 2, and pages of warnings on
+    # stderr with quiet=False). Open it once per process, LEDSession.audioDevice() keeps it for every playback
+    import pyaudio
+    if not quiet: return pyaudio.PyAudio()
+    stderr = os.dup(2)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, 2)         # the probe output comes from C, sys.stderr can't catch it
+        return pyaudio.PyAudio()
+    finally:
+        os.dup2(stderr, 2)
+        os.close(devnull)
+        os.close(stderr)
+
+
+class AudioEngine:
+    def __init__(self, audioSource, audio = None, framesPerBuffer:int = 1024):
+        # audioSource: path of a .wav file, or an already open wave reader
+        # audio:       pyaudio.PyAudio() instance (or a fake device with the same interface), shared and left open by
+        #              close(). A private one is opened (and terminated by close()) if None
+        self.audioFile = wave.open(audioSource, 'rb') if isinstance(audioSource, str) else audioSource
+        self.sampleRate = self.audioFile.getframerate()
+        self.frameBytes = self.audioFile.getsampwidth() * self.audioFile.getnchannels()
+        self.ownsAudio = audio is None
+        self.audio = openAudioDevice() if audio is None else audio     # only needed on the device, the sync harness passes a fake one
+        self.framesPerBuffer = framesPerBuffer
+        self.stream = None
+        self.position = 0               # take frame (sample) of the next buffer handed to PortAudio
+        self.anchor = (None, 0.0)       # (stream time the anchored sample hits the DAC, its take time in seconds)
+        self.lastClock = 0.0
+        self.finished = True
+        self.lock = threading.Lock()
+        self.callbackCount = 0
+        self.underflowCount = 0
+        self.loop = False
+        self.loopCount = 0
+        self.headFrames = 4 * framesPerBuffer
+        self.audioFile.setpos(0)
+        self.headData = self.audioFile.readframes(self.headFrames)      # start of the file, kept in RAM for loop wraps
+        self.headFrames = len(self.headData) // self.frameBytes
+
+    def open(self):
+        self.stream = self.audio.open(format=self.audio.get_format_from_width(self.audioFile.getsampwidth()),
+                                      channels=self.audioFile.getnchannels(),
+                                      rate=self.sampleRate,
+                                      output=True,
+                                      frames_per_buffer=self.framesPerBuffer,
+                                      start=False,
+                                      stream_callback=self.audioCallback)
+
+    def audioCallback(self, in_data, frame_count, time_info, status):
+        dacTime = time_info.get('output_buffer_dac_time', 0)
+        if not dacTime:         # some ALSA setups don't report it, estimate from the output latency
+            dacTime = time_info.get('current_time', 0) or self.stream.get_time()
+            dacTime += self.stream.get_output_latency()
+        if status: self.underflowCount += 1
+        with self.lock:
+            data = self.readFrames(frame_count)
+            self.anchor = (dacTime, self.position / self.sampleRate)
+            self.position += len(data) // self.frameBytes
+        self.callbackCount += 1
+        if len(data) < frame_count * self.frameBytes:
+            self.finished = True
+            return (data, PA_COMPLETE)
+        return (data, PA_CONTINUE)
+
+    def readFrames(self, count:int):
+        data = self.audioFile.readframes(count)
+        if not self.loop or len(data) == count * self.frameBytes or self.headFrames == 0:
+            return data
+        # end of file while looping: fill the rest of the buffer from the cached head, the timeline keeps counting up
+        self.loopCount += 1
+        missing = min(count - len(data)//self.frameBytes, self.headFrames)
+        self.audioFile.setpos(missing)
+        return data + self.headData[:missing * self.frameBytes]
+
+    def duration(self):
+        return self.audioFile.getnframes() / self.sampleRate
+
+    def clock(self):
+        # take time (seconds) of the sample currently leaving the DAC, held at the start time until audio is audible
+        dacTime, takeTime = self.anchor
+        if dacTime is None: return takeTime
+        now = takeTime + (self.stream.get_time() - dacTime)
+        if now < self.lastClock: return self.lastClock      # keep it monotonic across re-anchoring
+        self.lastClock = now
+        return now
+
+    def start(self, startTime:float = 0.0, loop:bool = False):
+        if self.stream is None:
+            self.open()
+        if not self.stream.is_stopped():     # also needed after the callback completed the stream
+            self.stream.stop_stream()
+        with self.lock:
+            self.position = min(int(startTime * self.sampleRate), self.audioFile.getnframes())
+            self.audioFile.setpos(self.position)
+            self.anchor = (None, startTime)
+            self.lastClock = startTime
+            self.loop = loop
+            self.loopCount = 0
+        self.finished = False
+        self.stream.start_stream()
+
+    def stop(self):
+        self.finished = True
+        if self.stream is not None and not self.stream.is_stopped():
+            self.stream.stop_stream()
+
+    def close(self):
+        self.stop()
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if self.ownsAudio:
+            self.audio.terminate()
+        self.audioFile.close()
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# Benchmark suite for the record/playback hot paths, runs anywhere on the simulated backend (ledHardware.py)
+# For 1, 4 and 16 universes it measures:
+#   record     LEDRecord.recordCallback throughput (packets/s) and CPU per packet, disk writer and strip refresh included
+#   parse      LEDPlayback.parseLine throughput (frames/s)
+#   playback   LEDPlayback.playCallback (whole timeline frames) + strip refresh throughput (universe frames/s) and
+#              CPU per universe frame
+#   jitter     real-time scheduled playback at 40 fps: show interval deviation (avg/p99/max), late frames, CPU per
+#              universe frame
+#   live       Art-Net passthrough (newLive.py) at 40 fps through the socket: frame sent -> strip show() latency
+#              (avg/p99/max), immediate and with ArtSync
+#   udp        (--udp) packets/s received and lost through the real Art-Net socket from artnetGenerator.py
+# Results can be saved with --save and compared with --baseline, which exits 1 when a number regressed by more
+# than --tolerance, so regressions in recordCallback/parseLine/playCallback show up as numbers
+#   python3 ./code/bench.py
+#   python3 ./code/bench.py --universes 16 --save bench.json
+#   python3 ./code/bench.py --baseline bench.json --tolerance 0.2
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from ledSession import LEDSession
+from newRecord import LEDRecord
+from newPlayback import LEDPlayback
+from newLive import LEDLive
+from takeFormat import TakeHeader, BinaryTakeWriter, writeMetadata, RECORD_SIZE
+from artnetGenerator import ArtnetGenerator
+from artnetReceiver import SEQUENCE_TIMEOUT
+
+UNIVERSE_LED_COUNTS = {1: [170], 4: [680], 16: [680]*4}     # universe count -> strips of the simulated session
+FRAME_RATE = 40.0
+JITTER_FLOOR = 0.001        # jitter numbers within this much of the baseline never count as regressions
+
+# metric -> (unit, True if higher is better)
+METRICS = {"recordPackets":     ("packets/s", True),
+           "recordCpu":         ("us/packet", False),
+           "parseFrames":       ("frames/s", True),
+           "playFrames":        ("frames/s", True),
+           "playCpu":           ("us/frame", False),
+           "jitterAvg":         ("ms", False),
+           "jitterP99":         ("ms", False),
+           "jitterMax":         ("ms", False),
+           "lateFrames":        ("frames", False),
+           "scheduledCpu":      ("us/frame", False),
+           "liveLatencyAvg":    ("ms", False),
+           "liveLatencyP99":    ("ms", False),
+           "liveLatencyMax":    ("ms", False),
+           "syncLatencyAvg":    ("ms", False),
+           "syncLatencyP99":    ("ms", False),
+           "syncLatencyMax":    ("ms", False),
+           "udpPackets":        ("packets/s", True),
+           "udpLoss":           ("%", False)}
+
+
+def quiet():
+    # the record/playback classes print progress, keep it out of the results
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def setWireTime(session:LEDSession, enabled:bool):
+    # throughput benchmarks measure the code, not the 800 kHz wire
+    for strip in session.strips:
+        strip.wireTime = enabled
+
+
+def makePackets(universeCount:int, frames:int):
+    # Art-Net payloads as ArtnetReceiver delivers them (memoryviews of 512 channels), trigger value 0 in universe 0 channel 512
+    generator = ArtnetGenerator(universeCount)
+    packets = [[memoryview(bytes(generator.frameData(universe, frame))) for universe in range(universeCount)] for frame in range(frames)]
+    generator.close()
+    return packets
+
+
+def writeTake(path:str, session:LEDSession, frames:int, rate:float = FRAME_RATE):
+    os.mkdir(path)
+    header = TakeHeader(session.ledCounts, session.universe2strip, session.universe2substrip)
+    generator = ArtnetGenerator(session.universeCount)
+    for universe in range(session.universeCount):
+        writer = BinaryTakeWriter(f"{path}/U{universe}.bin", header.forUniverse(universe))
+        for frame in range(frames):
+            writer.write(frame/rate, generator.frameData(universe, frame))
+        writer.close()
+    writeMetadata(path, header)
+    generator.close()
+
+
+def benchRecord(session:LEDSession, saveDir:str, frames:int):
+    packets = makePackets(session.universeCount, frames)
+    with quiet():
+        recorder = LEDRecord(session=session)
+        recorder.record("benchRecord", saveDir)
+    callback = recorder.recordCallback
+    setWireTime(session, False)
+    with quiet():
+        wallStart, cpuStart = time.perf_counter(), time.process_time()
+        for framePackets in packets:
+            for universe, data in enumerate(framePackets):
+                callback(data, universe)
+        wall, cpu = time.perf_counter() - wallStart, time.process_time() - cpuStart
+    setWireTime(session, True)
+    with quiet():
+        recorder.deinit()
+    packetCount = frames * session.universeCount
+    written = os.path.getsize(f"{saveDir}/benchRecord/U0.bin") // RECORD_SIZE
+    if written < frames:
+        print(f"  WARNING: only {written} of {frames} universe 0 frames reached the disk")
+    return {"recordPackets": packetCount/wall, "recordCpu": 1e6*cpu/packetCount}
+
+
+def benchParse(takePath:str, session:LEDSession):
+    with quiet():
+        playback = LEDPlayback(takePath, audioPath=None, session=session)
+    frameCount = 0
+    start = time.perf_counter()
+    for universe in playback.activeUniverses:
+        playback.playbackFiles[universe].rewind()
+        while playback.parseLine(universe) != False:
+            frameCount += 1
+    elapsed = time.perf_counter() - start
+    with quiet():
+        playback.deinit()
+    return {"parseFrames": frameCount/elapsed}
+
+
+def benchPlayCallback(takePath:str, session:LEDSession):
+    # the scheduler's work without its waiting: every timeline frame is applied exactly at its time stamp
+    with quiet():
+        playback = LEDPlayback(takePath, audioPath=None, session=session)
+    playback.cue(0.0)
+    frameCount = playback.timeline.recordCount         # universe frames, comparable with the per universe scheduling
+    setWireTime(session, False)
+    wallStart, cpuStart = time.perf_counter(), time.process_time()
+    deadline = playback.nextDeadline()
+    while deadline is not None:
+        deadline = playback.playCallback(0, deadline)
+        playback.refresher.refreshDirty()
+    wall, cpu = time.perf_counter() - wallStart, time.process_time() - cpuStart
+    setWireTime(session, True)
+    with quiet():
+        playback.deinit()
+    return {"playFrames": frameCount/wall, "playCpu": 1e6*cpu/frameCount}
+
+
+def benchJitter(takePath:str, session:LEDSession, frames:int, rate:float = FRAME_RATE):
+    # real-time playback on the system clock, jitter is measured on the simulated strip's show() times
+    strip = session.strips[0]
+    with quiet():
+        playback = LEDPlayback(takePath, audioPath=None, session=session)
+    showStart = len(strip.showTimes)
+    cpuStart = time.process_time()
+    with quiet():
+        playback.play()
+        while not playback.finished:
+            time.sleep(0.01)
+    cpu = time.process_time() - cpuStart
+    lateFrames, frameCount = playback.scheduler.lateFrames, playback.timeline.recordCount
+    with quiet():
+        playback.deinit()
+    showTimes = strip.showTimes[showStart:showStart+frames]
+    deviations = sorted(abs((later - earlier) - 1/rate) for earlier, later in zip(showTimes, showTimes[1:]))
+    if not deviations: deviations = [0.0]
+    return {"jitterAvg": 1000*sum(deviations)/len(deviations),
+            "jitterP99": 1000*deviations[int(0.99*(len(deviations)-1))],
+            "jitterMax": 1000*deviations[-1],
+            "lateFrames": lateFrames,
+            "scheduledCpu": 1e6*cpu/max(frameCount, 1)}
+
+
+def benchLive(session:LEDSession, port:int, frames:int, sync:bool, rate:float = FRAME_RATE):
+    # latency from the frame's last packet (or its ArtSync) leaving the generator to show() of the strip it completes
+    strip = session.strips[-1]
+    name = "syncLatency" if sync else "liveLatency"
+    with quiet():
+        live = LEDLive(session=session)
+        live.start()
+        generator = ArtnetGenerator(session.universeCount, rate, port=port, sync=sync)
+        time.sleep(SEQUENCE_TIMEOUT)        # the previous run's generator used the same sequence numbers
+        showStart = len(strip.showTimes)
+        generator.run(frames=frames)
+        time.sleep(0.2)
+        live.deinit()
+    generator.close()
+    showTimes = strip.showTimes[showStart:showStart+frames]       # deinit() clears the strips with one more show()
+    if len(showTimes) < frames:
+        print(f"  WARNING: {len(showTimes)} shows for {frames} live frames")
+    latencies = sorted(shown - sent for sent, shown in zip(generator.frameTimes, showTimes))
+    if not latencies: latencies = [0.0]
+    return {name + "Avg": 1000*sum(latencies)/len(latencies),
+            name + "P99": 1000*latencies[int(0.99*(len(latencies)-1))],
+            name + "Max": 1000*latencies[-1]}
+
+
+def benchUdp(session:LEDSession, saveDir:str, port:int, duration:float, rate:float):
+    # packets through the socket at rate frames/s (0: as fast as the generator can send), counted by what the recorder got
+    with quiet():
+        recorder = LEDRecord(session=session)
+        recorder.record("benchUdp", saveDir)
+    received = [0]
+    callback = recorder.recordCallback
+    def countingCallback(data, universe):
+        received[0] += 1
+        callback(data, universe)
+    recorder.recordCallback = countingCallback
+    generator = ArtnetGenerator(session.universeCount, rate, port=port)
+    time.sleep(0.2)         # let the server thread bind
+    with quiet():
+        elapsed = generator.run(duration)
+        time.sleep(0.2)
+        recorder.deinit()
+    sent = generator.packetCount
+    generator.close()
+    return {"udpPackets": received[0]/elapsed, "udpLoss": 100.0*(sent - received[0])/sent if sent else 0.0}
+
+
+def runSuite(universeCounts:list, frames:int, jitterFrames:int, udp:bool, udpDuration:float, udpRate:float):
+    results = {}
+    for configIndex, universeCount in enumerate(universeCounts):
+        tempDir = tempfile.mkdtemp(prefix="ledBench")
+        session = LEDSession(UNIVERSE_LED_COUNTS[universeCount], backend="sim", artnetPort=16454 + configIndex)
+        try:
+            takePath = f"{tempDir}/benchTake"
+            jitterPath = f"{tempDir}/jitterTake"
+            writeTake(takePath, session, frames)
+            writeTake(jitterPath, session, jitterFrames)
+            result = {}
+            result.update(benchRecord(session, tempDir, frames))
+            result.update(benchParse(takePath, session))
+            result.update(benchPlayCallback(takePath, session))
+            result.update(benchJitter(jitterPath, session, jitterFrames))
+            result.update(benchLive(session, session.artnetPort, jitterFrames, sync=False))
+            result.update(benchLive(session, session.artnetPort, jitterFrames, sync=True))
+            if udp:
+                result.update(benchUdp(session, tempDir, session.artnetPort, udpDuration, udpRate))
+            results[str(universeCount)] = result
+            printResult(universeCount, result)
+        finally:
+            session.close()
+            shutil.rmtree(tempDir)
+    return results
+
+
+def printResult(universeCount:int, result:dict):
+    print(f"{universeCount} universe{'s' if universeCount > 1 else ''}:")
+    for name, value in result.items():
+        unit = METRICS[name][0]
+        print(f"  {name:14} {value:12.1f} {unit}")
+
+
+def compare(results:dict, baseline:dict, tolerance:float):
+    # returns the regressed metrics as printable lines
+    regressions = []
+    for universeCount, result in results.items():
+        for name, value in result.items():
+            reference = baseline.get(universeCount, {}).get(name)
+            if reference is None: continue
+            unit, higherIsBetter = METRICS[name]
+            if higherIsBetter:
+                regressed = value < reference * (1 - tolerance)
+            else:
+                slack = 1000*JITTER_FLOOR if name.startswith(("jitter", "live", "sync")) else (1 if name == "lateFrames" else 0)
+                regressed = value > reference * (1 + tolerance) + slack
+            if regressed:
+                regressions.append(f"  {universeCount} universes {name}: {value:.1f} {unit} (baseline {reference:.1f})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--universes', type=int, nargs='+', default=[1, 4, 16], choices=sorted(UNIVERSE_LED_COUNTS))
+    parser.add_argument('--frames', type=int, default=2000, help='frames per universe for the throughput benchmarks')
+    parser.add_argument('--jitter-frames', type=int, default=200, help='frames of real-time playback (at 40 fps)')
+    parser.add_argument('--udp', action='store_true', help='also push packets through the Art-Net socket')
+    parser.add_argument('--udp-duration', type=float, default=2.0)
+    parser.add_argument('--udp-rate', type=float, default=0.0, help='frames/s sent through the socket, 0 floods it to find the ceiling')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression against the baseline')
+    args = parser.parse_args()
+
+    results = runSuite(args.universes, args.frames, args.jitter_frames, args.udp, args.udp_duration, args.udp_rate)
+    if args.save:
+        with open(args.save, "w") as resultFile:
+            json.dump(results, resultFile, indent=1)
+    if args.baseline:
+        with open(args.baseline) as baselineFile:
+            regressions = compare(results, json.load(baselineFile), args.tolerance)
+        if regressions:
+            print("REGRESSIONS:")
+            print("\n".join(regressions))
+            sys.exit(1)
+        print("No regressions against the baseline.")
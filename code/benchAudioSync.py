@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# A/V sync harness: plays a looping take through LEDPlayback with its AudioEngine on a fake audio device, in simulated
+# time, and checks that every LED frame goes out within one LED frame of the moment its take time leaves the DAC
+# The wave file is finite and plays with loop=True, so audio and LEDs wrap many times over the run (--loop seconds),
+# the FrameScheduler runs without its thread (threaded=False) and is stepped every --poll ms of simulated time
+#   python3 ./code/benchAudioSync.py                          (30 minutes of a 20 s loop, DAC 100 ppm fast)
+#   python3 ./code/benchAudioSync.py --minutes 120 --ppm -250 --fps 44 --loop 7.5
+
+import sys
+import wave
+import heapq
+import random
+import shutil
+import argparse
+import tempfile
+from ledSession import LEDSession
+from newPlayback import LEDPlayback
+from bench import writeTake, setWireTime, quiet
+
+LED_COUNTS = [680]      # 4 universes
+
+
+def writeSilence(path:str, seconds:float, sampleRate:int, channels:int = 2, sampleWidth:int = 2):
+    with wave.open(path, "wb") as waveFile:
+        waveFile.setnchannels(channels)
+        waveFile.setsampwidth(sampleWidth)
+        waveFile.setframerate(sampleRate)
+        waveFile.writeframes(bytes(int(seconds * sampleRate) * channels * sampleWidth))
+
+
+class FakeStream:
+    def __init__(self, device, callback):
+        self.device = device
+        self.callback = callback
+        self.stopped = True
+    def get_time(self): return self.device.now
+    def get_output_latency(self): return self.device.outputLatency
+    def start_stream(self): self.stopped = False
+    def stop_stream(self): self.stopped = True
+    def is_stopped(self): return self.stopped
+    def is_active(self): return not self.stopped
+    def close(self): pass
+
+
+class FakeAudioDevice:
+    # stands in for pyaudio.PyAudio(), time is advanced by the simulation
+    def __init__(self, outputLatency:float = 0.03):
+        self.now = 0.0
+        self.outputLatency = outputLatency
+        self.stream = None
+    def get_format_from_width(self, width:int): return width
+    def open(self, stream_callback = None, **kwargs):
+        self.stream = FakeStream(self, stream_callback)
+        return self.stream
+    def terminate(self): pass
+
+
+def simulate(minutes:float, ppm:float, fps:float, loopSeconds:float, sampleRate:int = 48000, framesPerBuffer:int = 1024,
+             startDelay:float = 0.25, callbackJitter:float = 0.004, dacJitter:float = 0.0005, poll:float = 0.001):
+    workDir = tempfile.mkdtemp(prefix="benchAudioSync")
+    session = LEDSession(LED_COUNTS, backend="sim")
+    setWireTime(session, False)
+    device = FakeAudioDevice()
+    session.audio = device                          # LEDPlayback opens its AudioEngine on the session's device
+    try:
+        writeSilence(f"{workDir}/loop.wav", loopSeconds, sampleRate)
+        writeTake(f"{workDir}/take", session, int(loopSeconds * fps), fps)
+        with quiet():
+            playback = LEDPlayback(f"{workDir}/take", audioPath=f"{workDir}/loop.wav", session=session)
+        if playback.audioEngine is None:
+            raise RuntimeError("LEDPlayback didn't open the fake audio device")
+        engine = playback.audioEngine
+        playback.scheduler.threaded = False
+        with quiet():
+            playback.play(loop=True)
+
+        actualRate = sampleRate * (1 + ppm/1e6)     # the DAC crystal is never exactly at the nominal rate
+        bufferTime = framesPerBuffer / actualRate
+        dacStart = startDelay + device.outputLatency    # first sample audible
+        audioLength = engine.duration()
+        duration = minutes * 60
+        events = [(startDelay, 0, 0), (0.0, 1, 0)]  # (time, 0 = audio callback / 1 = scheduler poll, index)
+        maxError = wallMaxError = 0.0
+        errorSum = 0.0
+        checked = 0
+        with quiet():
+            while events:
+                now, kind, index = heapq.heappop(events)
+                if now > duration: break
+                device.now = now
+                if kind == 0:
+                    dacTime = dacStart + index*bufferTime + random.uniform(-dacJitter, dacJitter)
+                    engine.audioCallback(None, framesPerBuffer, {'output_buffer_dac_time': dacTime, 'current_time': now}, 0)
+                    nextCallback = startDelay + (index+1)*bufferTime + random.uniform(0, callbackJitter)
+                    heapq.heappush(events, (nextCallback, 0, index+1))
+                else:
+                    takeTime = playback.scheduler.step()
+                    if takeTime is not None and now >= dacStart:
+                        # position in the take of the LED frame just shown vs. position in the wave file of the sample
+                        # leaving the DAC, both wrapped independently, so a wrong loop length shows up as drift
+                        ledPosition = takeTime % playback.loopLength
+                        audioPosition = ((now - dacStart) * actualRate / sampleRate) % audioLength
+                        error = abs((audioPosition - ledPosition + audioLength/2) % audioLength - audioLength/2)
+                        errorSum += error
+                        checked += 1
+                        if error > maxError: maxError = error
+                        audible = dacStart + takeTime * sampleRate / actualRate     # when the DAC plays takeTime
+                        wallError = abs(takeTime - audible)     # previous approach: LEDs on time.time() since play()
+                        if wallError > wallMaxError: wallMaxError = wallError
+                    heapq.heappush(events, (now + poll, 1, index+1))
+            scheduler = playback.scheduler
+            stats = (f"{checked} LED frames checked, {playback.loopCount} LED / {engine.loopCount} audio loop wraps, "
+                     f"{scheduler.lateFrames} late, {scheduler.droppedFrames} dropped")
+            playback.deinit()
+        return maxError, errorSum/max(1, checked), wallMaxError, stats
+    finally:
+        session.close()
+        shutil.rmtree(workDir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--minutes', type=float, default=30, help='simulated play time')
+    parser.add_argument('--loop', type=float, default=20, help='seconds of the looping wave file and take')
+    parser.add_argument('--ppm', type=float, default=100, help='DAC sample clock error in parts per million')
+    parser.add_argument('--fps', type=float, default=40, help='LED frame rate of the take, max allowed error is one frame')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    maxError, averageError, wallMaxError, stats = simulate(args.minutes, args.ppm, args.fps, args.loop)
+    limit = 1/args.fps
+    print(f"  {args.minutes:.0f} min of a {args.loop:g} s loop at {args.ppm:+.0f} ppm: {stats}")
+    print(f"  LED frame vs DAC error avg {averageError*1000:.2f} ms, max {maxError*1000:.2f} ms (limit {limit*1000:.1f} ms)")
+    print(f"  system clock (previous sync) max error {wallMaxError*1000:.1f} ms")
+    if maxError >= limit:
+        print("  FAIL: LED frames drifted more than one frame from the audio")
+        sys.exit(1)
+    print("  PASS")
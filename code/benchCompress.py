@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# Compression ratio and decode cost of the keyframe/delta take format (deltaTake.py) vs the packed binary format
+# Runs on real save folders, or on a synthetic show (static holds, slow fades, chases, full-frame noise) if none given
+#   python3 ./code/benchCompress.py ./saves/*_save
+#   python3 ./code/benchCompress.py --universes 16 --minutes 5
+# Decode speed is reported as a multiple of real time at the take's frame rate, > 1 keeps up (run it on the Zero 2)
+# Every encoded universe is also checked against the source: every decoded frame (time stamp and pixels), the stored
+# frame time stamps, seek() to random times and recovery of a file cut off mid block without its index. Exits 1 on a
+# mismatch
+
+import os
+import sys
+import math
+import time
+import shutil
+import bisect
+import random
+import argparse
+import tempfile
+from takeFormat import TakeHeader, readTakeMetadata, openTakeReader, writeMetadata, BinaryTakeWriter, RECORD_SIZE
+from deltaTake import DeltaTakeWriter, DeltaTakeReader, KEYFRAME_INTERVAL
+
+
+def showFrames(universe:int, frames:int, rate:float):
+    # one universe of a synthetic show, cycling through 20 s scenes
+    random.seed(universe)
+    base = bytes(random.randrange(256) for i in range(510))
+    for frame in range(frames):
+        t = frame / rate
+        scene = int(t // 20) % 4
+        if scene == 0:          # static look
+            data = base
+        elif scene == 1:        # slow fade of the whole universe
+            level = 0.5 + 0.5*math.sin(t*0.5)
+            data = bytes(int(value*level) for value in base)
+        elif scene == 2:        # chase: a 10 pixel segment moving over a dark background
+            position = int(t*40) % 170
+            data = bytearray(510)
+            data[3*position:3*position+30] = b'\xff' * len(data[3*position:3*position+30])
+        else:                   # video content, every channel changes every frame
+            data = bytes(random.randrange(256) for i in range(510))
+        yield frame / rate, data
+
+
+def writeSyntheticTake(path:str, universeCount:int, frames:int, rate:float):
+    stripCount = (universeCount + 3) // 4
+    header = TakeHeader([680] * stripCount, [u // 4 for u in range(universeCount)], [u % 4 for u in range(universeCount)])
+    os.mkdir(path)
+    writeMetadata(path, header)
+    for universe in range(universeCount):
+        writer = BinaryTakeWriter(f"{path}/U{universe}.bin", header.forUniverse(universe))
+        for timeStamp, data in showFrames(universe, frames, rate):
+            writer.write(timeStamp, data)
+        writer.close()
+
+
+def decodeAll(reader):
+    frames = []
+    while True:
+        frameData = reader.readFrame()
+        if frameData == False: return frames
+        frames.append((frameData[0], bytes(frameData[1])))
+
+
+def verifyUniverse(filePath:str, universeFrames:list, seeks:int = 50):
+    # None if the delta file decodes to exactly universeFrames [(time stamp, 510 bytes), ...], else what differs
+    reader = DeltaTakeReader(filePath)
+    try:
+        decoded = decodeAll(reader)
+        if len(decoded) != len(universeFrames):
+            return f"{len(decoded)} frames decoded, {len(universeFrames)} written"
+        for index, (frame, source) in enumerate(zip(decoded, universeFrames)):
+            if frame != source:
+                return f"frame {index} at {source[0]:.3f} s decodes differently"
+        if reader.timeStamps().tolist() != [timeStamp for timeStamp, data in universeFrames]:
+            return "stored frame time stamps differ"
+        timeStamps = [timeStamp for timeStamp, data in universeFrames]
+        for i in range(seeks if universeFrames else 0):
+            target = random.uniform(-1.0, timeStamps[-1] + 1.0)
+            reader.seek(target)
+            expected = universeFrames[max(0, bisect.bisect_right(timeStamps, target) - 1)]
+            if reader.readFrame() != expected:
+                return f"seek({target:.3f}) returns the wrong frame"
+        blockOffsets, dataEnd = reader.blockOffsets, reader.dataEnd
+    finally:
+        reader.close()
+    if len(blockOffsets) < 2: return None
+    # recording cut off mid block: no index/trailer, half of the last block missing -> every complete block decodes
+    truncatedPath = filePath + ".cut"
+    with open(filePath, "rb") as file, open(truncatedPath, "wb") as truncated:
+        truncated.write(file.read((blockOffsets[-1] + dataEnd) // 2))
+    reader = DeltaTakeReader(truncatedPath)
+    try:
+        decoded = decodeAll(reader)
+        if reader.times is not None:
+            return "truncated file still reports stored time stamps"
+        if len(reader.blockOffsets) != len(blockOffsets) - 1:
+            return f"truncated file: {len(reader.blockOffsets)} blocks recovered, expected {len(blockOffsets) - 1}"
+        if decoded != universeFrames[:len(decoded)] or len(decoded) < len(universeFrames) - KEYFRAME_INTERVAL:
+            return f"truncated file: {len(decoded)} frames recovered, they don't match the source"
+        if reader.timeStamps().tolist() != [frame[0] for frame in decoded]:
+            return "truncated file: frame header walk differs from the decoded time stamps"
+    finally:
+        reader.close()
+        os.remove(truncatedPath)
+    return None
+
+
+def benchTake(path:str, tempDir:str, compressions:list):
+    header = readTakeMetadata(path)
+    frames = []
+    for universe in range(header.universeCount):
+        reader = openTakeReader(path, universe, mapped=False)
+        universeFrames = []
+        while True:
+            frameData = reader.readFrame()
+            if frameData == False: break
+            universeFrames.append((frameData[0], bytes(frameData[1])))
+        reader.close()
+        frames.append(universeFrames)
+    frameCount = sum(len(universeFrames) for universeFrames in frames)
+    duration = max((universeFrames[-1][0] for universeFrames in frames if universeFrames), default=0.0)
+    packedSize = sum(header.headerSize + len(universeFrames)*RECORD_SIZE for universeFrames in frames)
+    print(f"{path}: {header.universeCount} universes, {frameCount} frames, {duration:.0f} s, packed {packedSize/1e6:.1f} MB")
+
+    for compression in compressions:
+        name = f"delta+{compression}" if compression else "delta"
+        encodeStart = time.perf_counter()
+        size = 0
+        writers = []
+        for universe, universeFrames in enumerate(frames):
+            writer = DeltaTakeWriter(f"{tempDir}/U{universe}.dlt", header.forUniverse(universe), compression=compression)
+            for timeStamp, data in universeFrames:
+                writer.write(timeStamp, data)
+            writer.close()
+            writers.append(writer)
+            size += os.path.getsize(f"{tempDir}/U{universe}.dlt")
+        encodeTime = time.perf_counter() - encodeStart
+
+        decodeStart = time.perf_counter()
+        for universe in range(header.universeCount):
+            reader = DeltaTakeReader(f"{tempDir}/U{universe}.dlt")
+            while reader.readFrame() != False: pass
+            reader.close()
+        decodeTime = time.perf_counter() - decodeStart
+
+        seekStart = time.perf_counter()
+        reader = DeltaTakeReader(f"{tempDir}/U0.dlt")
+        for i in range(100):
+            reader.seek(random.random() * duration)
+            reader.readFrame()
+        reader.close()
+        seekTime = (time.perf_counter() - seekStart) / 100
+
+        for universe, universeFrames in enumerate(frames):
+            error = verifyUniverse(f"{tempDir}/U{universe}.dlt", universeFrames)
+            if error is not None:
+                print(f"  FAIL: {name} U{universe} of {path}: {error}")
+                sys.exit(1)
+
+        kinds = [sum(writer.kindCounts[kind] for writer in writers) for kind in range(3)]
+        print(f"  {name:12} {size/1e6:8.2f} MB  ratio {packedSize/size:6.1f}x  "
+              f"encode {frameCount/encodeTime:8.0f} frames/s  decode {frameCount/decodeTime:8.0f} frames/s "
+              f"({duration/decodeTime:5.0f}x real time)  "
+              f"seek {seekTime*1000:.2f} ms  key/delta/repeat {kinds[0]}/{kinds[1]}/{kinds[2]}  round trip OK")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('saves', nargs='*', help='save folders to measure (default: a synthetic show)')
+    parser.add_argument('--universes', type=int, default=4, help='synthetic show: universe count')
+    parser.add_argument('--minutes', type=float, default=2.0, help='synthetic show: length')
+    parser.add_argument('--rate', type=float, default=40.0, help='synthetic show: frames per second')
+    args = parser.parse_args()
+
+    tempDir = tempfile.mkdtemp(prefix="benchCompress")
+    try:
+        saves = args.saves
+        if not saves:
+            saves = [f"{tempDir}/syntheticShow"]
+            writeSyntheticTake(saves[0], args.universes, int(args.minutes*60*args.rate), args.rate)
+        for save in saves:
+            try:
+                benchTake(save, tempDir, ["zlib", None])
+            except (FileNotFoundError, ValueError) as e:
+                print(f"  Unable to read {save}: {e}")
+                sys.exit(1)
+    finally:
+        shutil.rmtree(tempDir)
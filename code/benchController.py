@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Drive the Idle/Record/Playback state machine off-device with MockButtonInput and fake actions:
+# checks the transitions and debouncing, and measures press -> transition latency and idle CPU use
+#   python3 ./code/benchController.py
+#   python3 ./code/benchController.py --presses 5000
+
+import sys
+import time
+import argparse
+import threading
+from controller import LEDController, MockButtonInput
+
+
+class FakeActions:
+    def __init__(self, hasSaves:bool = True, failing:str = None):
+        # failing: action that raises, e.g. "stopRecord"
+        self.hasSaves = hasSaves
+        self.failing = failing
+        self.calls = []
+    def startRecord(self): self.calls.append("startRecord")
+    def stopRecord(self):
+        self.calls.append("stopRecord")
+        if self.failing == "stopRecord": raise OSError("disk gone")
+    def reset(self): self.calls.append("reset")
+    def startPlayback(self):
+        self.calls.append("startPlayback")
+        return None if self.hasSaves else False
+    def stopPlayback(self): self.calls.append("stopPlayback")
+
+
+def checkStateMachine():
+    actions = FakeActions()
+    controller = LEDController(actions, debounceTime=0.0)
+    buttons = MockButtonInput({"record": 17, "play": 27}, controller.buttonPressed)
+    expected = [("record", "Record"), ("play", "Record"), ("record", "Idle"),
+                ("play", "Playback"), ("record", "Playback"), ("play", "Idle")]
+    for button, mode in expected:
+        buttons.press(button)
+        controller.handleEvent(*controller.events.get())
+        if controller.mode != mode:
+            return f"after {button}: expected {mode}, got {controller.mode}"
+    if actions.calls != ["startRecord", "stopRecord", "startPlayback", "stopPlayback"]:
+        return f"unexpected actions {actions.calls}"
+    actions = FakeActions(hasSaves=False)
+    controller = LEDController(actions, debounceTime=0.0)
+    controller.buttonPressed("play")
+    controller.handleEvent(*controller.events.get())
+    if controller.mode != "Idle":
+        return "playback without saves should stay Idle"
+    actions = FakeActions(failing="stopRecord")
+    controller = LEDController(actions, debounceTime=0.0)
+    for button in ("record", "record", "play"):
+        controller.buttonPressed(button)
+        controller.handleEvent(*controller.events.get())
+    if controller.mode != "Playback" or actions.calls != ["startRecord", "stopRecord", "reset", "startPlayback"]:
+        return f"a failing action should reset to Idle and keep handling presses, got {controller.mode} {actions.calls}"
+    controller = LEDController(FakeActions(), debounceTime=0.3)
+    for i in range(10): controller.buttonPressed("record")     # contact bounce
+    if controller.pressCount != 1 or controller.bounceCount != 9:
+        return f"debounce let {controller.pressCount} of 10 bouncing edges through"
+    return None
+
+
+def benchLatency(presses:int):
+    controller = LEDController(FakeActions(), debounceTime=0.0)
+    buttons = MockButtonInput({"record": 17, "play": 27}, controller.buttonPressed)
+    thread = threading.Thread(target=controller.run, daemon=True)
+    thread.start()
+    for i in range(presses):
+        buttons.press("record" if (i//2) % 2 == 0 else "play")
+        time.sleep(0.001)
+    controller.stop()
+    thread.join()
+    latencies = sorted(controller.transitionLatencies)
+    return latencies[len(latencies)//2], latencies[int(len(latencies)*0.99)], latencies[-1]
+
+
+def benchIdleCpu(seconds:float):
+    controller = LEDController(FakeActions())
+    thread = threading.Thread(target=controller.run, daemon=True)
+    cpuStart = time.process_time()
+    thread.start()
+    time.sleep(seconds)
+    controller.stop()
+    thread.join()
+    return (time.process_time() - cpuStart) / seconds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--presses', type=int, default=1000)
+    parser.add_argument('--idle', type=float, default=2.0, help='seconds to measure idle CPU')
+    args = parser.parse_args()
+
+    error = checkStateMachine()
+    if error:
+        print(f"  FAIL: {error}")
+        sys.exit(1)
+    print("  state machine and debounce: PASS")
+    median, p99, worst = benchLatency(args.presses)
+    print(f"  press -> transition latency: median {median*1e6:.0f} us, p99 {p99*1e6:.0f} us, max {worst*1e6:.0f} us")
+    print(f"  idle CPU: {benchIdleCpu(args.idle)*100:.2f} % of a core")
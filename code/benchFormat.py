@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Compare recording and playback parsing cost of the legacy text saves vs the packed binary saves
+#   python3 ./code/benchFormat.py                     (synthetic take, 16 universes x 680 LEDs)
+#   python3 ./code/benchFormat.py --universes 4 --frames 2000
+
+import os
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from takeFormat import TakeHeader, BinaryTakeWriter, BinaryTakeReader, MappedTakeReader, TextTakeReader, writeMetadata
+
+
+def legacyWrite(file, timeStamp:float, data, pixelCount:int):
+    # what LEDRecord.recordCallback used to do for every packet
+    file.write(f'{timeStamp} ')
+    for ledCount in range(pixelCount):
+        dataIndex = ledCount*3
+        pixR, pixG, pixB = data[dataIndex], data[dataIndex+1], data[dataIndex+2]
+        file.write(f'{pixR} {pixG} {pixB} ')
+    file.write('\n')
+
+
+def legacyParseLine(file):
+    # what LEDPlayback.parseLine used to do for every frame
+    rawLine = file.readline()
+    if rawLine == '': return False
+    cleanLine = rawLine.strip().split()
+    frameData = [float(cleanLine[0])]
+    for i in range(1, len(cleanLine)):
+        frameData.append(int(cleanLine[i]))
+    return frameData
+
+
+def makePackets(count:int):
+    return [[random.randrange(256) for i in range(512)] for j in range(count)]
+
+
+def benchTake(path:str, header:TakeHeader, frames:int):
+    packets = makePackets(64)
+    packetCount = frames * header.universeCount
+    results = {}
+
+    start = time.perf_counter()
+    files = [open(f"{path}/U{u}.txt", "w+") for u in range(header.universeCount)]
+    for frame in range(frames):
+        for universe in range(header.universeCount):
+            legacyWrite(files[universe], frame/40, packets[(frame+universe) % 64], header.pixelCount(universe))
+    for file in files: file.close()
+    results["text record"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    writers = [BinaryTakeWriter(f"{path}/U{u}.bin", header.forUniverse(u)) for u in range(header.universeCount)]
+    for frame in range(frames):
+        for universe in range(header.universeCount):
+            writers[universe].write(frame/40, packets[(frame+universe) % 64])
+    for writer in writers: writer.close()
+    results["binary record"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for universe in range(header.universeCount):
+        with open(f"{path}/U{universe}.txt") as file:
+            while legacyParseLine(file) != False: pass
+    results["text parse (old parseLine)"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for universe in range(header.universeCount):
+        reader = TextTakeReader(f"{path}/U{universe}.txt")
+        while reader.readFrame() != False: pass
+        reader.close()
+    results["text parse (TextTakeReader)"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for universe in range(header.universeCount):
+        reader = BinaryTakeReader(f"{path}/U{universe}.bin")
+        while reader.readFrame() != False: pass
+        reader.close()
+    results["binary read"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for universe in range(header.universeCount):
+        reader = MappedTakeReader(f"{path}/U{universe}.bin")
+        while reader.readFrame() != False: pass
+        reader.close()
+    results["binary read (mmap)"] = time.perf_counter() - start
+
+    textSize = sum(os.path.getsize(f"{path}/U{u}.txt") for u in range(header.universeCount))
+    binSize = sum(os.path.getsize(f"{path}/U{u}.bin") for u in range(header.universeCount))
+    print(f"  {header.universeCount} universes x {frames} frames = {packetCount} packets")
+    for name, seconds in results.items():
+        print(f"  {name:30s} {seconds:8.3f} s  {packetCount/seconds:10.0f} packets/s")
+    print(f"  text size {textSize/1e6:.1f} MB, binary size {binSize/1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--universes', type=int, default=16, help='universe count (4 universes per 680 LED strip)')
+    parser.add_argument('--frames', type=int, default=1000, help='frames per universe')
+    args = parser.parse_args()
+
+    stripCount = (args.universes + 3) // 4
+    ledCounts = [680] * stripCount
+    universe2strip = [u // 4 for u in range(args.universes)]
+    universe2substrip = [u % 4 for u in range(args.universes)]
+    header = TakeHeader(ledCounts, universe2strip, universe2substrip)
+
+    path = tempfile.mkdtemp(prefix="benchFormat")
+    try:
+        writeMetadata(path, header)
+        benchTake(path, header, args.frames)
+    finally:
+        shutil.rmtree(path)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# CPU cost of the Art-Net ingest metrics (ingestMetrics.py) on the simulated backend, 16 universes (4 x 680 pixels)
+#   perPacket  the receiver's per packet work (IngestMetrics.packet + callbackDone around LEDRecord.recordCallback)
+#              with and without metrics, in us/packet, and what the difference costs at --rate frames/s
+#   recording  real recordings through the socket at --rate frames/s for --duration seconds (generator in its own
+#              process), process CPU % with and without metrics
+# The target is < 2 % CPU over a one hour recording
+#   python3 ./code/benchMetrics.py
+#   python3 ./code/benchMetrics.py --duration 60
+
+import time
+import shutil
+import argparse
+import tempfile
+from ledSession import LEDSession
+from newRecord import LEDRecord
+from ingestMetrics import IngestMetrics
+from artnetReceiver import SEQUENCE_TIMEOUT
+from bench import makePackets, setWireTime, quiet
+from benchProcesses import generate
+
+LED_COUNTS = [680]*4        # 16 universes
+PORT = 16556
+
+
+def benchPerPacket(session:LEDSession, saveDir:str, frames:int, withMetrics:bool):
+    packets = makePackets(session.universeCount, frames)
+    metrics = IngestMetrics(session.universeCount) if withMetrics else None
+    with quiet():
+        recorder = LEDRecord(session=session)
+        recorder.record(f"perPacket{int(withMetrics)}", saveDir)
+    callback = recorder.recordCallback
+    perf_counter = time.perf_counter
+    setWireTime(session, False)
+    with quiet():
+        cpuStart = time.process_time()
+        for frame, framePackets in enumerate(packets):
+            for universe, data in enumerate(framePackets):
+                now = perf_counter()            # same steps as ArtnetReceiver.run
+                if metrics is not None:
+                    metrics.packet(universe, frame % 255 + 1, now)
+                    callback(data, universe)
+                    metrics.callbackDone(perf_counter() - now)
+                else:
+                    callback(data, universe)
+        cpu = time.process_time() - cpuStart
+    setWireTime(session, True)
+    with quiet():
+        recorder.deinit()
+    return 1e6 * cpu / (frames * session.universeCount)
+
+
+def benchRecording(session:LEDSession, saveDir:str, name:str, duration:float, rate:float):
+    with quiet():
+        recorder = LEDRecord(session=session)
+        recorder.record(name, saveDir)
+    time.sleep(SEQUENCE_TIMEOUT)
+    with quiet():
+        wallStart, cpuStart = time.perf_counter(), time.process_time()
+        generate(PORT, session.universeCount, rate, duration=duration)
+        cpu, wall = time.process_time() - cpuStart, time.perf_counter() - wallStart
+        recorder.deinit()
+    return 100.0 * cpu / wall
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=2000, help='frames of the per packet run')
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of each recording run')
+    parser.add_argument('--rate', type=float, default=40.0, help='frames/s')
+    args = parser.parse_args()
+
+    tempDir = tempfile.mkdtemp(prefix="benchMetrics")
+    session = LEDSession(LED_COUNTS, backend="sim", artnetPort=PORT)
+    try:
+        plain = benchPerPacket(session, tempDir, args.frames, False)
+        measured = benchPerPacket(session, tempDir, args.frames, True)
+        packetRate = args.rate * session.universeCount
+        print(f"  perPacket   {plain:8.2f} us/packet without metrics, {measured:8.2f} us/packet with, "
+              f"+{measured - plain:.2f} us = {100.0 * (measured - plain) * 1e-6 * packetRate:.3f} % CPU at {packetRate:.0f} packets/s")
+
+        withoutCpu = benchRecording(session, tempDir, "recordingPlain", args.duration, args.rate)
+        session.enableMetrics(interval=args.duration/4, statsPath=f"{tempDir}/ingestStats.json")
+        session.metricsReporter.printSummary = False
+        withCpu = benchRecording(session, tempDir, "recordingMetrics", args.duration, args.rate)
+        print(f"  recording   {withoutCpu:8.2f} % CPU without metrics, {withCpu:8.2f} % with "
+              f"({withCpu - withoutCpu:+.2f} %), {args.rate:.0f} fps x {session.universeCount} universes")
+        print(session.metrics.summaryLine(session.metrics.summary()))
+    finally:
+        session.close()
+        shutil.rmtree(tempDir)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# Single process vs multi-process layout (ledProcesses.py) at 16 universes (4 x 680 pixels) on the simulated backend
+# Measured for both layouts, idle and with a GIL stall injected into a non-output stage (ingest, or the only process
+# for the single process layout): one C call that holds the GIL for --stall ms every --stall-period ms, standing in
+# for a GC pause or a CPU heavy packet burst.
+#   live       Art-Net at 40 fps through the socket: frame's last packet sent -> last strip show() (avg/p99/max)
+#   ingest     socket flooded for --flood seconds: ArtDmx packets received/s and frames shown/s
+#   playback   real-time playback at 40 fps: show interval deviation of strip 0 (avg/p99/max)
+# The Art-Net generator runs in its own process for both layouts. On a single core machine the stages share the CPU
+# through the OS scheduler, the isolation figures only mean something on the Zero 2's four cores.
+#   python3 ./code/benchProcesses.py
+#   python3 ./code/benchProcesses.py --frames 400 --stall 50
+
+import time
+import bisect
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from ledConfig import LEDConfig
+from ledSession import LEDSession
+from ledProcesses import LEDProcesses
+from newLive import LEDLive
+from newPlayback import LEDPlayback
+from artnetGenerator import ArtnetGenerator
+from artnetReceiver import SEQUENCE_TIMEOUT
+from bench import writeTake, quiet, FRAME_RATE
+
+LED_COUNTS = [680]*4        # 16 universes
+PORTS = {"single": 16554, "multi": 16555}
+
+# metric -> unit
+METRICS = {"liveLatencyAvg": "ms", "liveLatencyP99": "ms", "liveLatencyMax": "ms",
+           "ingestPackets": "packets/s", "shownFrames": "frames/s",
+           "jitterAvg": "ms", "jitterP99": "ms", "jitterMax": "ms"}
+
+
+def percentiles(values:list, prefix:str):
+    values = sorted(values) or [0.0]
+    return {prefix + "Avg": 1000*sum(values)/len(values),
+            prefix + "P99": 1000*values[int(0.99*(len(values)-1))],
+            prefix + "Max": 1000*values[-1]}
+
+
+def generate(port:int, universeCount:int, rate:float, frames:int = None, duration:float = None):
+    # runs an ArtnetGenerator in its own process, returns its frame times (perf_counter, same clock in every process)
+    context = multiprocessing.get_context("fork")
+    conn, childConn = context.Pipe()
+    def run():
+        generator = ArtnetGenerator(universeCount, rate, port=port)
+        time.sleep(0.1)
+        generator.run(duration, frames)
+        childConn.send((generator.frameTimes, generator.packetCount))
+        generator.close()
+    process = context.Process(target=run, daemon=True)
+    process.start()
+    frameTimes, packetCount = conn.recv()
+    process.join()
+    return frameTimes, packetCount
+
+
+def calibrateStall(seconds:float):
+    # size of a sum(range()) that takes about seconds: a single C call, the GIL isn't released during it
+    count = 1000000
+    start = time.perf_counter()
+    sum(range(count))
+    return max(1, int(count * seconds / (time.perf_counter() - start)))
+
+
+def startStall(stage, period:float, stall:float, duration:float):
+    # stage argument: called through LEDProcesses.call("ingest", "execute", startStall, ...) in the multi-process layout
+    if stall <= 0: return
+    count = calibrateStall(stall)
+    def run():
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            sum(range(count))
+            time.sleep(max(0.0, period - stall))
+    threading.Thread(target=run, name="Stall", daemon=True).start()
+
+
+class SingleLayout:
+    def __init__(self, config:LEDConfig):
+        self.session = LEDSession(config=config, backend="sim", artnetPort=PORTS["single"])
+        self.live = None
+
+    def startLive(self):
+        with quiet():
+            self.live = LEDLive(session=self.session)
+            self.live.start()
+
+    def stopLive(self):
+        with quiet():
+            self.live.deinit()
+
+    def packetCount(self):
+        return self.session.artnetServer.packetCount
+
+    def showTimes(self, strip:int):
+        return list(self.session.strips[strip].showTimes)
+
+    def play(self, takePath:str):
+        with quiet():
+            playback = LEDPlayback(takePath, audioPath=None, session=self.session)
+            playback.play()
+            while not playback.finished:
+                time.sleep(0.01)
+            playback.deinit()
+
+    def stall(self, period:float, stall:float, duration:float):
+        startStall(None, period, stall, duration)
+
+    def close(self):
+        self.session.close()
+
+
+class MultiLayout:
+    def __init__(self, config:LEDConfig):
+        config.artnetPort = PORTS["multi"]
+        with quiet():
+            self.processes = LEDProcesses(config, backend="sim")
+
+    def startLive(self):
+        with quiet():
+            self.processes.live()
+
+    def stopLive(self):
+        with quiet():
+            self.processes.stopIngest()
+
+    def packetCount(self):
+        return self.processes.call("ingest", "stats")["packets"]
+
+    def showTimes(self, strip:int):
+        return self.processes.call("output", "showTimes")[strip]
+
+    def play(self, takePath:str):
+        with quiet():
+            self.processes.load(takePath)
+            self.processes.play()
+            while not self.processes.status()["finished"]:
+                time.sleep(0.01)
+            self.processes.call("scheduler", "unload")
+
+    def stall(self, period:float, stall:float, duration:float):
+        self.processes.call("ingest", "execute", startStall, period, stall, duration)
+
+    def close(self):
+        with quiet():
+            self.processes.close()
+
+
+def benchLayout(layout, port:int, takePath:str, frames:int, flood:float, stall:float, stallPeriod:float):
+    result = {}
+    universeCount = 16
+    lastStrip = len(LED_COUNTS) - 1
+    layout.startLive()
+
+    time.sleep(SEQUENCE_TIMEOUT)
+    layout.stall(stallPeriod, stall, frames/FRAME_RATE + 1.0)
+    showStart = len(layout.showTimes(lastStrip))
+    frameTimes, packets = generate(port, universeCount, FRAME_RATE, frames=frames)
+    time.sleep(0.2)
+    showTimes = layout.showTimes(lastStrip)[showStart:]
+    # each frame is matched with the first show() after it was sent (frames merged by a late show count from their own send)
+    latencies = []
+    for sent in frameTimes:
+        shown = bisect.bisect_left(showTimes, sent)
+        if shown < len(showTimes): latencies.append(showTimes[shown] - sent)
+    if len(latencies) < frames:
+        print(f"  WARNING: {frames - len(latencies)} of {frames} live frames never shown")
+    result.update(percentiles(latencies, "liveLatency"))
+
+    time.sleep(SEQUENCE_TIMEOUT)
+    layout.stall(stallPeriod, stall, flood + 1.0)
+    packetStart, showStart = layout.packetCount(), len(layout.showTimes(lastStrip))
+    floodStart = time.perf_counter()
+    generate(port, universeCount, 0, duration=flood)
+    time.sleep(0.2)
+    elapsed = time.perf_counter() - floodStart
+    result["ingestPackets"] = (layout.packetCount() - packetStart) / elapsed
+    result["shownFrames"] = (len(layout.showTimes(lastStrip)) - showStart) / elapsed
+    layout.stopLive()
+
+    layout.stall(stallPeriod, stall, frames/FRAME_RATE + 1.0)
+    showStart = len(layout.showTimes(0))
+    layout.play(takePath)
+    showTimes = layout.showTimes(0)[showStart:showStart+frames]
+    result.update(percentiles([abs((later - earlier) - 1/FRAME_RATE) for earlier, later in zip(showTimes, showTimes[1:])],
+                              "jitter"))
+    return result
+
+
+def printResults(results:dict):
+    columns = list(results)
+    print(f"  {'':16}" + "".join(f"{column:>16}" for column in columns))
+    for name, unit in METRICS.items():
+        print(f"  {name:16}" + "".join(f"{results[column][name]:16.1f}" for column in columns) + f"  {unit}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=200, help='live and playback frames (at 40 fps)')
+    parser.add_argument('--flood', type=float, default=2.0, help='seconds of flooding the socket')
+    parser.add_argument('--stall', type=float, default=30.0, help='GIL stall injected in the loaded runs, ms (0 skips them)')
+    parser.add_argument('--stall-period', type=float, default=200.0, help='ms between GIL stalls')
+    parser.add_argument('--ring-slots', type=int, default=1024)
+    args = parser.parse_args()
+
+    tempDir = tempfile.mkdtemp(prefix="benchProcesses")
+    results = {}
+    try:
+        # the multi-process layout forks its stages, so it's set up before the single process layout starts threads
+        single = SingleLayout(LEDConfig.fromLedCounts(LED_COUNTS))
+        takePath = f"{tempDir}/benchTake"
+        writeTake(takePath, single.session, args.frames)
+        multi = MultiLayout(LEDConfig.fromLedCounts(LED_COUNTS))
+        stalls = [0.0] + ([args.stall/1000] if args.stall > 0 else [])
+        for name, layout in (("multi", multi), ("single", single)):
+            for stall in stalls:
+                column = name + (f" +{stall*1000:.0f}ms" if stall else "")
+                print(f"  {column}...")
+                results[column] = benchLayout(layout, PORTS[name], takePath, args.frames, args.flood, stall,
+                                              args.stall_period/1000)
+            layout.close()
+        printResults(results)
+    finally:
+        shutil.rmtree(tempDir)
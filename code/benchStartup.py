@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# Startup time budget, button press -> first LED frame, on the simulated backend (16 universes, 4 x 680 pixels)
+#   imports    python -X importtime of newCombo: total and the heaviest modules it pulls in
+#   cold       what a fresh interpreter per playback costs: interpreter + imports, session, take index, take load
+#              and timeline, play() -> first strip refresh. Each phase is timed on its own
+#   audio      pyaudio.PyAudio() device probe (only where pyaudio is installed)
+#   daemon     newCombo.py as the resident controller: startup until the control socket answers, then play/stop and
+#              record/stop through the socket: command -> reply and play command -> first strip refresh (the
+#              scheduler's first batch, time.monotonic() is the same clock in both processes)
+# Exits 1 when the imports or the daemon's press -> first frame latency are over their budget, the defaults are the
+# Zero 2 targets
+#   python3 ./code/benchStartup.py
+#   python3 ./code/benchStartup.py --runs 20 --play-budget 50
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from ledConfig import LEDConfig
+from ledSession import LEDSession
+from controlSocket import sendCommand
+from bench import writeTake
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+LED_COUNTS = [680]*4        # 16 universes
+ARTNET_PORT = 16557
+TAKE_FRAMES = 400
+
+COLD_SCRIPT = """
+import sys, time, json
+phases = {}
+start = time.monotonic()
+from newPlayback import LEDPlayback
+from ledSession import LEDSession
+from ledConfig import loadConfig
+from takeCache import TakeIndex
+phases["imports"] = time.monotonic() - start
+start = time.monotonic()
+session = LEDSession(config=loadConfig("./ledConfig.json"))
+phases["session"] = time.monotonic() - start
+start = time.monotonic()
+takeIndex = TakeIndex("./saves/")
+takeIndex.refresh()
+phases["takeIndex"] = time.monotonic() - start
+start = time.monotonic()
+playback = LEDPlayback(takeIndex.newest(), audioPath=None, session=session)
+phases["takeLoad"] = time.monotonic() - start
+start = time.monotonic()
+playback.play()
+while playback.scheduler.firstBatchTime is None:
+    time.sleep(0.0005)
+phases["firstFrame"] = playback.scheduler.firstBatchTime - start
+print(json.dumps({"phases": phases, "firstFrameTime": playback.scheduler.firstBatchTime}))
+playback.deinit()
+session.close()
+"""
+
+
+def childEnvironment():
+    return {**os.environ, "LED_BACKEND": "sim", "PYTHONPATH": CODE_DIR}
+
+
+def importTimes(module:str):
+    # (total seconds, [(seconds, module) of its direct imports, heaviest first])
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], capture_output=True,
+                            text=True, env=childEnvironment(), cwd=CODE_DIR)
+    total, children = 0.0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line: continue
+        selfTime, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() == module:
+            total = int(cumulative) / 1e6
+        elif depth == 1:
+            children.append((int(cumulative) / 1e6, name.strip()))
+    return total, sorted(children, reverse=True)
+
+
+def interpreterTime():
+    start = time.monotonic()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return time.monotonic() - start
+
+
+def benchCold(workDir:str):
+    start = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", COLD_SCRIPT], capture_output=True, text=True, env=childEnvironment(),
+                            cwd=workDir)
+    lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+    if not lines:
+        raise RuntimeError(f"cold start failed: {result.stderr.strip()[-500:]}")
+    report = json.loads(lines[-1])
+    report["total"] = report["firstFrameTime"] - start
+    return report
+
+
+def benchAudio():
+    try:
+        from audioEngine import openAudioDevice
+        start = time.monotonic()
+        audio = openAudioDevice()
+        elapsed = time.monotonic() - start
+        audio.terminate()
+        return elapsed
+    except Exception:
+        return None
+
+
+def waitForDaemon(socketPath:str, process, timeout:float = 30.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if process.poll() is not None:
+            raise RuntimeError(f"daemon exited with {process.returncode}")
+        try:
+            return sendCommand("status", socketPath)
+        except OSError:
+            time.sleep(0.01)
+    raise RuntimeError("daemon didn't open its control socket")
+
+
+def benchDaemon(workDir:str, runs:int):
+    socketPath = f"{workDir}/control.sock"
+    start = time.monotonic()
+    process = subprocess.Popen([sys.executable, f"{CODE_DIR}/newCombo.py", "--socket", socketPath], cwd=workDir,
+                               env=childEnvironment(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = {"firstFrame": [], "playReply": [], "stopReply": [], "recordReply": []}
+    try:
+        waitForDaemon(socketPath, process)
+        result["startup"] = time.monotonic() - start
+        for run in range(runs):
+            sent = time.monotonic()
+            reply = sendCommand("play", socketPath)
+            result["playReply"].append(time.monotonic() - sent)
+            if not reply["ok"]: raise RuntimeError(f"play failed: {reply}")
+            while reply.get("firstFrameTime") is None:
+                time.sleep(0.001)
+                reply = sendCommand("status", socketPath)
+            result["firstFrame"].append(reply["firstFrameTime"] - sent)
+            time.sleep(0.2)
+            sent = time.monotonic()
+            sendCommand("stop", socketPath)
+            result["stopReply"].append(time.monotonic() - sent)
+            time.sleep(0.1)             # a person doesn't press again within the strips' last wire time
+        sent = time.monotonic()
+        sendCommand("record", socketPath)
+        result["recordReply"].append(time.monotonic() - sent)
+        sendCommand("stop", socketPath)
+    finally:
+        process.terminate()             # SIGTERM -> SystemExit, the daemon cleans up
+        process.wait(timeout=10)
+    return result
+
+
+def stats(values:list):
+    return f"avg {1000*sum(values)/len(values):7.1f} ms / max {1000*max(values):7.1f} ms" if values else "n/a"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10, help='play/stop cycles through the daemon')
+    parser.add_argument('--import-budget', type=float, default=3000.0, help='ms for importing newCombo')
+    parser.add_argument('--play-budget', type=float, default=100.0, help='ms from the daemon play command to the first LED frame')
+    args = parser.parse_args()
+
+    workDir = tempfile.mkdtemp(prefix="benchStartup")
+    overBudget = []
+    try:
+        with open(f"{workDir}/ledConfig.json", "w") as configFile:
+            json.dump({"artnetPort": ARTNET_PORT, "outputs": [{"ledCount": count} for count in LED_COUNTS]}, configFile)
+        os.mkdir(f"{workDir}/saves")
+        session = LEDSession(config=LEDConfig.fromLedCounts(LED_COUNTS), backend="sim", artnetPort=ARTNET_PORT)
+        writeTake(f"{workDir}/saves/2024-01-01-00-00-00_save", session, TAKE_FRAMES)
+        session.close()
+
+        interpreter = interpreterTime()
+        importTotal, children = importTimes("newCombo")
+        print(f"  interpreter          {1000*interpreter:7.1f} ms")
+        print(f"  import newCombo      {1000*importTotal:7.1f} ms  (budget {args.import_budget:.0f} ms)")
+        for seconds, name in children[:8]:
+            print(f"    {name:18} {1000*seconds:7.1f} ms")
+        if 1000*importTotal > args.import_budget: overBudget.append("imports")
+
+        cold = benchCold(workDir)
+        print(f"  cold start -> first frame {1000*cold['total']:7.1f} ms, of which:")
+        for phase, seconds in cold["phases"].items():
+            print(f"    {phase:18} {1000*seconds:7.1f} ms")
+        audio = benchAudio()
+        print("  audio device probe   " + (f"{1000*audio:7.1f} ms" if audio is not None else "    n/a (no pyaudio)"))
+
+        daemon = benchDaemon(workDir, args.runs)
+        print(f"  daemon startup       {1000*daemon['startup']:7.1f} ms (once)")
+        print(f"  play -> first frame  {stats(daemon['firstFrame'])}  (budget {args.play_budget:.0f} ms)")
+        print(f"  play reply           {stats(daemon['playReply'])}")
+        print(f"  stop reply           {stats(daemon['stopReply'])}")
+        print(f"  record reply         {stats(daemon['recordReply'])}")
+        if daemon["firstFrame"] and 1000*max(daemon["firstFrame"]) > args.play_budget: overBudget.append("play")
+    finally:
+        shutil.rmtree(workDir)
+    if overBudget:
+        print(f"OVER BUDGET: {', '.join(overBudget)}")
+        sys.exit(1)
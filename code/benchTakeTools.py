@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# End to end check of takeTools.py: generates a 4 universe take (2 strips of 340 pixels, 40 fps) and runs
+#   trim       --universes 1-2 (one universe of each strip) --start 0.5 --end 2.5, to text
+#   merge      the source and the trimmed take, --offsets 0,0.3 (the trimmed take's empty universes included), to binary
+#   resample   --rate 25, to delta
+# through the command line, then plays every output on the simulated backend (LEDPlayback.playCallback at sample
+# times half way between frames) and compares the strips' frame buffers with the source routed directly: the latest
+# source record of every universe at the matching source time, through a session of the output's layout. A universe
+# that lands on the wrong strip or pixels, a shifted time stamp or a lost frame shows up as a mismatch. Exits 1 on one
+#   python3 ./code/benchTakeTools.py
+
+import os
+import sys
+import math
+import shutil
+import bisect
+import tempfile
+import subprocess
+import numpy as np
+from ledSession import LEDSession
+from newPlayback import LEDPlayback
+from takeFormat import TakeHeader, readTakeMetadata, openTakeReader, writeMetadata, BinaryTakeWriter
+from artnetGenerator import ArtnetGenerator
+from bench import quiet
+
+LED_COUNTS = [340, 340]     # 2 universes per strip
+FRAME_RATE = 40.0
+FRAMES = 160
+UNIVERSE_SKEW = 0.0005      # seconds between the universes of a frame, well within the timeline tolerance
+TAKE_TOOLS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "takeTools.py")
+
+
+def writeSource(path:str):
+    session = LEDSession(LED_COUNTS, backend="sim")
+    header = TakeHeader(session.ledCounts, session.universe2strip, session.universe2substrip)
+    session.close()
+    os.mkdir(path)
+    generator = ArtnetGenerator(header.universeCount)
+    for universe in range(header.universeCount):
+        writer = BinaryTakeWriter(f"{path}/U{universe}.bin", header.forUniverse(universe))
+        for frame in range(FRAMES):
+            writer.write(frame/FRAME_RATE + universe*UNIVERSE_SKEW, generator.frameData(universe, frame)[:510])
+        writer.close()
+    writeMetadata(path, header)
+    generator.close()
+
+
+def readRecords(path:str):
+    # universe -> ([time stamps], [pixels])
+    records = []
+    for universe in range(readTakeMetadata(path).universeCount):
+        reader = openTakeReader(path, universe, mapped=False)
+        timeStamps, pixels = [], []
+        while True:
+            frameData = reader.readFrame()
+            if frameData == False: break
+            timeStamps.append(frameData[0])
+            pixels.append(bytes(frameData[1]))
+        reader.close()
+        records.append((timeStamps, pixels))
+    return records
+
+
+def runTool(*arguments):
+    result = subprocess.run([sys.executable, TAKE_TOOLS, *arguments], capture_output=True, text=True)
+    return result.returncode, result.stdout.strip()
+
+
+def snapshot(session:LEDSession):
+    return np.concatenate([frameBuffer.pixels.reshape(-1) for frameBuffer in session.frameBuffers])
+
+
+def playedStates(path:str, session:LEDSession, sampleTimes:list):
+    # frame buffers of a playback after every frame due at each sample time (ascending)
+    for frameBuffer in session.frameBuffers:
+        frameBuffer.pixels[:] = 0
+    with quiet():
+        playback = LEDPlayback(path, audioPath=None, session=session)
+    playback.cue(0.0)
+    states = []
+    for sampleTime in sampleTimes:
+        playback.playCallback(0, sampleTime)
+        states.append(snapshot(session))
+    with quiet():
+        playback.deinit()
+    return states
+
+
+def expectedStates(session:LEDSession, sources:list, sampleTimes:list):
+    # sources: [(output universe, (source time stamps, pixels), output time -> source time)], every source universe's
+    # latest record at or before the mapped time, routed from dark
+    states = []
+    for sampleTime in sampleTimes:
+        for frameBuffer in session.frameBuffers:
+            frameBuffer.pixels[:] = 0
+        for universe, (timeStamps, pixels), sourceTime in sources:
+            index = bisect.bisect_right(timeStamps, sourceTime(sampleTime)) - 1
+            if index >= 0:
+                session.router.route(universe, pixels[index])
+        states.append(snapshot(session))
+    return states
+
+
+def check(name:str, path:str, sources:list, sampleTimes:list):
+    header = readTakeMetadata(path)
+    playSession = LEDSession(header.ledCounts, backend="sim")
+    referenceSession = LEDSession(header.ledCounts, backend="sim")
+    try:
+        played = playedStates(path, playSession, sampleTimes)
+        expected = expectedStates(referenceSession, sources, sampleTimes)
+    finally:
+        playSession.close()
+        referenceSession.close()
+    wrong = [sampleTime for sampleTime, actual, reference in zip(sampleTimes, played, expected)
+             if not np.array_equal(actual, reference)]
+    if wrong:
+        print(f"  FAIL: {name}: {len(wrong)} of {len(sampleTimes)} samples differ from the source, "
+              f"first at {wrong[0]:.4f} s")
+        sys.exit(1)
+    print(f"  {name:9} {header.universeCount} universes on {header.ledCounts}, {len(sampleTimes)} samples OK")
+
+
+def midFrames(duration:float, rate:float):
+    # half way between the frames of a rate grid, clear of the frames' universe skew
+    return [(frame + 0.5) / rate for frame in range(int(duration * rate))]
+
+
+def runTools(tempDir:str):
+    source = f"{tempDir}/source_save"
+    writeSource(source)
+    sourceRecords = readRecords(source)
+    universeCount = len(sourceRecords)
+    duration = FRAMES / FRAME_RATE
+
+    for arguments in (["trim", source, "--universes", "1-2", "--start", "0.5", "--end", "2.5", "--to", "txt",
+                       "-o", f"{tempDir}/trim_save"],
+                      ["merge", source, f"{tempDir}/trim_save", "--offsets", "0,0.3", "-o", f"{tempDir}/merge_save"],
+                      ["resample", source, "--rate", "25", "--to", "delta", "-o", f"{tempDir}/resample_save"]):
+        status, output = runTool(*arguments)
+        print(output)
+        if status != 0:
+            print(f"  FAIL: takeTools.py {arguments[0]} exited with {status}")
+            sys.exit(1)
+    status, output = runTool("resample", source, "--rate", "0", "-o", f"{tempDir}/rate0_save")
+    if status == 0 or os.path.exists(f"{tempDir}/rate0_save"):
+        print(f"  FAIL: resample --rate 0 wasn't rejected ({output})")
+        sys.exit(1)
+
+    # trim: only universes 1 and 2 at source time + 0.5 (nothing before 0, the last frame before 2.5 s holds), the
+    # others stay dark
+    trimTime = lambda t: min(t + 0.5, 2.5 - 1e-6) if t >= 0 else -1.0
+    trimmed = [(universe, sourceRecords[universe], trimTime) for universe in (1, 2)]
+    check("trim", f"{tempDir}/trim_save", trimmed, midFrames(2.0, FRAME_RATE))
+    # merge: the source on strips 0-1, the trimmed take 0.3 s later on strips 2-3 (universes 4-7)
+    merged = [(universe, sourceRecords[universe], lambda t: t) for universe in range(universeCount)]
+    merged += [(universeCount + universe, records, lambda t, sourceTime=sourceTime: sourceTime(t - 0.3))
+               for universe, records, sourceTime in trimmed]
+    check("merge", f"{tempDir}/merge_save", merged, midFrames(duration, FRAME_RATE))
+    # resample: every 40 ms tick shows the latest source frame at or before the tick
+    rate = 25.0
+    resampled = [(universe, sourceRecords[universe], lambda t: math.floor(t * rate) / rate)
+                 for universe in range(universeCount)]
+    check("resample", f"{tempDir}/resample_save", resampled, midFrames(duration, rate))
+
+
+if __name__ == "__main__":
+    tempDir = tempfile.mkdtemp(prefix="benchTakeTools")
+    try:
+        runTools(tempDir)
+    finally:
+        shutil.rmtree(tempDir)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Frame timeline build (takeTimeline.py): the numpy cluster path against a plain record-by-record construction
+# (every record in (time stamp, universe) order, a new frame on a repeated universe or more than the tolerance after
+# the frame's first record) on synthetic takes in RAM:
+#   burst      16 universes at 40 fps, sent in a burst with jitter
+#   repeats    16 universes, some packets resent within the tolerance and some bursts longer than it
+#   wide63     64 universes (universe 63: the bit masks don't fit, every cluster is split in Python), with repeats
+#   wide       70 universes with repeats, timeline over a subset above 63 with an empty universe
+# frameTimes, frameEnds, frameUniverses and splitFrames must be identical, exits 1 if not
+#   python3 ./code/benchTimeline.py
+#   python3 ./code/benchTimeline.py --frames 20000
+
+import io
+import sys
+import time
+import random
+import argparse
+from takeFormat import TakeHeader, BinaryTakeWriter, BufferTakeReader, UNIVERSE_BYTES
+from takeTimeline import buildTimeline, readerTimeStamps, TIMELINE_TOLERANCE
+
+FRAME_RATE = 40.0
+
+
+def universeTimes(universeCount:int, frames:int, skew:float, jitter:float, repeats:float, slowBursts:float):
+    # per universe time stamps: frame/rate + universe*skew + jitter, a repeats fraction of the packets sent again
+    # 0.5-3 ms later, a slowBursts fraction of the frames sent at 4x the skew (burst longer than the tolerance)
+    random.seed(universeCount * 1000 + frames)
+    times = [[] for universe in range(universeCount)]
+    for frame in range(frames):
+        frameSkew = skew * (4 if random.random() < slowBursts else 1)
+        for universe in range(universeCount):
+            timeStamp = frame/FRAME_RATE + universe*frameSkew + random.uniform(0, jitter)
+            times[universe].append(timeStamp)
+            if random.random() < repeats:
+                times[universe].append(timeStamp + random.uniform(0.0005, 0.003))
+    return [sorted(universeStamps) for universeStamps in times]
+
+
+def makeReaders(times:list):
+    # binary takes in RAM holding only the time stamps (dark pixels)
+    universeCount = len(times)
+    header = TakeHeader([680] * 4, [universe % 4 for universe in range(universeCount)],
+                        [universe // 4 for universe in range(universeCount)])
+    readers = []
+    for universe, universeStamps in enumerate(times):
+        file = io.BytesIO()
+        writer = BinaryTakeWriter(file, header.forUniverse(universe))
+        for timeStamp in universeStamps:
+            writer.write(timeStamp, bytes(UNIVERSE_BYTES))
+        readers.append(BufferTakeReader(file.getvalue(), header.forUniverse(universe)))
+    return readers
+
+
+def recordByRecord(readers:list, universes:list, tolerance:float = TIMELINE_TOLERANCE):
+    # (frameTimes, frameEnds, frameUniverses, splitFrames) one record at a time
+    records = sorted((timeStamp, universe) for universe in universes
+                     for timeStamp in readerTimeStamps(readers[universe]).tolist())
+    frames = []
+    splitFrames = 0
+    for timeStamp, universe in records:
+        if frames:
+            frame = frames[-1]
+            if timeStamp - frame[0] <= tolerance:
+                if universe not in frame[2]:
+                    frame[1] = timeStamp
+                    frame[2].add(universe)
+                    continue
+                splitFrames += 1
+        frames.append([timeStamp, timeStamp, {universe}])
+    frameUniverses = [tuple(universe for universe in universes if universe in frame[2]) for frame in frames]
+    return [frame[0] for frame in frames], [frame[1] for frame in frames], frameUniverses, splitFrames
+
+
+def benchScenario(name:str, times:list, universes:list):
+    readers = makeReaders(times)
+    start = time.perf_counter()
+    timeline = buildTimeline(readers, universes)
+    fastTime = time.perf_counter() - start
+    start = time.perf_counter()
+    frameTimes, frameEnds, frameUniverses, splitFrames = recordByRecord(readers, universes)
+    referenceTime = time.perf_counter() - start
+    for field, fast, reference in (("frameTimes", list(timeline.frameTimes), frameTimes),
+                                   ("frameEnds", list(timeline.frameEnds), frameEnds),
+                                   ("frameUniverses", timeline.frameUniverses, frameUniverses),
+                                   ("splitFrames", timeline.splitFrames, splitFrames)):
+        if fast != reference:
+            if isinstance(fast, list):
+                index = next((frame for frame, (a, b) in enumerate(zip(fast, reference)) if a != b),
+                             min(len(fast), len(reference)))
+                detail = f"{len(fast)} vs {len(reference)} entries, first difference at frame {index}"
+            else:
+                detail = f"{fast} vs {reference}"
+            print(f"  FAIL: {name}: {field} differs from the record-by-record timeline ({detail})")
+            sys.exit(1)
+    print(f"  {name:8} {timeline.recordCount:8} records  {timeline.frameCount:7} frames  "
+          f"{timeline.splitFrames:5} split  build {fastTime*1000:7.1f} ms  record-by-record {referenceTime*1000:7.1f} ms  "
+          f"({referenceTime/max(1e-9, fastTime):4.1f}x)  identical")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--frames', type=int, default=4000, help='frames per take')
+    args = parser.parse_args()
+
+    frames = args.frames
+    benchScenario("burst", universeTimes(16, frames, 0.0002, 0.001, 0.0, 0.0), list(range(16)))
+    benchScenario("repeats", universeTimes(16, frames, 0.0002, 0.001, 0.02, 0.05), list(range(16)))
+    benchScenario("wide63", universeTimes(64, frames, 0.00005, 0.001, 0.01, 0.05), list(range(64)))
+    wideTimes = universeTimes(70, frames, 0.00005, 0.001, 0.01, 0.05)
+    wideTimes[66] = []
+    benchScenario("wide", wideTimes, [0, 5, 40, 62, 63, 64, 66, 69])
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# Local control socket of the resident controller (newCombo.py): one command per line, one JSON reply line each
+#   play     Idle -> Playback of the newest take
+#   record   Idle -> Record
+#   stop     back to Idle from Record or Playback
+#   status   mode, current take, clock, press -> transition latency
+# Commands go through the controller's event queue like button presses, so the state machine only ever runs on the
+# main thread and buttons and socket can be mixed. The socket is a Unix socket, only reachable from the Pi itself.
+#   python3 ./code/controlSocket.py play
+#   python3 ./code/controlSocket.py status
+#   echo stop | socat - UNIX-CONNECT:/tmp/ledController.sock
+
+import os
+import sys
+import json
+import socket
+import argparse
+import threading
+
+CONTROL_SOCKET = os.environ.get("LED_CONTROL_SOCKET", "/tmp/ledController.sock")
+STOP_BUTTONS = {"Record": "record", "Playback": "play"}     # mode -> press that leaves it
+
+
+class ControlServer:
+    def __init__(self, controller, path:str = CONTROL_SOCKET, statusCallback = None):
+        # statusCallback(): dict merged into every reply (e.g. ComboActions.status)
+        self.controller = controller
+        self.path = path
+        self.statusCallback = statusCallback
+        if os.path.exists(path):
+            os.remove(path)             # left behind by a killed daemon
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.bind(path)
+        os.chmod(path, 0o660)
+        self.socket.listen(4)
+        self.thread = threading.Thread(target=self.run, name="ControlServer", daemon=True)
+        self.thread.start()
+
+    def status(self):
+        controller = self.controller
+        status = {"ok": True, "mode": controller.mode,
+                  "lastLatency": controller.transitionLatencies[-1] if controller.transitionLatencies else None}
+        if self.statusCallback is not None:
+            status.update(self.statusCallback())
+        return status
+
+    def handle(self, command:str):
+        command = command.strip().lower()
+        mode = self.controller.mode
+        if command == "status":
+            return self.status()
+        if command in ("play", "record"):
+            if mode != "Idle": return {**self.status(), "ok": False, "error": f"busy ({mode})"}
+            button = command
+        elif command == "stop":
+            button = STOP_BUTTONS.get(mode)
+            if button is None: return self.status()
+        else:
+            return {**self.status(), "ok": False, "error": f"unknown command {command!r}"}
+        if not self.controller.submit(button):
+            return {**self.status(), "ok": False, "error": "controller busy, timed out"}
+        status = self.status()
+        if status["mode"] == mode:
+            return {**status, "ok": False, "error": f"{command} failed, still {mode}"}     # e.g. no saves to play
+        return status
+
+    def serve(self, connection):
+        with connection, connection.makefile("rwb") as stream:
+            for line in stream:
+                if not line.strip(): continue
+                try:
+                    reply = self.handle(line.decode(errors="replace"))
+                except Exception as e:
+                    reply = {"ok": False, "error": str(e)}
+                stream.write(json.dumps(reply).encode() + b"\n")
+                stream.flush()
+
+    def run(self):
+        while True:
+            try:
+                connection, address = self.socket.accept()
+            except OSError:
+                return                  # closed
+            threading.Thread(target=self.serveConnection, args=(connection,), name="ControlConnection", daemon=True).start()
+
+    def serveConnection(self, connection):
+        try:
+            self.serve(connection)
+        except OSError as e:
+            print(f"  Control connection error: {e}")
+
+    def close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        self.thread.join(timeout=1.0)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def sendCommand(command:str, path:str = CONTROL_SOCKET, timeout:float = 15.0):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(path)
+        client.sendall(command.encode() + b"\n")
+        with client.makefile("rb") as stream:
+            return json.loads(stream.readline())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=["play", "record", "stop", "status"])
+    parser.add_argument('--socket', default=CONTROL_SOCKET, help=f'control socket (default: $LED_CONTROL_SOCKET or {CONTROL_SOCKET})')
+    args = parser.parse_args()
+
+    try:
+        reply = sendCommand(args.command, args.socket)
+    except OSError as e:
+        print(f"  Unable to reach the controller at {args.socket}: {e}")
+        sys.exit(1)
+    print(json.dumps(reply, indent=1))
+    sys.exit(0 if reply.get("ok") else 1)
@@ -0,0 +1,133 @@
+import time
+import queue
+import threading
+
+# Event-driven controller: button edges (GPIO interrupts, or a mock input off-device) are debounced and queued,
+# and the main thread blocks on the queue and runs the Idle/Record/Playback state machine. Nothing polls.
+
+DEBOUNCE_TIME = 0.3         # presses of the same button closer together than this are contact bounce / double presses
+
+
+class LEDController:
+    def __init__(self, actions, debounceTime:float = DEBOUNCE_TIME):
+        # actions: object with startRecord(), stopRecord(), startPlayback(), stopPlayback()
+        #          start actions return False when the mode could not be entered, an optional reset() cleans up after
+        #          an action raised
+        self.actions = actions
+        self.debounceTime = debounceTime
+        self.mode = "Idle"
+        self.events = queue.Queue()
+        self.lastPress = {}
+        self.transitions = {("Idle", "record"):     ("Record", actions.startRecord),
+                            ("Record", "record"):   ("Idle", actions.stopRecord),
+                            ("Idle", "play"):       ("Playback", actions.startPlayback),
+                            ("Playback", "play"):   ("Idle", actions.stopPlayback)}
+        self.pressCount = 0
+        self.bounceCount = 0        # edges rejected by the software debounce
+        self.ignoredCount = 0       # presses with no transition in the current mode
+        self.transitionLatencies = []
+
+    def buttonPressed(self, button:str):
+        # called from the GPIO edge thread (or a mock input), only timestamps and queues the press
+        now = time.monotonic()
+        if now - self.lastPress.get(button, -self.debounceTime) < self.debounceTime:
+            self.bounceCount += 1
+            return
+        self.lastPress[button] = now
+        self.pressCount += 1
+        self.events.put((button, now))
+
+    def submit(self, button:str, timeout:float = 10.0):
+        # press from another thread (the control socket) that waits until the main thread has handled it, no debounce
+        done = threading.Event()
+        self.events.put((button, time.monotonic(), done))
+        return done.wait(timeout)
+
+    def handleEvent(self, button:str, pressTime:float, done:threading.Event = None):
+        try:
+            transition = self.transitions.get((self.mode, button))
+            if transition is None:
+                self.ignoredCount += 1
+                return
+            newMode, action = transition
+            try:
+                if action() == False: return        # e.g. no saves to play back, stay in the current mode
+            except Exception as e:
+                # a broken take folder, an audio device error...: the resident controller keeps running
+                print(f"  {button} in {self.mode} mode failed: {type(e).__name__}: {e}")
+                self.recover()
+                return
+            self.mode = newMode
+            self.transitionLatencies.append(time.monotonic() - pressTime)
+            if self.mode == "Idle":
+                print("LED Controller idle\nWaiting for button press...")
+        finally:
+            if done is not None: done.set()
+
+    def recover(self):
+        # after a failed action: actions.reset() (optional) tears down whatever was half started or stopped, Idle
+        reset = getattr(self.actions, "reset", None)
+        if reset is not None:
+            try:
+                reset()
+            except Exception as e:
+                print(f"  Reset after the failure failed too: {type(e).__name__}: {e}")
+        self.mode = "Idle"
+        print("LED Controller idle\nWaiting for button press...")
+
+    def run(self):
+        print("LED Controller idle\nWaiting for button press...")
+        while True:
+            event = self.events.get()           # blocks, no CPU used while idle
+            if event is None: return
+            self.handleEvent(*event)
+
+    def stop(self):
+        self.events.put(None)
+
+    def shutdown(self):
+        # leave the current mode, e.g. on exit
+        if self.mode == "Record":
+            self.actions.stopRecord()
+        elif self.mode == "Playback":
+            self.actions.stopPlayback()
+        self.mode = "Idle"
+
+
+class GPIOButtonInput:
+    # falling edges on pulled-up button pins -> callback(button name)
+    def __init__(self, buttonPins:dict, callback, bounceTime:int = 50, gpio = None):
+        # gpio: RPi.GPIO or ledHardware.FakeGPIO, picked from $LED_BACKEND if None
+        if gpio is None:
+            from ledHardware import getGPIO     # imported here so the controller can be run off the Pi with MockButtonInput
+            gpio = getGPIO()
+        GPIO = self.GPIO = gpio
+        self.buttonPins = buttonPins
+        self.callback = callback
+        GPIO.setmode(GPIO.BCM)
+        for button, pin in buttonPins.items():
+            GPIO.setup(pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+            GPIO.add_event_detect(pin, GPIO.FALLING, callback=lambda channel, button=button: self.edge(button, channel),
+                                  bouncetime=bounceTime)
+
+    def edge(self, button:str, channel:int):
+        if not self.GPIO.input(channel):        # still pressed, filters out noise spikes
+            self.callback(button)
+
+    def close(self):
+        for pin in self.buttonPins.values():
+            self.GPIO.remove_event_detect(pin)
+        self.GPIO.cleanup(list(self.buttonPins.values()))
+
+
+class MockButtonInput:
+    # stands in for GPIOButtonInput off-device: press() delivers the same events
+    def __init__(self, buttonPins:dict, callback):
+        self.buttonPins = buttonPins
+        self.callback = callback
+
+    def press(self, button:str):
+        self.callback(button)
+
+    def close(self):
+        pass
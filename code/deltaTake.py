@@ -0,0 +1,288 @@
+import os
+import zlib
+import struct
+import array
+import bisect
+import numpy as np
+from takeFormat import (TakeHeader, readHeader, takeDuration, DELTA_MAGIC, UNIVERSE_BYTES, TIMESTAMP_STRUCT, RECORD_SIZE)
+
+# Delta/keyframe take encoding: U{n}.dlt, one file per universe
+#   header:  the binary take header (takeFormat.TakeHeader) with magic "LEDD"
+#   blocks:  block header (codec, frame count, stored size, raw size, first time stamp) + payload, zlib compressed by
+#            default. Every block starts with a keyframe, so decoding can start at any block. The payload is a list of
+#            frames: time stamp + kind +
+#              KEY:     510 raw DMX bytes
+#              REPEAT:  nothing, same pixels as the previous frame (unchanged packet)
+#              DELTA:   run count + (offset, length, bytes) per run of changed channels
+#   index:   (first time stamp, file offset) per block, then the time stamp of every frame (float64, zlib compressed)
+#            and its (magic, offset, stored size), then a trailer with the block/frame count, the last time stamp and
+#            the index offset. Written by close(); if it's missing (power cut while recording) the reader rebuilds it
+#            by walking the block headers, losing at most the last unfinished block. The frame time stamps let
+#            playback build its timeline (takeTimeline.py) without decoding a single frame; takes written before
+#            they were stored (or without a trailer) walk the frame headers of each block instead.
+
+BLOCK_STRUCT = struct.Struct("<BBHIId")         # codec, unused, frame count, stored size, raw size, first time stamp
+INDEX_STRUCT = struct.Struct("<dQ")             # first time stamp, offset of the block header
+TRAILER_STRUCT = struct.Struct("<4sIQdQ")       # magic, block count, frame count, last time stamp, index offset
+TRAILER_MAGIC = b"LDIX"
+TIMES_STRUCT = struct.Struct("<4sQQ")           # magic, offset, stored size of the compressed frame time stamps
+TIMES_MAGIC = b"LDTM"
+FRAME_STRUCT = struct.Struct("<dB")             # time stamp, frame kind
+RUN_COUNT_STRUCT = struct.Struct("<H")
+RUN_STRUCT = struct.Struct("<HH")               # channel offset, length
+KEY, REPEAT, DELTA = 0, 1, 2
+CODEC_NONE, CODEC_ZLIB = 0, 1
+KEYFRAME_INTERVAL = 64      # frames per block, i.e. a keyframe at least every 1.6 s at 40 fps
+MERGE_GAP = 4               # unchanged channels between two changed runs cheaper to store than a new run header
+
+
+def changedRuns(previous:bytes, current:bytes):
+    # [(start, end), ...] channel ranges that differ, runs closer than MERGE_GAP merged
+    changed = np.flatnonzero(np.frombuffer(previous, np.uint8) != np.frombuffer(current, np.uint8))
+    if len(changed) == 0: return []
+    breaks = np.flatnonzero(np.diff(changed) > MERGE_GAP)
+    starts = np.concatenate((changed[:1], changed[breaks+1]))
+    ends = np.concatenate((changed[breaks], changed[-1:])) + 1
+    return list(zip(starts.tolist(), ends.tolist()))
+
+
+class DeltaTakeWriter:
+    def __init__(self, filePath, header:TakeHeader, keyframeInterval:int = KEYFRAME_INTERVAL, compression:str = "zlib",
+                 level:int = 1):
+        # filePath: path of the U{n}.dlt file, or an open binary file object
+        # compression: "zlib" or None; level 1 is the fastest zlib level and compresses these payloads nearly as well
+        self.file = open(filePath, "wb") if isinstance(filePath, str) else filePath
+        self.file.write(header.pack(DELTA_MAGIC))
+        self.file.flush()           # readable header even if the recording is cut off before the first block
+        self.offset = header.headerSize
+        self.keyframeInterval = keyframeInterval
+        self.codec = CODEC_ZLIB if compression == "zlib" else CODEC_NONE
+        self.level = level
+        self.previous = None
+        self.block = bytearray()
+        self.blockFrames = 0
+        self.blockStart = 0.0
+        self.index = []
+        self.frameTimes = array.array("d")      # written with the index, 8 bytes per frame until close()
+        self.frameCount = 0
+        self.lastTimeStamp = 0.0
+        self.kindCounts = [0, 0, 0]
+
+    def write(self, timeStamp:float, data):
+        pixelData = bytes(data[:UNIVERSE_BYTES])
+        if len(pixelData) < UNIVERSE_BYTES:
+            pixelData += bytes(UNIVERSE_BYTES - len(pixelData))     # short DMX packet, don't keep stale pixels
+        if self.blockFrames >= self.keyframeInterval:
+            self.flushBlock()
+        block = self.block
+        if self.blockFrames == 0:
+            self.blockStart = timeStamp
+            kind = KEY
+        elif pixelData == self.previous:
+            kind = REPEAT
+        else:
+            runs = changedRuns(self.previous, pixelData)
+            kind = DELTA if RUN_COUNT_STRUCT.size + sum(RUN_STRUCT.size + end - start for start, end in runs) < UNIVERSE_BYTES else KEY
+        block += FRAME_STRUCT.pack(timeStamp, kind)
+        if kind == KEY:
+            block += pixelData
+        elif kind == DELTA:
+            block += RUN_COUNT_STRUCT.pack(len(runs))
+            for start, end in runs:
+                block += RUN_STRUCT.pack(start, end - start)
+                block += pixelData[start:end]
+        self.kindCounts[kind] += 1
+        self.frameTimes.append(timeStamp)
+        self.previous = pixelData
+        self.blockFrames += 1
+        self.frameCount += 1
+        self.lastTimeStamp = timeStamp
+
+    def writeBatch(self, records:list):
+        # records: packed take records (time stamp + 510 bytes) as queued by recordWriter.AsyncTakeWriter
+        for record in records:
+            self.write(TIMESTAMP_STRUCT.unpack_from(record)[0], record[TIMESTAMP_STRUCT.size:])
+
+    def flushBlock(self):
+        if self.blockFrames == 0: return
+        raw = bytes(self.block)
+        payload = zlib.compress(raw, self.level) if self.codec == CODEC_ZLIB else raw
+        self.file.write(BLOCK_STRUCT.pack(self.codec, 0, self.blockFrames, len(payload), len(raw), self.blockStart))
+        self.file.write(payload)
+        self.index.append((self.blockStart, self.offset))
+        self.offset += BLOCK_STRUCT.size + len(payload)
+        self.block = bytearray()
+        self.blockFrames = 0
+
+    def sync(self):
+        # completed blocks to disk. The open block is left to fill up (flushed by write() or close()): ending it here
+        # would start a new keyframe block on every fsync, up to one per writer batch with fsyncInterval=0. A power
+        # cut loses at most that block, keyframeInterval frames
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.flushBlock()
+        for entry in self.index:
+            self.file.write(INDEX_STRUCT.pack(*entry))
+        timesOffset = self.offset + len(self.index)*INDEX_STRUCT.size
+        times = zlib.compress(self.frameTimes.tobytes(), self.level)
+        self.file.write(times)
+        self.file.write(TIMES_STRUCT.pack(TIMES_MAGIC, timesOffset, len(times)))
+        self.file.write(TRAILER_STRUCT.pack(TRAILER_MAGIC, len(self.index), self.frameCount, self.lastTimeStamp, self.offset))
+        self.file.close()
+
+    def stats(self):
+        return (f"{self.frameCount} frames in {len(self.index)} blocks: {self.kindCounts[KEY]} key, "
+                f"{self.kindCounts[DELTA]} delta, {self.kindCounts[REPEAT]} repeat, "
+                f"{self.offset/max(1, self.frameCount*RECORD_SIZE)*100:.1f} % of the packed size")
+
+
+class DeltaTakeReader:
+    def __init__(self, filePath:str):
+        self.file = open(filePath, "rb")
+        self.header = readHeader(self.file)
+        self.fileSize = os.fstat(self.file.fileno()).st_size
+        self.blockTimes = []        # first time stamp of each block
+        self.blockOffsets = []
+        self.frameCount = 0
+        self.lastTimeStamp = 0.0
+        self.times = None           # (offset, stored size) of the frame time stamps, None in older takes
+        self.loadIndex()
+        self.rewind()
+
+    def loadIndex(self):
+        if self.fileSize >= self.header.headerSize + TRAILER_STRUCT.size:
+            self.file.seek(self.fileSize - TRAILER_STRUCT.size)
+            magic, blockCount, frameCount, lastTimeStamp, indexOffset = TRAILER_STRUCT.unpack(self.file.read(TRAILER_STRUCT.size))
+            if magic == TRAILER_MAGIC:
+                self.file.seek(indexOffset)
+                raw = self.file.read(blockCount*INDEX_STRUCT.size)
+                for blockTime, offset in INDEX_STRUCT.iter_unpack(raw):
+                    self.blockTimes.append(blockTime)
+                    self.blockOffsets.append(offset)
+                self.frameCount, self.lastTimeStamp = frameCount, lastTimeStamp
+                self.dataEnd = indexOffset
+                timesEnd = self.fileSize - TRAILER_STRUCT.size - TIMES_STRUCT.size
+                if timesEnd >= indexOffset + blockCount*INDEX_STRUCT.size:
+                    self.file.seek(timesEnd)
+                    magic, timesOffset, timesSize = TIMES_STRUCT.unpack(self.file.read(TIMES_STRUCT.size))
+                    if magic == TIMES_MAGIC and timesOffset + timesSize == timesEnd:
+                        self.times = (timesOffset, timesSize)
+                return
+        # no trailer (recording didn't close the file): walk the block headers
+        offset = self.header.headerSize
+        self.file.seek(offset)
+        while offset + BLOCK_STRUCT.size <= self.fileSize:
+            codec, unused, frames, storedSize, rawSize, blockTime = BLOCK_STRUCT.unpack(self.file.read(BLOCK_STRUCT.size))
+            if offset + BLOCK_STRUCT.size + storedSize > self.fileSize: break       # cut off mid block
+            self.blockTimes.append(blockTime)
+            self.blockOffsets.append(offset)
+            self.frameCount += frames
+            offset += BLOCK_STRUCT.size + storedSize
+            self.file.seek(offset)
+        self.dataEnd = offset
+        self.pending = []
+        if self.blockOffsets:
+            self.loadBlock(len(self.blockOffsets) - 1)
+            while self.readFrame() != False:
+                self.lastTimeStamp = self.timeStamp
+
+    def loadBlock(self, blockIndex:int):
+        self.file.seek(self.blockOffsets[blockIndex])
+        codec, unused, frames, storedSize, rawSize, blockTime = BLOCK_STRUCT.unpack(self.file.read(BLOCK_STRUCT.size))
+        payload = self.file.read(storedSize)
+        self.payload = zlib.decompress(payload) if codec == CODEC_ZLIB else payload
+        self.blockIndex = blockIndex
+        self.position = 0
+
+    def rewind(self):
+        self.seekBlock(0)
+
+    def seekBlock(self, blockIndex:int):
+        # O(1): blocks start with a keyframe, decoding continues from there
+        self.blockIndex = blockIndex - 1
+        self.payload = b""
+        self.position = 0
+        self.frame = None
+        self.timeStamp = 0.0
+        self.pending = []
+
+    def seek(self, timeStamp:float):
+        # next readFrame() returns the frame showing at timeStamp: jump to the last keyframe before it and decode
+        # forward (at most one block)
+        self.seekBlock(max(0, bisect.bisect_right(self.blockTimes, timeStamp) - 1))
+        frameData = self.readFrame()
+        if frameData == False: return
+        while True:
+            nextFrame = self.readFrame()
+            if nextFrame == False or nextFrame[0] > timeStamp: break
+            frameData = nextFrame
+        self.pending = [frameData] if nextFrame == False else [frameData, nextFrame]
+
+    def timeStamps(self):
+        # time stamp of every frame (float64 numpy array) without decoding any pixels, reader position unchanged
+        if self.times is not None:
+            offset, size = self.times
+            self.file.seek(offset)
+            return np.frombuffer(zlib.decompress(self.file.read(size)), "<f8").copy()
+        timeStamps = array.array("d")
+        for blockOffset in self.blockOffsets:
+            self.file.seek(blockOffset)
+            codec, unused, frames, storedSize, rawSize, blockTime = BLOCK_STRUCT.unpack(self.file.read(BLOCK_STRUCT.size))
+            payload = self.file.read(storedSize)
+            if codec == CODEC_ZLIB: payload = zlib.decompress(payload)
+            position = 0
+            for i in range(frames):
+                timeStamp, kind = FRAME_STRUCT.unpack_from(payload, position)
+                timeStamps.append(timeStamp)
+                position += FRAME_STRUCT.size
+                if kind == KEY:
+                    position += UNIVERSE_BYTES
+                elif kind == DELTA:
+                    runCount, = RUN_COUNT_STRUCT.unpack_from(payload, position)
+                    position += RUN_COUNT_STRUCT.size
+                    for run in range(runCount):
+                        position += RUN_STRUCT.size + RUN_STRUCT.unpack_from(payload, position)[1]
+        return np.array(timeStamps)
+
+    def keyframeTimes(self):
+        return self.blockTimes
+
+    def preload(self):
+        pass
+
+    def duration(self):
+        if self.frameCount == 0: return 0.0
+        return takeDuration(self.frameCount, self.blockTimes[0], self.lastTimeStamp)
+
+    def readFrame(self):
+        # returns (time stamp, pixel bytes) like the other take readers, or False at the end of the take
+        if self.pending:
+            return self.pending.pop(0)
+        if self.position >= len(self.payload):
+            if self.blockIndex + 1 >= len(self.blockOffsets): return False
+            self.loadBlock(self.blockIndex + 1)
+        payload = self.payload
+        position = self.position
+        timeStamp, kind = FRAME_STRUCT.unpack_from(payload, position)
+        position += FRAME_STRUCT.size
+        if kind == KEY:
+            self.frame = payload[position:position+UNIVERSE_BYTES]
+            position += UNIVERSE_BYTES
+        elif kind == DELTA:
+            frame = bytearray(self.frame)
+            runCount, = RUN_COUNT_STRUCT.unpack_from(payload, position)
+            position += RUN_COUNT_STRUCT.size
+            for i in range(runCount):
+                start, length = RUN_STRUCT.unpack_from(payload, position)
+                position += RUN_STRUCT.size
+                frame[start:start+length] = payload[position:position+length]
+                position += length
+            self.frame = bytes(frame)
+        self.position = position
+        self.timeStamp = timeStamp
+        return timeStamp, self.frame
+
+    def close(self):
+        self.file.close()
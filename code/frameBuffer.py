@@ -0,0 +1,71 @@
+import numpy as np
+
+# Per-strip frame buffer: the strip's pixels as a (leds, 3) uint8 array (4 for RGBW), in the channel order of the
+# incoming DMX data. Universes are slice-assigned into it, and pack() converts the whole strip into the ws2811 uint32
+# layout (0xWWRRGGBB, little endian) in one vectorized step, applying brightness/gamma and color order on the way
+
+
+class StripFrameBuffer:
+    def __init__(self, ledCount:int, colorOrder:str = "RGB", brightness:int = 255, gamma:float = 1.0):
+        self.ledCount = ledCount
+        self.channels = len(colorOrder)     # 3 (RGB orders) or 4 (RGBW orders)
+        self.pixels = np.zeros((ledCount, self.channels), np.uint8)
+        self.words = np.zeros(ledCount, np.uint32)
+        self.wordBytes = self.words.view(np.uint8).reshape(ledCount, 4)      # B, G, R, W per pixel
+        self.lut = None
+        self.brightness = brightness
+        self.gamma = gamma
+        self.setColorOrder(colorOrder)
+        self.updateLut()
+
+    def setColorOrder(self, colorOrder:str):
+        # channel order of the incoming data, e.g. "GRB": the first byte of each pixel is green
+        # (the channel count is fixed by the constructor, the router holds views of the pixel array)
+        colorOrder = colorOrder.upper()
+        if len(colorOrder) != self.channels:
+            raise ValueError(f"Color order {colorOrder} doesn't have {self.channels} channels")
+        self.colorOrder = colorOrder
+        channelOrder = [colorOrder.index(channel) for channel in "RGBW"[:self.channels]]
+        self.channelOrder = None if channelOrder == list(range(self.channels)) else channelOrder
+
+    def setBrightness(self, brightness:int):
+        self.brightness = max(0, min(255, brightness))
+        self.updateLut()
+
+    def setGamma(self, gamma:float):
+        self.gamma = gamma
+        self.updateLut()
+
+    def updateLut(self):
+        if self.brightness == 255 and self.gamma == 1.0:
+            self.lut = None
+            return
+        levels = np.arange(256) / 255.0
+        self.lut = np.round(255.0 * levels**self.gamma * self.brightness/255.0).astype(np.uint8)
+
+    def setUniverse(self, start:int, data):
+        # data: raw pixel bytes (bytes, memoryview or list of ints), written to pixels start, start+1, ...
+        channels = self.channels
+        count = min(len(data)//channels, self.ledCount - start)
+        if count <= 0: return
+        if isinstance(data, list):
+            values = np.array(data[:channels*count], np.uint8)
+        else:
+            values = np.frombuffer(data, np.uint8, channels*count)
+        self.pixels[start:start+count] = values.reshape(count, channels)
+
+    def fill(self, r:int = 0, g:int = 0, b:int = 0, w:int = 0):
+        # r, g, b, w are stored in the incoming channel order
+        values = dict(zip("RGBW", (r, g, b, w)))
+        self.pixels[:] = [values[channel] for channel in self.colorOrder]
+
+    def pack(self):
+        pixels = self.pixels
+        if self.lut is not None:
+            pixels = self.lut[pixels]
+        if self.channelOrder is not None:
+            pixels = pixels[:, self.channelOrder]
+        self.wordBytes[:, 2::-1] = pixels[:, :3]        # R, G, B -> bytes 2, 1, 0
+        if self.channels == 4:
+            self.wordBytes[:, 3] = pixels[:, 3]         # W -> byte 3
+        return self.words
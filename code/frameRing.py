@@ -0,0 +1,175 @@
+import os
+import select
+import struct
+import threading
+import numpy as np
+from multiprocessing import shared_memory
+
+# Single producer / single consumer ring of DMX records in shared memory, passes frames between the ingest,
+# scheduler and output processes (see ledProcesses.py)
+# Layout: control words (head = records published, tail = records consumed, consumer asleep flag, overflow count),
+# each on its own 64 byte line, then slotCount slots of a slot header (time stamp, kind, universe, length) + 512 DMX
+# channels.
+# Every control word has a single writer: head and overflow are only stored by the producer, tail and asleep only by
+# the consumer, each as one aligned 8 byte store (single-copy atomic on the Cortex-A53, never torn). Neither side ever
+# takes a lock the other side holds, so a producer that is preempted, stopped in a debugger or killed mid push can't
+# stall the output process: the consumer just doesn't see that record, a full ring drops the record and counts an
+# overflow instead of stalling the producer.
+# Memory ordering: numpy stores are plain stores and the Zero 2's Cortex-A53 may make them visible to the other core
+# out of order, so every publish and every read of the other side's counter goes through fence(), a full barrier:
+#   producer  slot stores, fence, head store          consumer  head load, fence, slot loads, fence, tail store
+#   producer  tail load, fence, slot stores           (a slot is only reused after the consumer is done reading it)
+# CPython has no fence, fence() gets one out of a process private lock (threading.Lock, a glibc semaphore: acquire is
+# an acquire CAS, release an atomic release add): acquire, release, acquire, release orders everything before the
+# first release before everything after the second acquire (ARMv8 keeps a release followed by an acquire in order).
+# The lock is never shared across processes, after the fork each side has its own and it's only ever contended by
+# threads of the same process for the few instructions of a fence.
+# Waking: the consumer stores the asleep flag, fences and checks head before blocking on the ring's pipe; the producer
+# stores head, fences and checks the flag. With a full barrier on both sides at least one of them sees the other's
+# store (Dekker), so either the consumer sees the record or the producer writes a byte to the pipe: no wakeup is lost,
+# and there's no syscall per record while the consumer keeps up. Only the consumer clears the flag.
+# The ring (shared memory + pipe) must be created before the processes are forked, both sides use the same object.
+
+SLOT_STRUCT = struct.Struct("<dBBHH")    # time stamp, kind, unused, universe, length
+SLOT_HEADER = 16
+SLOT_DATA = 512
+SLOT_SIZE = SLOT_HEADER + SLOT_DATA
+CONTROL_SIZE = 256
+HEAD, TAIL, ASLEEP, OVERFLOW = 0, 8, 16, 24      # control word indexes (uint64, 64 bytes apart)
+
+# record kinds
+DMX = 0             # universe's DMX channels
+REFRESH = 1         # push the strips written since their last show (end of a playback batch, ArtSync)
+REFRESH_ALL = 2
+HOLD = 3            # universe field: 1 = only refresh on REFRESH (ArtSync mode), 0 = refresh as frames complete
+CLEAR = 4           # all pixels off
+
+
+class FrameRing:
+    def __init__(self, slotCount:int = 1024):
+        self.slotCount = slotCount
+        self.memory = shared_memory.SharedMemory(create=True, size=CONTROL_SIZE + slotCount*SLOT_SIZE)
+        self.buffer = self.memory.buf
+        self.control = np.ndarray(CONTROL_SIZE//8, np.uint64, self.buffer)
+        self.control[:] = 0
+        self.wakeRead, self.wakeWrite = os.pipe()
+        os.set_blocking(self.wakeWrite, False)
+        self.fenceLock = threading.Lock()       # fence() only, private to each process after the fork
+        self.head = 0               # producer's copy of head
+        self.freeTail = 0           # producer's last view of tail, re-read only when the ring looks full
+        self.overflow = 0           # producer's copy of the overflow count
+        self.tail = 0               # consumer's copy of tail
+        self.pushLock = threading.Lock()        # producer threads of one process take turns, never shared across processes
+
+    def fence(self):
+        # full memory barrier, see the top of the file
+        lock = self.fenceLock
+        lock.acquire(); lock.release()
+        lock.acquire(); lock.release()
+
+    def push(self, kind:int, universe:int = 0, timeStamp:float = 0.0, data = b""):
+        # returns False (and counts an overflow) if the consumer is a full ring behind
+        with self.pushLock:
+            head = self.head
+            control = self.control
+            if head - self.freeTail >= self.slotCount:
+                self.freeTail = int(control[TAIL])
+                self.fence()            # the consumer's reads of the freed slots are done before we overwrite them
+                if head - self.freeTail >= self.slotCount:
+                    self.overflow += 1
+                    control[OVERFLOW] = self.overflow
+                    return False
+            slot = head % self.slotCount
+            offset = CONTROL_SIZE + slot*SLOT_SIZE
+            buffer = self.buffer
+            length = min(len(data), SLOT_DATA)
+            SLOT_STRUCT.pack_into(buffer, offset, timeStamp, kind, 0, universe, length)
+            if length:
+                buffer[offset+SLOT_HEADER:offset+SLOT_HEADER+length] = data[:length]
+            self.head = head + 1
+            self.fence()                # the slot is visible before head
+            control[HEAD] = head + 1
+            self.fence()                # head is visible before we look at the flag (wake handshake)
+            if control[ASLEEP]:
+                try:
+                    os.write(self.wakeWrite, b"\x00")
+                except BlockingIOError:
+                    pass            # pipe already full of wakeups
+            return True
+
+    def available(self):
+        # records published and not consumed yet (consumer side)
+        return int(self.control[HEAD]) - self.tail
+
+    def drain(self, callback, maxRecords:int = None):
+        # callback(kind, universe, timeStamp, data) for every published record, data is a memoryview into the slot
+        # (only valid during the call). Returns the number of records consumed.
+        count = self.available()
+        if maxRecords is not None: count = min(count, maxRecords)
+        if count <= 0: return 0
+        self.fence()                    # every slot up to head is completely visible
+        buffer = self.buffer
+        tail = self.tail
+        for i in range(count):
+            offset = CONTROL_SIZE + (tail % self.slotCount)*SLOT_SIZE
+            timeStamp, kind, unused, universe, length = SLOT_STRUCT.unpack_from(buffer, offset)
+            callback(kind, universe, timeStamp, buffer[offset+SLOT_HEADER:offset+SLOT_HEADER+length])
+            tail += 1
+        self.tail = tail
+        self.fence()                    # the slots are read before the producer may reuse them
+        self.control[TAIL] = tail
+        return count
+
+    def prepareWait(self):
+        # announce that the consumer is about to sleep, returns False if records arrived meanwhile
+        self.control[ASLEEP] = 1
+        self.fence()                    # the flag is visible before we look at head (wake handshake)
+        if self.available():
+            self.control[ASLEEP] = 0
+            return False
+        return True
+
+    def endWait(self):
+        self.control[ASLEEP] = 0
+
+    def clearWakeups(self):
+        try:
+            os.read(self.wakeRead, 4096)
+        except BlockingIOError:
+            pass
+
+    def overflowCount(self):
+        return int(self.control[OVERFLOW])
+
+    def stats(self):
+        # diagnostics, may be a record off while both sides are running
+        head, tail = int(self.control[HEAD]), int(self.control[TAIL])
+        return f"{head} records, {head - tail} waiting, {self.overflowCount()} dropped (ring full)"
+
+    def close(self, unlink:bool = False):
+        # every process closes its mapping, the creating process also unlinks it
+        self.control = None
+        self.buffer = None
+        self.memory.close()
+        if unlink:
+            self.memory.unlink()
+            for fd in (self.wakeRead, self.wakeWrite):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+
+def waitRings(rings:list, timeout:float, extraFds:list = []):
+    # blocks until one of the rings has records, one of extraFds is readable or timeout passes
+    # returns the readable extraFds
+    sleeping = [ring for ring in rings if ring.prepareWait()]
+    if len(sleeping) < len(rings):
+        for ring in sleeping: ring.endWait()
+        readable = select.select(extraFds, [], [], 0)[0] if extraFds else []
+        return readable
+    readable = select.select([ring.wakeRead for ring in rings] + extraFds, [], [], timeout)[0]
+    for ring in rings:
+        ring.endWait()
+        if ring.wakeRead in readable: ring.clearWakeups()
+    return [fd for fd in readable if fd in extraFds]
@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import threading
+
+# Art-Net ingest metrics: tells network, SD card and CPU trouble apart after a show
+#   network   per universe packet counts, packets lost according to the ArtDmx sequence numbers, inter-arrival
+#             time histograms (a stalled sender / congested Wi-Fi shows up as long intervals), ArtSync count
+#   CPU       histogram of the time spent in the client callback (recordCallback / live routing), process CPU use
+#   SD card   the disk writer's batch time histogram, ring high water mark and overflows (recordWriter.py)
+# The receiver thread only increments plain list counters: a bit_length() and a shift pick the log-linear histogram
+# bucket, no locks and no allocation per packet. MetricsReporter summarises them every interval seconds: one printed
+# line, a JSON stats file (replaced atomically) and optionally a JSON endpoint on localhost
+#   curl http://127.0.0.1:9101/
+
+# log-linear histogram of microseconds: 1 us wide buckets below 16 us, then 8 buckets per power of two (<= 12.5 %
+# wide), the last one everything from 15.7 s up
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HISTOGRAM_BUCKETS = 176
+LAST_BUCKET = HISTOGRAM_BUCKETS - 1
+
+
+def histogramBucket(seconds:float):
+    micros = int(seconds*1e6)
+    shift = micros.bit_length() - SUB_BUCKET_BITS - 1
+    if shift <= 0: return micros
+    # micros >> shift keeps the top 4 bits (8-15): the octave picks the row, the next 3 bits the sub-bucket
+    return min(LAST_BUCKET, (shift << SUB_BUCKET_BITS) + (micros >> shift))
+
+
+def bucketBounds(bucket:int):
+    # [lower, upper) of a bucket in seconds
+    if bucket < SUB_BUCKETS: return bucket / 1e6, (bucket + 1) / 1e6
+    shift = (bucket >> SUB_BUCKET_BITS) - 1
+    lower = (SUB_BUCKETS + (bucket & (SUB_BUCKETS - 1))) << shift
+    return lower / 1e6, (lower + (1 << shift)) / 1e6
+
+
+def histogramPercentile(histogram:list, fraction:float, maximum:float = None):
+    # value (seconds) at the given fraction of the samples, interpolated linearly inside its bucket, 0 without samples.
+    # maximum (the observed largest sample) caps the bucket it falls in: the top bucket's bound alone overshoots it
+    total = sum(histogram)
+    if total == 0: return 0.0
+    threshold = fraction * total
+    count = 0
+    for bucket, bucketCount in enumerate(histogram):
+        if bucketCount and count + bucketCount >= threshold: break
+        count += bucketCount
+    lower, upper = bucketBounds(bucket)
+    if maximum is not None:
+        lower, upper = min(lower, maximum), min(upper, maximum)
+    return lower + (upper - lower) * (threshold - count) / max(1, histogram[bucket])
+
+
+class IngestMetrics:
+    def __init__(self, universeCount:int):
+        self.universeCount = universeCount
+        self.diskWriter = None          # recordWriter.AsyncTakeWriter of the current recording, set by LEDRecord
+        self.reset()
+
+    def reset(self):
+        universeCount = self.universeCount
+        self.packets = [0] * universeCount
+        self.lost = [0] * universeCount             # sequence numbers skipped (late packets dropped by the receiver count too)
+        self.lastSequence = [0] * universeCount
+        self.lastArrival = [0.0] * universeCount
+        self.intervals = [[0] * HISTOGRAM_BUCKETS for universe in range(universeCount)]     # inter-arrival times
+        self.maxInterval = [0.0] * universeCount
+        self.callbackTimes = [0] * HISTOGRAM_BUCKETS
+        self.callbackMax = 0.0
+        self.syncCount = 0
+        self.startTime = time.perf_counter()
+        self.cpuStart = time.process_time()
+
+    def packet(self, universe:int, sequence:int, now:float):
+        # ArtDmx packet accepted by the receiver (now: perf_counter() at arrival)
+        self.packets[universe] += 1
+        if sequence:            # 1-255, 0 means the sender doesn't sequence
+            last = self.lastSequence[universe]
+            if last and sequence != last % 255 + 1:
+                self.lost[universe] += (sequence - last - 1) % 255
+            self.lastSequence[universe] = sequence
+        previous = self.lastArrival[universe]
+        if previous:
+            interval = now - previous
+            self.intervals[universe][histogramBucket(interval)] += 1
+            if interval > self.maxInterval[universe]: self.maxInterval[universe] = interval
+        self.lastArrival[universe] = now
+
+    def callbackDone(self, elapsed:float):
+        self.callbackTimes[histogramBucket(elapsed)] += 1
+        if elapsed > self.callbackMax: self.callbackMax = elapsed
+
+    def sync(self):
+        self.syncCount += 1
+
+    def summary(self):
+        # JSON-able snapshot, times in ms
+        elapsed = max(1e-9, time.perf_counter() - self.startTime)
+        universes = []
+        for universe in range(self.universeCount):
+            packets, lost = self.packets[universe], self.lost[universe]
+            intervals, maxInterval = self.intervals[universe], self.maxInterval[universe]
+            universes.append({"universe": universe,
+                              "packets": packets,
+                              "rate": packets / elapsed,
+                              "lost": lost,
+                              "lossPercent": 100.0 * lost / (packets + lost) if packets + lost else 0.0,
+                              "intervalP50": 1000 * histogramPercentile(intervals, 0.5, maxInterval),
+                              "intervalP99": 1000 * histogramPercentile(intervals, 0.99, maxInterval),
+                              "intervalMax": 1000 * maxInterval,
+                              "intervalHistogram": list(intervals)})
+        summary = {"time": time.time(),
+                   "seconds": elapsed,
+                   "cpuPercent": 100.0 * (time.process_time() - self.cpuStart) / elapsed,
+                   "packets": sum(self.packets),
+                   "lost": sum(self.lost),
+                   "syncs": self.syncCount,
+                   "callbackP50": 1000 * histogramPercentile(self.callbackTimes, 0.5, self.callbackMax),
+                   "callbackP99": 1000 * histogramPercentile(self.callbackTimes, 0.99, self.callbackMax),
+                   "callbackMax": 1000 * self.callbackMax,
+                   "callbackHistogram": list(self.callbackTimes),
+                   "histogramBuckets": "log-linear us: bucket b < 16 holds b us, above 8 per power of two (see bucketBounds)",
+                   "universes": universes}
+        writer = self.diskWriter
+        if writer is not None:
+            summary["disk"] = {"written": writer.tail,
+                               "batches": writer.batchCount,
+                               "overflows": writer.overflowCount,
+                               "highWater": writer.highWater,
+                               "slots": writer.slotCount,
+                               "batchP99": 1000 * histogramPercentile(writer.batchTimes, 0.99, writer.maxBatchTime),
+                               "batchMax": 1000 * writer.maxBatchTime,
+                               "batchHistogram": list(writer.batchTimes)}
+        return summary
+
+    def summaryLine(self, summary:dict):
+        universes = summary["universes"]
+        worst = max(universes, key=lambda entry: entry["intervalP99"], default=None)
+        line = (f"  ingest: {summary['packets']} packets ({sum(entry['rate'] for entry in universes):.0f}/s), "
+                f"{summary['lost']} lost")
+        if worst is not None and worst["packets"]:
+            line += f", arrival p99 {worst['intervalP99']:.1f} ms (U{worst['universe']}) / max {max(entry['intervalMax'] for entry in universes):.1f} ms"
+        line += f", callback p99 {summary['callbackP99']:.3f} ms / max {summary['callbackMax']:.2f} ms"
+        disk = summary.get("disk")
+        if disk is not None:
+            line += (f", disk batch p99 {disk['batchP99']:.1f} ms / max {disk['batchMax']:.1f} ms, "
+                     f"ring high water {disk['highWater']}/{disk['slots']}, {disk['overflows']} overflows")
+        return line + f", CPU {summary['cpuPercent']:.1f} %"
+
+
+def writeStats(path:str, summary:dict):
+    tempPath = path + ".tmp"
+    with open(tempPath, "w") as statsFile:
+        json.dump(summary, statsFile, indent=1)
+    os.replace(tempPath, path)
+
+
+class MetricsReporter:
+    # periodic summary of an IngestMetrics: printed line, stats file and optional HTTP endpoint on 127.0.0.1
+    def __init__(self, metrics:IngestMetrics, interval:float = 10.0, statsPath:str = None, port:int = None,
+                 printSummary:bool = True):
+        self.metrics = metrics
+        self.interval = interval
+        self.statsPath = statsPath
+        self.printSummary = printSummary
+        self.latest = metrics.summary()
+        self.stopEvent = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="MetricsReporter", daemon=True)
+        self.server = None
+        if port is not None:
+            self.startServer(port)
+        self.thread.start()
+
+    def startServer(self, port:int):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler      # only loaded when the endpoint is used
+        reporter = self
+        class StatsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(reporter.latest, indent=1).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            def log_message(self, format, *args):
+                pass
+        try:
+            self.server = ThreadingHTTPServer(("127.0.0.1", port), StatsHandler)
+        except OSError as e:
+            print(f"  Unable to serve ingest stats on port {port}: {e}")
+            return
+        threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True).start()
+
+    def report(self):
+        previous = self.latest["packets"]
+        self.latest = self.metrics.summary()
+        if self.printSummary and self.latest["packets"] != previous:     # quiet while nothing comes in
+            print(self.metrics.summaryLine(self.latest))
+        if self.statsPath is not None:
+            try:
+                writeStats(self.statsPath, self.latest)
+            except OSError as e:
+                print(f"  Unable to write ingest stats to {self.statsPath}: {e}")
+
+    def run(self):
+        while not self.stopEvent.wait(self.interval):
+            self.report()
+
+    def stop(self):
+        self.stopEvent.set()
+        self.thread.join()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
@@ -0,0 +1,154 @@
+import os
+import json
+import numpy as np
+
+# Declarative LED output config and the universe routing table compiled from it
+# ./ledConfig.json (all keys of an output except ledCount are optional):
+#   {"artnetPort": 6454,
+#    "outputs": [{"ledCount": 300,            pixels on this output
+#                 "gpio": 18, "channel": 0,   DOUT pin and ws281x channel (default by output index, see OUTPUT_PINS)
+#                 "colorOrder": "GRB",        channel order of the pixels in the DMX data, RGB, GRB, ..., RGBW, GRBW
+#                                             (4 letters = RGBW pixels, 4 channels each)
+#                 "pixelsPerUniverse": 170,   pixels packed into each universe (default: as many as fit)
+#                 "startUniverse": 0,         universe of the first pixel (default: after the previous output)
+#                 "startChannel": 0,          DMX channel (0 based) of the first pixel in its first universe, following
+#                                             universes start at channel 0
+#                 "brightness": 255, "gamma": 1.0}],
+#    "idleEffect": {"name": "rainbowCycle", "speed": 2}}        optional, shown while idle, see ledEffects.py
+# The routing table lists, per universe, the (strip, pixel range, channel range) segments it feeds, so a packet is
+# routed with one slice copy per segment. Takes store 510 channels per universe, which is the packing limit.
+
+MAX_OUTPUTS = 4
+UNIVERSE_CHANNELS = 510         # DMX channels stored per universe in takes (512 minus the record trigger channels)
+OUTPUT_PINS = [(18, 0), (19, 1), (21, 0), (10, 0)]     # (gpio, ws281x channel) by output index, RPi Zero pins
+CONFIG_PATH = "./ledConfig.json"
+
+
+class OutputConfig:
+    def __init__(self, ledCount:int, gpio:int = None, channel:int = None, colorOrder:str = "RGB",
+                 pixelsPerUniverse:int = None, startUniverse:int = None, startChannel:int = 0,
+                 brightness:int = 255, gamma:float = 1.0, index:int = 0):
+        colorOrder = colorOrder.upper()
+        if sorted(colorOrder) not in (sorted("RGB"), sorted("RGBW")):
+            print(f"  Invalid color order {colorOrder} for output {index}, using RGB.")
+            colorOrder = "RGB"
+        self.ledCount = ledCount
+        self.gpio = OUTPUT_PINS[index][0] if gpio is None else gpio
+        self.channel = OUTPUT_PINS[index][1] if channel is None else channel
+        self.colorOrder = colorOrder
+        self.channelsPerPixel = len(colorOrder)
+        maxPixels = UNIVERSE_CHANNELS // self.channelsPerPixel
+        if pixelsPerUniverse is None:
+            pixelsPerUniverse = maxPixels
+        elif pixelsPerUniverse > maxPixels:
+            print(f"  Output {index}: {pixelsPerUniverse} {colorOrder} pixels don't fit in a universe, using {maxPixels}.")
+            pixelsPerUniverse = maxPixels
+        self.pixelsPerUniverse = pixelsPerUniverse
+        self.startUniverse = startUniverse
+        if startChannel + self.channelsPerPixel > pixelsPerUniverse * self.channelsPerPixel:
+            print(f"  Output {index}: start channel {startChannel} leaves no room for pixels, using 0.")
+            startChannel = 0
+        self.startChannel = startChannel
+        self.brightness = brightness
+        self.gamma = gamma
+
+    def universeSegments(self):
+        # [(universe, first pixel, pixel count, first channel), ...] covering the output's pixels
+        segments = []
+        universe, channel, pixel = self.startUniverse, self.startChannel, 0
+        channelLimit = self.pixelsPerUniverse * self.channelsPerPixel
+        while pixel < self.ledCount:
+            count = min((channelLimit - channel) // self.channelsPerPixel, self.ledCount - pixel)
+            segments.append((universe, pixel, count, channel))
+            pixel += count
+            universe += 1
+            channel = 0
+        return segments
+
+
+class LEDConfig:
+    def __init__(self, outputs:list, artnetPort:int = 6454, idleEffect:dict = None):
+        if len(outputs) > MAX_OUTPUTS:
+            print(f"  Unable to init more than {MAX_OUTPUTS} strips! Initing first {MAX_OUTPUTS} strips only.")
+            outputs = outputs[:MAX_OUTPUTS]
+        nextUniverse = 0
+        for output in outputs:          # outputs without a start universe follow the previous one
+            if output.startUniverse is None:
+                output.startUniverse = nextUniverse
+            nextUniverse = output.universeSegments()[-1][0] + 1 if output.ledCount else output.startUniverse
+        self.outputs = outputs
+        self.artnetPort = artnetPort
+        self.idleEffect = idleEffect        # {"name": effect, parameters...} or None (strips off while idle)
+        self.ledCounts = [output.ledCount for output in outputs]
+
+    @classmethod
+    def fromLedCounts(cls, ledCounts:list, **outputOptions):
+        # the original layout: RGB, 170 pixels per universe, outputs on consecutive universes
+        return cls([OutputConfig(count, index=i, **outputOptions) for i, count in enumerate(ledCounts)])
+
+    @classmethod
+    def fromDict(cls, config:dict):
+        outputs = [OutputConfig(index=i, **output) for i, output in enumerate(config["outputs"])]
+        return cls(outputs, config.get("artnetPort", 6454), config.get("idleEffect"))
+
+    def routes(self):
+        # universe -> [(strip, first pixel, pixel count, first channel), ...]
+        routes = {}
+        for strip, output in enumerate(self.outputs):
+            for universe, pixel, count, channel in output.universeSegments():
+                routes.setdefault(universe, []).append((strip, pixel, count, channel))
+        return routes
+
+    def universeCount(self):
+        return max(self.routes(), default=-1) + 1
+
+    def universeTables(self):
+        # strips fed by each universe, plus the take header fields: first strip fed by each universe (255 if none)
+        # and its index among that strip's universes
+        universeStrips = [[] for universe in range(self.universeCount())]
+        for universe, segments in self.routes().items():
+            for strip, pixel, count, channel in segments:
+                if strip not in universeStrips[universe]:
+                    universeStrips[universe].append(strip)
+        universe2strip = [strips[0] if strips else 255 for strips in universeStrips]
+        stripUniverses = {}
+        universe2substrip = []
+        for strip in universe2strip:
+            universe2substrip.append(stripUniverses.get(strip, 0))
+            stripUniverses[strip] = stripUniverses.get(strip, 0) + 1
+        return universeStrips, universe2strip, universe2substrip
+
+
+def loadConfig(path:str = CONFIG_PATH, ledCounts:list = [20]):
+    # the config file if there is one, else one RGB output per entry of ledCounts
+    if not os.path.exists(path):
+        return LEDConfig.fromLedCounts(ledCounts)
+    try:
+        with open(path) as configFile:
+            return LEDConfig.fromDict(json.load(configFile))
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"  Invalid LED config {path} ({e}), using {ledCounts} LEDs.")
+        return LEDConfig.fromLedCounts(ledCounts)
+
+
+class UniverseRouter:
+    # compiled routing table: per universe a list of (target pixel view, first channel, channel count, strip),
+    # the target being a flat uint8 view into the strip's frame buffer, so routing a packet is one copy per segment
+    def __init__(self, config:LEDConfig, frameBuffers:list):
+        self.universeCount = config.universeCount()
+        self.routes = [[] for universe in range(self.universeCount)]
+        for universe, segments in config.routes().items():
+            for strip, pixel, count, channel in segments:
+                target = frameBuffers[strip].pixels[pixel:pixel+count].reshape(-1)
+                self.routes[universe].append((target, channel, len(target), strip))
+        self.universeStrips, self.universe2strip, self.universe2substrip = config.universeTables()
+
+    def route(self, universe:int, data):
+        # data: DMX channels of universe (bytes or memoryview), short packets fill what they cover
+        for target, channel, count, strip in self.routes[universe]:
+            count = min(count, len(data) - channel)
+            if count <= 0: continue
+            target[:count] = np.frombuffer(data, np.uint8, count, channel)
+
+    def isRouted(self, universe:int):
+        return universe < self.universeCount and len(self.routes[universe]) > 0
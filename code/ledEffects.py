@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+# Generative effects: the strandtest.py animations (rainbow, rainbowCycle, color wipes, theater chases) computed as
+# whole frames with numpy instead of one setPixelColor()/show() per pixel
+# Colors come from precomputed 256 entry lookup tables (the wheel() rainbow, or a palette interpolated from color
+# stops), so a frame is an index computation plus one table lookup per strip. EffectRenderer packs the strips' frames
+# into universes through the output config's routing, and EffectTake pre-renders one full cycle of an effect into an
+# in-memory take: it goes into the TakeCache and LEDPlayback plays it in a loop like any recorded take, with no
+# per-frame computation (idle / fallback content, see newCombo.py).
+#   sudo python3 ./code/ledEffects.py                       cycles through all effects, like strandtest.py
+#   sudo python3 ./code/ledEffects.py rainbowCycle --seconds 30
+#   python3 ./code/ledEffects.py --save ./saves/rainbow_effect rainbow
+
+import io
+import os
+import sys
+import math
+import time
+import argparse
+from abc import ABC, abstractmethod
+import numpy as np
+from ledConfig import LEDConfig, loadConfig
+from takeFormat import TakeHeader, BinaryTakeWriter, openTakeWriter, writeMetadata, UNIVERSE_BYTES
+from takeCache import CachedTake
+
+EFFECT_RATE = 40.0          # frames per second of rendered effects
+EFFECT_PREFIX = "effect:"   # TakeCache path prefix of pre-rendered effect takes
+
+
+def wheelTable():
+    # strandtest.wheel() for all 256 positions: (256, 3) uint8 RGB, red -> green -> blue -> red
+    position = np.arange(256)
+    table = np.zeros((256, 3), np.int32)
+    first, second, third = position < 85, (position >= 85) & (position < 170), position >= 170
+    table[first] = np.stack([position[first]*3, 255 - position[first]*3, 0*position[first]], 1)
+    p = position[second] - 85
+    table[second] = np.stack([255 - p*3, 0*p, p*3], 1)
+    p = position[third] - 170
+    table[third] = np.stack([0*p, p*3, 255 - p*3], 1)
+    return table.astype(np.uint8)
+
+
+def paletteTable(colors:list, size:int = 256):
+    # (size, 3) uint8 RGB table blending evenly spaced color stops, wrapping from the last back to the first
+    stops = np.array(list(colors) + [colors[0]], np.float64)
+    positions = np.linspace(0, len(colors), size, endpoint=False)
+    return np.stack([np.interp(positions, np.arange(len(stops)), stops[:, channel]) for channel in range(3)],
+                    1).round().astype(np.uint8)
+
+
+WHEEL = wheelTable()
+PALETTES = {"wheel":    WHEEL,
+            "fire":     paletteTable([(0, 0, 0), (160, 20, 0), (255, 120, 0), (255, 220, 80)]),
+            "ocean":    paletteTable([(0, 10, 40), (0, 80, 160), (0, 200, 200), (40, 40, 120)]),
+            "warm":     paletteTable([(255, 147, 41), (255, 60, 10), (180, 20, 60)])}
+
+
+class Effect(ABC):
+    # render(frame, strip, ledCount) -> (ledCount, 3) uint8 RGB pixels of one strip; cycleFrames(ledCounts) frames
+    # later the effect repeats exactly, so one pre-rendered cycle loops seamlessly
+    def __init__(self):
+        self.indexes = {}
+
+    def pixelIndexes(self, ledCount:int):
+        # arange(ledCount) cached per strip length
+        indexes = self.indexes.get(ledCount)
+        if indexes is None:
+            indexes = self.indexes[ledCount] = np.arange(ledCount)
+        return indexes
+
+    def cycleFrames(self, ledCounts:list):
+        return 1
+
+    @abstractmethod
+    def render(self, frame:int, strip:int, ledCount:int):
+        pass
+
+
+class Rainbow(Effect):
+    # strandtest.rainbow(): every pixel a step further along the palette, the whole strip shifting by speed per frame
+    def __init__(self, speed:int = 1, palette:str = "wheel"):
+        super().__init__()
+        self.speed = speed
+        self.palette = PALETTES[palette]
+
+    def cycleFrames(self, ledCounts:list):
+        return 256 // math.gcd(256, self.speed)
+
+    def render(self, frame:int, strip:int, ledCount:int):
+        return self.palette[(self.pixelIndexes(ledCount) + frame*self.speed) & 255]
+
+
+class RainbowCycle(Rainbow):
+    # strandtest.rainbowCycle(): the palette spread once over the whole strip
+    def __init__(self, speed:int = 1, palette:str = "wheel"):
+        super().__init__(speed, palette)
+        self.positions = {}
+
+    def render(self, frame:int, strip:int, ledCount:int):
+        positions = self.positions.get(ledCount)
+        if positions is None:
+            positions = self.positions[ledCount] = self.pixelIndexes(ledCount) * 256 // ledCount
+        return self.palette[(positions + frame*self.speed) & 255]
+
+
+class ColorWipe(Effect):
+    # strandtest.colorWipe() for each color in turn, every strip wiped in the same time (the longest strip's
+    # ledCount/pixelsPerFrame frames) over the previous color
+    def __init__(self, colors:list = [(255, 0, 0), (0, 255, 0), (0, 0, 255)], pixelsPerFrame:float = 4.0):
+        super().__init__()
+        self.colors = np.array(colors, np.uint8)
+        self.pixelsPerFrame = pixelsPerFrame
+        self.wipeFrames = 1
+
+    def cycleFrames(self, ledCounts:list):
+        self.wipeFrames = max(1, math.ceil(max(ledCounts, default=1) / self.pixelsPerFrame))
+        return self.wipeFrames * len(self.colors)
+
+    def render(self, frame:int, strip:int, ledCount:int):
+        wipe, step = divmod(frame % (self.wipeFrames * len(self.colors)), self.wipeFrames)
+        lit = (step + 1) * ledCount // self.wipeFrames
+        pixels = np.empty((ledCount, 3), np.uint8)
+        pixels[:lit] = self.colors[wipe]
+        pixels[lit:] = self.colors[wipe - 1]        # the previous wipe's color (the last one before the first)
+        return pixels
+
+
+class TheaterChase(Effect):
+    # every spacing-th pixel lit, moving one pixel every framesPerStep frames (theaterChase() of the Arduino strandtest)
+    def __init__(self, color:tuple = (127, 127, 127), spacing:int = 3, framesPerStep:int = 2):
+        super().__init__()
+        self.color = np.array(color, np.uint8)
+        self.spacing = spacing
+        self.framesPerStep = framesPerStep
+
+    def cycleFrames(self, ledCounts:list):
+        return self.spacing * self.framesPerStep
+
+    def litMask(self, frame:int, ledCount:int):
+        step = frame // self.framesPerStep
+        return (self.pixelIndexes(ledCount) + step) % self.spacing == 0
+
+    def render(self, frame:int, strip:int, ledCount:int):
+        pixels = np.zeros((ledCount, 3), np.uint8)
+        pixels[self.litMask(frame, ledCount)] = self.color
+        return pixels
+
+
+class TheaterChaseRainbow(TheaterChase):
+    # theater chase with the lit pixels colored by the palette, which shifts every step
+    def __init__(self, spacing:int = 3, framesPerStep:int = 2, palette:str = "wheel"):
+        super().__init__(spacing=spacing, framesPerStep=framesPerStep)
+        self.palette = PALETTES[palette]
+
+    def cycleFrames(self, ledCounts:list):
+        return 256 // math.gcd(256, self.spacing) * self.spacing * self.framesPerStep
+
+    def render(self, frame:int, strip:int, ledCount:int):
+        step = frame // self.framesPerStep
+        pixels = np.zeros((ledCount, 3), np.uint8)
+        lit = self.litMask(frame, ledCount)
+        pixels[lit] = self.palette[(self.pixelIndexes(ledCount)[lit] + step) & 255]
+        return pixels
+
+
+EFFECTS = {"rainbow": Rainbow, "rainbowCycle": RainbowCycle, "colorWipe": ColorWipe, "theaterChase": TheaterChase,
+           "theaterChaseRainbow": TheaterChaseRainbow}
+
+
+def createEffect(name:str, **params):
+    # params as in ledConfig.json's "idleEffect": {"name": "rainbowCycle", "speed": 2, "palette": "ocean"}
+    if name not in EFFECTS:
+        raise ValueError(f"Unknown effect {name}, expected one of {', '.join(EFFECTS)}")
+    return EFFECTS[name](**params)
+
+
+class EffectRenderer:
+    # renders an effect's frames into the DMX data of every universe, in the channel layout and color order the
+    # output config expects (the inverse of UniverseRouter)
+    def __init__(self, config:LEDConfig, effect:Effect):
+        self.config = config
+        self.effect = effect
+        self.universeCount = config.universeCount()
+        self.universeStrips, self.universe2strip, self.universe2substrip = config.universeTables()
+        # per output: RGB(W) columns in the output's color order, W stays off
+        self.channelOrders = [["RGBW".index(channel) for channel in output.colorOrder] for output in config.outputs]
+        self.segments = [(universe, strip, pixel, count, channel)
+                         for universe, segments in config.routes().items() for strip, pixel, count, channel in segments]
+        self.universes = np.zeros((self.universeCount, UNIVERSE_BYTES), np.uint8)
+        self.frames = effect.cycleFrames(config.ledCounts)      # also sizes effects that depend on the strip lengths
+
+    def header(self):
+        return TakeHeader(self.config.ledCounts, self.universe2strip, self.universe2substrip)
+
+    def cycleFrames(self):
+        return self.frames
+
+    def renderFrame(self, frame:int):
+        # (universeCount, 510) uint8, reused by the next call
+        strips = []
+        for strip, output in enumerate(self.config.outputs):
+            pixels = self.effect.render(frame, strip, output.ledCount)
+            if output.channelsPerPixel == 4:
+                pixels = np.concatenate((pixels, np.zeros((output.ledCount, 1), np.uint8)), 1)
+            if self.channelOrders[strip] != list(range(output.channelsPerPixel)):
+                pixels = pixels[:, self.channelOrders[strip]]
+            strips.append(pixels)
+        universes = self.universes
+        for universe, strip, pixel, count, channel in self.segments:
+            values = strips[strip][pixel:pixel+count].reshape(-1)
+            universes[universe, channel:channel+len(values)] = values
+        return universes
+
+    def writeFrames(self, writers:list, frames:int, rate:float = EFFECT_RATE):
+        # frames 0..frames-1 into one take writer per universe
+        for frame in range(frames):
+            universes = self.renderFrame(frame)
+            for universe, writer in enumerate(writers):
+                writer.write(frame/rate, universes[universe].tobytes())
+
+    def saveTake(self, path:str, cycles:int = 1, format:str = "bin", rate:float = EFFECT_RATE):
+        # a normal save folder, indexed and played like a recorded take
+        os.mkdir(path)
+        header = self.header()
+        writers = [openTakeWriter(path, universe, header, format) for universe in range(self.universeCount)]
+        self.writeFrames(writers, cycles*self.cycleFrames(), rate)
+        for writer in writers:
+            writer.close()
+        writeMetadata(path, header)
+
+
+class EffectTake(CachedTake):
+    # one pre-rendered cycle of an effect in RAM, in the CachedTake layout (TakeCache.put() it and play it by name)
+    def __init__(self, config:LEDConfig, effect:Effect, cycles:int = 1, rate:float = EFFECT_RATE):
+        renderer = EffectRenderer(config, effect)
+        metadata = renderer.header()
+        self.frameCount = cycles * renderer.cycleFrames()
+        renderStart = time.perf_counter()
+        files = [io.BytesIO() for universe in range(renderer.universeCount)]
+        writers = [BinaryTakeWriter(files[universe], metadata.forUniverse(universe))
+                   for universe in range(renderer.universeCount)]
+        renderer.writeFrames(writers, self.frameCount, rate)
+        self.renderTime = time.perf_counter() - renderStart
+        super().__init__(metadata, [file.getvalue() for file in files])
+
+
+def cacheEffect(takeCache, config:LEDConfig, name:str, **params):
+    # pre-renders the effect into takeCache (pinned, never evicted) once, returns the path to give LEDPlayback
+    path = EFFECT_PREFIX + name + "".join(f",{key}={value}" for key, value in sorted(params.items()))
+    if not takeCache.contains(path):
+        take = EffectTake(config, createEffect(name, **params))
+        print(f"  Rendered {name}: {take.frameCount} frames ({take.frameCount/EFFECT_RATE:.1f} s), "
+              f"{take.byteSize/1e6:.1f} MB in {take.renderTime:.2f} s")
+        takeCache.put(path, take, pinned=True)
+    return path
+
+
+if __name__ == "__main__":
+    from ledSession import LEDSession
+    from newPlayback import LEDPlayback
+    from takeCache import TakeCache
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('effects', nargs='*', default=list(EFFECTS), help=f'effects to show ({", ".join(EFFECTS)})')
+    parser.add_argument('--seconds', type=float, default=10.0, help='how long each effect is shown')
+    parser.add_argument('--save', help='write one cycle of the (first) effect as a take to this save folder and exit')
+    args = parser.parse_args()
+
+    config = loadConfig("./ledConfig.json", [20])
+    if args.save:
+        renderer = EffectRenderer(config, createEffect(args.effects[0]))
+        renderer.saveTake(args.save)
+        print(f"  Saved {renderer.cycleFrames()} frames of {args.effects[0]} to {args.save}")
+        sys.exit()
+
+    session = LEDSession(config=config)
+    session.installSignalHandlers()
+    takeCache = TakeCache()
+    playback = None
+    try:
+        while True:
+            for name in args.effects:
+                playback = LEDPlayback(cacheEffect(takeCache, config, name), audioPath=None, takeCache=takeCache,
+                                       session=session)
+                playback.play(loop=True)
+                time.sleep(args.seconds)
+                playback.deinit()
+                playback = None
+    except (KeyboardInterrupt, SystemExit):
+        if playback is not None:
+            playback.deinit()
+        session.close()
+        sys.exit()
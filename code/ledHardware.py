@@ -0,0 +1,156 @@
+import os
+import time
+import ctypes
+import threading
+
+# Hardware abstraction layer: LED strip and GPIO backends
+# "ws281x" is the real rpi_ws281x PixelStrip / RPi.GPIO on the Pi, "sim" is an in-memory strip that records what was
+# shown and when, plus a fake GPIO module, so the record/playback hot paths can be run and profiled off the Pi.
+# The backend is picked per LEDSession, or for the whole process with the LED_BACKEND environment variable.
+
+DEFAULT_BACKEND = os.environ.get("LED_BACKEND", "ws281x")
+WS2812_BIT_TIME = 1.25e-6       # 800 kHz
+WS2812_RESET_TIME = 50e-6       # low time that latches the frame
+
+
+def createStrip(ledCount:int, pin:int, channel:int, backend:str = None, rgbw:bool = False, **simOptions):
+    # returns an un-begun strip with the PixelStrip interface used by LEDSession/StripOutput
+    # rgbw: SK6812 RGBW pixels, the W byte of each 0xWWRRGGBB word is sent too
+    backend = backend or DEFAULT_BACKEND
+    if backend == "sim":
+        return SimulatedStrip(ledCount, pin, channel, **simOptions)
+    if backend == "ws281x":
+        from rpi_ws281x import PixelStrip, ws       # only importable on the Pi
+        return PixelStrip(ledCount,     # PIXEL COUNT
+                          pin,          # DOUT PIN (10 for SPI)
+                          800000,       # DOUT FREQUENCY (800khz is standard)
+                          10,           # DMA CHANNEL (10 is a safe bet)
+                                        # NOTE: need diff DMA channel for addt'l outputs?
+                          False,        # DOUT POLARITY (True to invert signal)
+                          255,          # LED BRIGHTNESS
+                          channel,      # LED OUTPUT
+                          ws.SK6812_STRIP_GRBW if rgbw else ws.WS2811_STRIP_GRB)      # STRIP TYPE (wire color order)
+    raise ValueError(f"Unknown LED backend {backend}, expected 'ws281x' or 'sim'")
+
+
+def getGPIO(backend:str = None):
+    backend = backend or DEFAULT_BACKEND
+    if backend == "sim":
+        return FakeGPIO()
+    import RPi.GPIO as GPIO
+    return GPIO
+
+
+class SimulatedStrip:
+    # Stand-in for rpi_ws281x.PixelStrip
+    # Pixels live in a ctypes uint32 array (0x00RRGGBB) exposed through ledAddress, so StripOutput memmoves into it
+    # exactly like into the ws2811 channel buffer. show() records its time stamp (and optionally a copy of the frame)
+    # and, with wireTime, blocks like the real driver while the previous frame is still being clocked out.
+    def __init__(self, ledCount:int, pin:int = 18, channel:int = 0, wireTime:bool = True, keepFrames:int = 0):
+        self.ledCount = ledCount
+        self.pin = pin
+        self.channel = channel
+        self.leds = (ctypes.c_uint32 * ledCount)()
+        self.ledAddress = ctypes.addressof(self.leds)
+        self._led_data = self.leds
+        self.wireTime = wireTime            # emulate the time the frame takes on the wire
+        self.frameTime = 24*ledCount*WS2812_BIT_TIME + WS2812_RESET_TIME
+        self.busyUntil = 0.0
+        self.keepFrames = keepFrames        # number of most recent frames to keep a copy of, 0 keeps none
+        self.frames = []                    # [(show time, tuple of pixel words), ...]
+        self.showTimes = []
+        self.lock = threading.Lock()
+        self.begun = False
+
+    def begin(self):
+        self.begun = True
+
+    def numPixels(self):
+        return self.ledCount
+
+    def setPixelColor(self, n:int, color:int):
+        self.leds[n] = color
+
+    def getPixelColor(self, n:int):
+        return self.leds[n]
+
+    def getPixels(self):
+        return self.leds[:]
+
+    def show(self):
+        with self.lock:
+            now = time.perf_counter()
+            if self.wireTime:
+                if now < self.busyUntil:        # ws2811_wait(): previous DMA transfer still running
+                    time.sleep(self.busyUntil - now)
+                    now = self.busyUntil
+                self.busyUntil = now + self.frameTime
+            self.showTimes.append(now)
+            if self.keepFrames:
+                self.frames.append((now, tuple(self.leds)))
+                if len(self.frames) > self.keepFrames:
+                    del self.frames[0]
+
+    def showCount(self):
+        return len(self.showTimes)
+
+    def _cleanup(self):
+        self.begun = False
+
+
+class FakeGPIO:
+    # Stand-in for the RPi.GPIO module: pins are set with press()/release() (buttons pull the pin low) and edge
+    # callbacks fire on the caller's thread, like the RPi.GPIO event thread would
+    BCM = 11
+    BOARD = 10
+    IN = 1
+    OUT = 0
+    PUD_UP = 22
+    PUD_DOWN = 21
+    FALLING = 32
+    RISING = 31
+    BOTH = 33
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self):
+        self.mode = None
+        self.levels = {}
+        self.callbacks = {}
+
+    def setmode(self, mode:int):
+        self.mode = mode
+
+    def setup(self, pin:int, direction:int, pull_up_down:int = None, initial:int = None):
+        self.levels[pin] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+
+    def input(self, pin:int):
+        return self.levels[pin]
+
+    def output(self, pin:int, value:int):
+        self.setLevel(pin, value)
+
+    def add_event_detect(self, pin:int, edge:int, callback = None, bouncetime:int = None):
+        self.callbacks[pin] = (edge, callback)
+
+    def remove_event_detect(self, pin:int):
+        self.callbacks.pop(pin, None)
+
+    def cleanup(self, pins = None):
+        for pin in (pins if pins is not None else list(self.levels)):
+            self.levels.pop(pin, None)
+            self.callbacks.pop(pin, None)
+
+    def setLevel(self, pin:int, level:int):
+        previous = self.levels.get(pin)
+        self.levels[pin] = level
+        edge, callback = self.callbacks.get(pin, (None, None))
+        if callback is None or previous == level: return
+        if edge == self.BOTH or (edge == self.FALLING and level == self.LOW) or (edge == self.RISING and level == self.HIGH):
+            callback(pin)
+
+    def press(self, pin:int):
+        self.setLevel(pin, self.LOW)
+
+    def release(self, pin:int):
+        self.setLevel(pin, self.HIGH)
@@ -0,0 +1,169 @@
+import time
+import ctypes
+import threading
+from frameBuffer import StripFrameBuffer
+
+# Bulk pixel output for rpi_ws281x strips
+# ws2811 keeps each channel's pixels as a uint32 array (0xWWRRGGBB, color order is applied by the driver on render),
+# so the strip's packed frame buffer is memmoved into it in one copy right before show()
+
+class StripOutput:
+    def __init__(self, strip, frameBuffer:StripFrameBuffer):
+        self.strip = strip
+        self.frameBuffer = frameBuffer
+        self.pixelCount = min(strip.numPixels(), frameBuffer.ledCount)
+        self.address = getattr(strip, "ledAddress", None)      # simulated strips (ledHardware.py) expose their array
+        if self.address is None:
+            try:
+                from rpi_ws281x import ws
+                self.address = int(ws.ws2811_channel_t_leds_get(strip._channel))     # only valid after strip.begin()
+            except (ImportError, AttributeError, TypeError):
+                self.address = None
+
+    def show(self):
+        words = self.frameBuffer.pack()
+        if self.address:
+            ctypes.memmove(self.address, words.ctypes.data, 4*self.pixelCount)
+        else:
+            self.strip._led_data[0:self.pixelCount] = words[:self.pixelCount].tolist()
+        self.strip.show()
+
+
+# Frame-coherent strip refresh
+# Record/playback callbacks mark the universes they wrote, and each strip is pushed once per completed frame:
+# when every universe of the strip has arrived, a universe arrives twice (next frame started), or coalesceTime has
+# passed since the frame's first universe. maxRate optionally caps show() calls per strip per second.
+
+class StripRefresher:
+    def __init__(self, outputs:list, universeStrips:list, coalesceTime:float = 0.005, maxRate:float = None, showLock = None):
+        # universeStrips: strips fed by each universe (LEDSession.universeStrips), or one strip index per universe
+        self.outputs = outputs
+        self.universeStrips = [[strip for strip in (strips if isinstance(strips, (list, tuple)) else [strips])
+                                if strip < len(outputs)]       # universes of strips this session doesn't drive are ignored
+                               for strips in universeStrips]
+        self.universeBits = [1 << universe for universe in range(len(universeStrips))]
+        self.completeMasks = [0] * len(outputs)
+        for universe, strips in enumerate(self.universeStrips):
+            for strip in strips:
+                self.completeMasks[strip] |= self.universeBits[universe]
+        self.arrived = [0] * len(outputs)            # universes written since the strip's last show()
+        self.complete = [False] * len(outputs)
+        self.dirtySince = [0.0] * len(outputs)       # arrival time of the first universe of the pending frame
+        self.lastShow = [0.0] * len(outputs)
+        self.coalesceTime = coalesceTime
+        self.minInterval = 1/maxRate if maxRate else 0.0
+        self.condition = threading.Condition()
+        self.showLock = showLock if showLock is not None else threading.Lock()     # serialises show() with other refreshers
+        self.thread = None
+        self.running = False
+        self.holding = False        # hold(): only forced refreshes push strips (Art-Net sync mode)
+        self.resetStats()
+
+    def resetStats(self):
+        self.showCount = 0          # strip show() calls
+        self.timeoutCount = 0       # shows of partial frames after coalesceTime
+        self.showCpuTime = 0.0      # CPU time spent in show() (this includes waiting on the previous DMA transfer)
+        self.latencySum = 0.0       # first universe arrival -> show() returned
+        self.latencyMax = 0.0
+
+    def universeUpdated(self, universe:int):
+        bit = self.universeBits[universe]
+        with self.condition:
+            for strip in self.universeStrips[universe]:
+                arrived = self.arrived[strip]
+                if arrived == 0:
+                    self.dirtySince[strip] = time.perf_counter()
+                elif arrived & bit:
+                    self.complete[strip] = True          # universe repeated, treat the pending frame as done
+                arrived |= bit
+                self.arrived[strip] = arrived
+                if arrived == self.completeMasks[strip]:
+                    self.complete[strip] = True
+                if self.complete[strip] and not self.holding:
+                    self.condition.notify()
+
+    def hold(self, holding:bool):
+        # while holding, written universes are tracked but strips are only pushed by refreshDirty()/refreshAll()
+        with self.condition:
+            self.holding = holding
+            self.condition.notify()
+
+    def showStrip(self, strip:int, now:float):
+        with self.showLock:
+            cpuStart = time.thread_time()
+            self.outputs[strip].show()
+            self.showCpuTime += time.thread_time() - cpuStart
+        shown = time.perf_counter()
+        latency = shown - self.dirtySince[strip]
+        self.latencySum += latency
+        if latency > self.latencyMax: self.latencyMax = latency
+        self.lastShow[strip] = now
+        self.showCount += 1
+
+    def takeDueStrips(self, now:float, force:bool = False):
+        # returns strips to push now and how long until the next pending strip is due (None if nothing pending)
+        due = []
+        wait = None
+        for strip in range(len(self.outputs)):
+            if self.arrived[strip] == 0 or (self.holding and not force): continue
+            dueTime = self.dirtySince[strip] if (force or self.complete[strip]) else self.dirtySince[strip] + self.coalesceTime
+            dueTime = max(dueTime, self.lastShow[strip] + self.minInterval)
+            if dueTime <= now:
+                if not (force or self.complete[strip]): self.timeoutCount += 1
+                self.arrived[strip] = 0
+                self.complete[strip] = False
+                due.append(strip)
+            elif wait is None or dueTime - now < wait:
+                wait = dueTime - now
+        return due, wait
+
+    def refreshDirty(self):
+        # push every strip written since its last show (playback: called once per scheduler batch)
+        now = time.perf_counter()
+        with self.condition:
+            due, wait = self.takeDueStrips(now, force=True)
+        for strip in due:
+            self.showStrip(strip, now)
+
+    def refreshAll(self):
+        now = time.perf_counter()
+        with self.condition:
+            for strip in range(len(self.outputs)):
+                self.arrived[strip] = 0
+                self.complete[strip] = False
+                self.dirtySince[strip] = now
+        for strip in range(len(self.outputs)):
+            self.showStrip(strip, now)
+
+    def start(self):
+        # background refresh thread, used when frames arrive asynchronously (Art-Net recording)
+        if self.thread is not None: return
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="StripRefresher", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+
+    def run(self):
+        while True:
+            with self.condition:
+                if not self.running: return
+                due, wait = self.takeDueStrips(time.perf_counter())
+                if not due:
+                    self.condition.wait(wait)
+                    continue
+            now = time.perf_counter()
+            for strip in due:
+                self.showStrip(strip, now)
+
+    def stats(self):
+        averageLatency = self.latencySum/self.showCount if self.showCount else 0.0
+        return (f"{self.showCount} strip refreshes ({self.timeoutCount} partial frames), "
+                f"packet to show avg {averageLatency*1000:.1f} ms / max {self.latencyMax*1000:.1f} ms, "
+                f"show CPU {self.showCpuTime:.2f} s")
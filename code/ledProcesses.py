@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# Multi-process layout: Art-Net ingest, playback scheduling and LED output each run in their own process (and on their
+# own core of the Zero 2), so a GC pause, a slow SD write or a burst of packets in one stage can't hold the GIL the
+# output needs for show().
+#   ingest     ArtnetReceiver + LEDLive / LEDRecord (disk writer thread included)
+#   scheduler  LEDPlayback: take readers, FrameScheduler, audio clock
+#   output     LEDSession: frame buffers, routing, StripRefresher and the strips / DMA
+# Ingest and scheduler run the normal mode classes on a RingSession, which has the LEDSession interface but pushes
+# routed universes and refresh requests into a FrameRing (frameRing.py, shared memory, no cross-process locks)
+# instead of writing frame buffers. The output process drains both rings and does what LEDSession would have done
+# in-process.
+# Each stage is controlled over a pipe with synchronous commands from the main process (LEDProcesses.call()).
+#   sudo python3 ./code/ledProcesses.py live
+#   sudo python3 ./code/ledProcesses.py play ./saves/liveTest
+
+import os
+import sys
+import time
+import signal
+import threading
+import traceback
+import multiprocessing
+from ledSession import LEDSession
+from ledConfig import LEDConfig, loadConfig
+from frameRing import FrameRing, waitRings, DMX, REFRESH, REFRESH_ALL, HOLD, CLEAR
+from newLive import LEDLive
+from newRecord import LEDRecord
+from newPlayback import LEDPlayback
+
+STAGE_CORES = {"output": 3, "ingest": 1, "scheduler": 2}       # core 0 is left to the main process and the kernel
+WAIT_TIMEOUT = 0.005        # output process: longest sleep on empty rings (pushes wake it, this is only a safety net)
+
+
+def pinToCore(core:int):
+    # Linux only, ignored where the core doesn't exist (tests off the Pi)
+    if core is None or not hasattr(os, "sched_setaffinity"): return
+    if core in os.sched_getaffinity(0):
+        os.sched_setaffinity(0, {core})
+
+
+class RingRouter:
+    # UniverseRouter interface: routed universes go into the ring with their push time (perf_counter)
+    def __init__(self, router, ring:FrameRing):
+        self.isRouted = router.isRouted
+        self.universeCount = router.universeCount
+        self.ring = ring
+
+    def route(self, universe:int, data):
+        self.ring.push(DMX, universe, time.perf_counter(), data)
+
+
+class RingRefresher:
+    # StripRefresher interface: the output process's refresher decides when strips are shown, this only forwards the
+    # explicit refresh/hold requests in order with the universes
+    def __init__(self, ring:FrameRing):
+        self.ring = ring
+
+    def universeUpdated(self, universe:int):
+        pass
+
+    def hold(self, holding:bool):
+        self.ring.push(HOLD, int(holding))
+
+    def refreshDirty(self):
+        self.ring.push(REFRESH)
+
+    def refreshAll(self):
+        self.ring.push(REFRESH_ALL)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self):
+        return f"strips refreshed by the output process, ring: {self.ring.stats()}"
+
+
+class RingSession(LEDSession):
+    # LEDSession without strips for the ingest and scheduler processes: same config, routing tables and Art-Net
+    # socket handling, output goes into ring
+    def __init__(self, config:LEDConfig, ring:FrameRing, artnetPort:int = None):
+        self.ring = ring
+        super().__init__(config=config, artnetPort=artnetPort)
+        self.router = RingRouter(self.router, ring)
+
+    def initStrips(self):
+        pass
+
+    def createRefresher(self, coalesceTime:float = 0.005, maxRate:float = None):
+        return RingRefresher(self.ring)
+
+    def clear(self):
+        self.ring.push(CLEAR)
+
+
+class Stage:
+    # one process of the layout, commands are method names called from LEDProcesses.call()
+    def serve(self, conn):
+        while self.serveCommand(conn):
+            pass
+
+    def serveCommand(self, conn):
+        # returns False after "quit"
+        command, args = conn.recv()
+        if command == "quit":
+            self.close()
+            conn.send((True, None))
+            return False
+        try:
+            if command == "execute":            # execute(function, *args): function(stage, *args), for benchmarks
+                result = args[0](self, *args[1:])
+            else:
+                result = getattr(self, command)(*args)
+            conn.send((True, result))
+        except Exception as e:
+            traceback.print_exc()
+            conn.send((False, f"{command} failed: {e}"))
+        return True
+
+    def close(self):
+        pass
+
+
+class OutputStage(Stage):
+    def __init__(self, config:LEDConfig, backend:str, rings:list, coalesceTime:float, maxRate:float, simOptions:dict):
+        self.session = LEDSession(config=config, backend=backend, **simOptions)
+        self.router = self.session.router
+        self.refresher = self.session.createRefresher(coalesceTime, maxRate)
+        self.refresher.start()
+        self.rings = rings
+        self.refreshPending = None      # REFRESH/REFRESH_ALL waiting for the rings to be drained
+        self.recordCount = 0
+        self.transitSum = 0.0       # push (ingest/scheduler process) -> routed here
+        self.transitMax = 0.0
+
+    def handleRecord(self, kind:int, universe:int, timeStamp:float, data):
+        if kind == DMX:
+            self.router.route(universe, data)
+            self.refresher.universeUpdated(universe)
+            transit = time.perf_counter() - timeStamp
+            self.transitSum += transit
+            if transit > self.transitMax: self.transitMax = transit
+            self.recordCount += 1
+        elif kind == REFRESH_ALL:
+            self.refreshPending = REFRESH_ALL
+        elif kind == REFRESH:
+            if self.refresher.holding:
+                self.refresher.refreshDirty()       # ArtSync: latch exactly the universes before the sync
+            elif self.refreshPending is None:
+                self.refreshPending = REFRESH
+        elif kind == HOLD:
+            self.refresher.hold(bool(universe))
+        elif kind == CLEAR:
+            self.session.clear()
+
+    def serve(self, conn):
+        rings = self.rings
+        handleRecord = self.handleRecord
+        commandFd = conn.fileno()
+        while True:
+            drained = 0
+            for ring in rings:
+                drained += ring.drain(handleRecord)
+            if self.refreshPending is not None:
+                # refreshes are applied once the rings are empty, so when output falls behind (show() waiting for the
+                # wire) the queued batches are merged into one refresh instead of backing up
+                refreshAll = self.refreshPending == REFRESH_ALL
+                self.refreshPending = None
+                self.refresher.refreshAll() if refreshAll else self.refresher.refreshDirty()
+            if not drained:
+                waitRings(rings, WAIT_TIMEOUT, [commandFd])
+            if conn.poll():
+                if not self.serveCommand(conn): return
+
+    def clear(self):
+        self.session.clear()
+
+    def showTimes(self):
+        # simulated backend: show() times (perf_counter) of each strip
+        return [list(getattr(strip, "showTimes", [])) for strip in self.session.strips]
+
+    def stats(self):
+        transit = self.transitSum/self.recordCount if self.recordCount else 0.0
+        return {"refresher": self.refresher.stats(),
+                "rings": [ring.stats() for ring in self.rings],
+                "records": self.recordCount,
+                "transitAvg": transit,
+                "transitMax": self.transitMax}
+
+    def close(self):
+        self.refresher.stop()
+        self.session.close()
+
+
+class IngestStage(Stage):
+    def __init__(self, config:LEDConfig, ring:FrameRing, artnetPort:int = None):
+        self.session = RingSession(config, ring, artnetPort)
+        self.client = None
+
+    def live(self, coalesceTime:float = 0.002):
+        self.stop()
+        self.client = LEDLive(coalesceTime=coalesceTime, session=self.session)
+        self.client.start()
+
+    def record(self, saveName:str, saveDir:str = "./saves/", saveFormat:str = "bin", recTriggerVal:int = 0):
+        self.stop()
+        self.client = LEDRecord(recTriggerVal=recTriggerVal, session=self.session)
+        self.client.record(saveName, saveDir, saveFormat)
+
+    def stop(self):
+        if self.client is not None:
+            self.client.deinit()
+            self.client = None
+
+    def stats(self):
+        receiver = self.session.artnetServer
+        return {"receiver": receiver.stats() if receiver is not None else "not started",
+                "packets": receiver.packetCount if receiver is not None else 0,
+                "ring": self.session.ring.stats()}
+
+    def close(self):
+        self.stop()
+        self.session.close()
+
+
+class SchedulerStage(Stage):
+    def __init__(self, config:LEDConfig, ring:FrameRing):
+        self.session = RingSession(config, ring)
+        self.playback = None
+
+    def load(self, filePath:str, audioPath:str = None, mapped:bool = True):
+        self.unload()
+        self.playback = LEDPlayback(filePath, mapped, audioPath=audioPath, session=self.session)
+
+    def play(self, loop:bool = False, start:float = 0.0):
+        self.playback.play(loop, start)
+
+    def seek(self, timeStamp:float):
+        self.playback.seek(timeStamp)
+
+    def stop(self):
+        if self.playback is not None:
+            self.playback.stop()
+
+    def unload(self):
+        if self.playback is not None:
+            self.playback.deinit()
+            self.playback = None
+
+    def status(self):
+        if self.playback is None: return {"loaded": False}
+        return {"loaded": True, "finished": self.playback.finished, "clock": self.playback.clock(),
+                "scheduler": self.playback.scheduler.stats()}
+
+    def stats(self):
+        return {**self.status(), "ring": self.session.ring.stats()}
+
+    def close(self):
+        self.unload()
+        self.session.close()
+
+
+def runStage(stageClass, conn, core:int, args:tuple):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)        # Ctrl-C is handled by the main process, which stops the stages
+    pinToCore(core)
+    try:
+        stage = stageClass(*args)
+    except Exception as e:
+        traceback.print_exc()
+        conn.send((False, f"{stageClass.__name__} failed to start: {e}"))
+        return
+    conn.send((True, None))
+    stage.serve(conn)
+
+
+class LEDProcesses:
+    def __init__(self, config:LEDConfig = None, backend:str = None, artnetPort:int = None, ringSlots:int = 1024,
+                 coalesceTime:float = 0.002, maxRefreshRate:float = None, cores:dict = STAGE_CORES, **simOptions):
+        # ringSlots: universes each ring holds (1024 = 1.5 s of 16 universes at 44 Hz, 550 KB of shared memory)
+        # Stages are forked (the rings' pipes are inherited), so create this before starting any threads.
+        config = loadConfig() if config is None else config
+        self.config = config
+        self.universeCount = config.universeCount()
+        self.context = multiprocessing.get_context("fork")
+        self.ingestRing = FrameRing(ringSlots)
+        self.playbackRing = FrameRing(ringSlots)
+        self.stages = {}
+        self.closed = False
+        self.startStage("output", OutputStage, cores.get("output"),
+                        (config, backend, [self.ingestRing, self.playbackRing], coalesceTime, maxRefreshRate, simOptions))
+        self.startStage("ingest", IngestStage, cores.get("ingest"), (config, self.ingestRing, artnetPort))
+        self.startStage("scheduler", SchedulerStage, cores.get("scheduler"), (config, self.playbackRing))
+
+    def startStage(self, name:str, stageClass, core:int, args:tuple):
+        conn, childConn = self.context.Pipe()
+        process = self.context.Process(target=runStage, args=(stageClass, childConn, core, args), name=name, daemon=True)
+        process.start()
+        childConn.close()
+        self.stages[name] = (process, conn, threading.Lock())
+        started, error = conn.recv()
+        if not started:
+            self.close()
+            raise RuntimeError(error)
+
+    def call(self, stage:str, command:str, *args):
+        # runs command(*args) in the stage process and returns its result (None and a message if it failed)
+        process, conn, lock = self.stages[stage]
+        with lock:
+            conn.send((command, args))
+            ok, result = conn.recv()
+        if not ok:
+            print(f"  {stage}: {result}")
+            return None
+        return result
+
+    def live(self, coalesceTime:float = 0.002):
+        self.call("ingest", "live", coalesceTime)
+
+    def record(self, saveName:str, saveDir:str = "./saves/", saveFormat:str = "bin", recTriggerVal:int = 0):
+        self.call("ingest", "record", saveName, saveDir, saveFormat, recTriggerVal)
+
+    def stopIngest(self):
+        self.call("ingest", "stop")
+
+    def load(self, filePath:str, audioPath:str = None, mapped:bool = True):
+        self.call("scheduler", "load", filePath, audioPath, mapped)
+
+    def play(self, loop:bool = False, start:float = 0.0):
+        self.call("scheduler", "play", loop, start)
+
+    def seek(self, timeStamp:float):
+        self.call("scheduler", "seek", timeStamp)
+
+    def stopPlayback(self):
+        self.call("scheduler", "stop")
+
+    def status(self):
+        return self.call("scheduler", "status")
+
+    def clear(self):
+        self.call("output", "clear")
+
+    def stats(self):
+        return {name: self.call(name, "stats") for name in self.stages}
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        for name in ("ingest", "scheduler", "output"):      # output last, it clears the strips
+            if name not in self.stages: continue
+            process, conn, lock = self.stages[name]
+            if process.is_alive():
+                try:
+                    self.call(name, "quit")
+                except (EOFError, OSError):
+                    pass
+            process.join(2.0)
+            if process.is_alive():
+                print(f"  {name} process didn't stop, terminating it")
+                process.terminate()
+                process.join()
+            conn.close()
+        self.ingestRing.close(unlink=True)
+        self.playbackRing.close(unlink=True)
+
+
+if __name__ == "__main__":
+    mode = sys.argv[1] if len(sys.argv) > 1 else "live"
+    processes = LEDProcesses(loadConfig("./ledConfig.json", [20]))
+    def handleSignal(signum, frame):
+        raise SystemExit(128 + signum)
+    for signum in (signal.SIGTERM, signal.SIGHUP):
+        signal.signal(signum, handleSignal)
+    try:
+        if mode == "play":
+            processes.load(sys.argv[2] if len(sys.argv) > 2 else "./saves/liveTest", './audio/TestAudio.wav')
+            processes.play(loop=True)
+        elif mode == "record":
+            processes.record(sys.argv[2] if len(sys.argv) > 2 else "liveTest")
+        else:
+            processes.live()
+        while True:
+            time.sleep(0.1)
+    except (KeyboardInterrupt, SystemExit):
+        for name, stats in processes.stats().items():
+            print(f"  {name}: {stats}")
+        processes.close()
+        sys.exit()
@@ -0,0 +1,146 @@
+import atexit
+import signal
+import threading
+from ledHardware import createStrip, DEFAULT_BACKEND
+from frameBuffer import StripFrameBuffer
+from ledOutput import StripOutput, StripRefresher
+from artnetReceiver import ArtnetReceiver
+from ledConfig import LEDConfig, UniverseRouter
+
+# Long-lived LED output session: owns the PixelStrip/DMA objects, their frame buffers and the Art-Net socket for the
+# whole process. LEDRecord and LEDPlayback attach to it as clients, so switching modes doesn't reinitialise hardware.
+
+# Outputs, pixel layout and universe mapping come from an LEDConfig (see ledConfig.py), or for LEDSession([20, ...])
+# from the original layout: up to 4 RGB strips of up to 680 pixels, 170 pixels per universe, consecutive universes
+
+class LEDSession:
+    def __init__(self, ledCounts:list = [20], backend:str = None, artnetPort:int = None, config:LEDConfig = None, **simOptions):
+        # backend: "ws281x" (the Pi) or "sim" (in-memory strips, see ledHardware.py), defaults to $LED_BACKEND
+        # config:  output config (ledConfig.loadConfig()), overrides ledCounts
+        if config is None:
+            ledCounts = list(ledCounts)
+            for i, count in enumerate(ledCounts):
+                if count > 680:
+                    print(f"  Maximum of 680 LEDs per strip! LED count for strip {i} clipped to 680.")
+                    ledCounts[i] = 680
+            config = LEDConfig.fromLedCounts(ledCounts)
+
+        self.config = config
+        self.ledCounts = config.ledCounts
+        self.backend = backend or DEFAULT_BACKEND
+        self.simOptions = simOptions
+        self.artnetPort = config.artnetPort if artnetPort is None else artnetPort
+        self.stripCount = len(self.ledCounts)
+        self.strips = [None] * self.stripCount
+        self.frameBuffers = [StripFrameBuffer(output.ledCount, output.colorOrder, output.brightness, output.gamma)
+                             for output in config.outputs]
+        self.stripOutputs = [None] * self.stripCount
+        self.showLock = threading.Lock()            # shared by every client's refresher
+
+        # Universe -> strip slices routing table, compiled once
+        self.router = UniverseRouter(config, self.frameBuffers)
+        self.universeStrips = self.router.universeStrips       # strips fed by each universe
+        self.universe2strip = self.router.universe2strip        # take header fields
+        self.universe2substrip = self.router.universe2substrip
+        self.universeCount = self.router.universeCount
+
+        self.artnetServer = None
+        self.artnetClient = None
+        self.metrics = None             # ingest metrics, see enableMetrics()
+        self.metricsReporter = None
+        self.audio = None               # PyAudio instance shared by every playback, see audioDevice()
+        self.closed = False
+        self.initStrips()
+        atexit.register(self.close)
+
+    def initStrips(self):
+        for strip, output in enumerate(self.config.outputs):
+            self.strips[strip] = createStrip(output.ledCount, output.gpio, output.channel, self.backend,
+                                             output.channelsPerPixel == 4, **self.simOptions)
+            self.strips[strip].begin()
+            self.stripOutputs[strip] = StripOutput(self.strips[strip], self.frameBuffers[strip])
+
+    def createRefresher(self, coalesceTime:float = 0.005, maxRate:float = None):
+        # strip refresher for a client (see ledOutput.py), all of them share the session's show lock
+        return StripRefresher(self.stripOutputs, self.universeStrips, coalesceTime, maxRate, showLock=self.showLock)
+
+    def initArtnet(self):
+        # one socket for the process lifetime, packets go to whichever client is attached
+        self.artnetServer = ArtnetReceiver(self.universeCount, self.artnetCallback, self.artnetSync, self.artnetPort)
+        self.artnetServer.metrics = self.metrics
+
+    def enableMetrics(self, interval:float = 10.0, statsPath:str = None, port:int = None):
+        # per universe packet/loss/arrival time and callback time metrics (ingestMetrics.py), summarised every interval
+        # seconds to stdout, the stats file statsPath and/or a JSON endpoint on 127.0.0.1:port
+        from ingestMetrics import IngestMetrics, MetricsReporter
+        if self.metrics is None:
+            self.metrics = IngestMetrics(self.universeCount)
+            if self.artnetServer is not None:
+                self.artnetServer.metrics = self.metrics
+        if self.metricsReporter is None:
+            self.metricsReporter = MetricsReporter(self.metrics, interval, statsPath, port)
+        return self.metrics
+
+    def audioDevice(self):
+        # opened on first use (or at daemon startup to pre-warm it) and kept until close(): the device probe runs once
+        if self.audio is None:
+            from audioEngine import openAudioDevice
+            self.audio = openAudioDevice()
+        return self.audio
+
+    def attachArtnet(self, client):
+        if self.artnetServer is None:
+            self.initArtnet()
+        self.artnetClient = client
+
+    def detachArtnet(self, client):
+        if self.artnetClient is client:
+            self.artnetClient = None
+
+    def artnetCallback(self, data, universe:int):
+        # data: memoryview of the packet's DMX channels, only valid during the call
+        client = self.artnetClient
+        if client is not None:
+            client.recordCallback(data, universe)
+
+    def artnetSync(self):
+        client = self.artnetClient
+        if client is not None and hasattr(client, "syncCallback"):
+            client.syncCallback()
+
+    def clear(self):
+        for frameBuffer in self.frameBuffers:
+            frameBuffer.fill(0, 0, 0)
+        with self.showLock:
+            for output in self.stripOutputs:
+                if output is not None: output.show()
+
+    def installSignalHandlers(self):
+        # turn SIGTERM/SIGHUP into SystemExit so the normal cleanup path runs (SIGKILL can't be caught,
+        # the atexit hook covers everything else)
+        def handleSignal(signum, frame):
+            raise SystemExit(128 + signum)
+        for signum in (signal.SIGTERM, signal.SIGHUP):
+            signal.signal(signum, handleSignal)
+
+    def close(self):
+        if self.closed: return
+        self.closed = True
+        self.artnetClient = None
+        if self.artnetServer is not None:
+            self.artnetServer.close()
+            self.artnetServer = None
+        if self.metricsReporter is not None:
+            self.metricsReporter.stop()
+            self.metricsReporter = None
+        if self.audio is not None:
+            self.audio.terminate()
+            self.audio = None
+        try:
+            self.clear()
+        except Exception as e:
+            print(f"  Unable to clear strips on exit: {e}")
+        for strip in self.strips:
+            if strip is not None:
+                strip._cleanup()        # ws2811_fini(): waits for DMA to finish and releases it
+        atexit.unregister(self.close)
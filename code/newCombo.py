@@ -1,85 +1,138 @@
-import sys, time, os, glob
+import sys, os
+import argparse
 from datetime import datetime
-import RPi.GPIO as GPIO
 from newPlayback import LEDPlayback
 from newRecord import LEDRecord
+from ledSession import LEDSession
+from ledConfig import loadConfig
+from takeCache import TakeIndex, TakeCache
+from controller import LEDController, GPIOButtonInput
+from controlSocket import ControlServer, CONTROL_SOCKET
 
-DEBOUNCE_TIME = 0.5
 GPIO_RECORD = 17
 GPIO_PLAY = 27
-# NOTE: use global variable for # of LEDs? Or read from text config file?
-
-GPIO.setmode(GPIO.BCM)
-GPIO.setup(GPIO_RECORD, GPIO.IN, pull_up_down=GPIO.PUD_UP)
-GPIO.setup(GPIO_PLAY,   GPIO.IN, pull_up_down=GPIO.PUD_UP)
-
-mode = "Idle"
-
-try:
-    while True:
-        if mode == "Idle":
-            time.sleep(DEBOUNCE_TIME)
-            print("LED Controller idle\nWaiting for button press...")
-            while True:
-                if not GPIO.input(GPIO_RECORD): 
-                    # if necessary? if (GPIO.input(GPIO_RECORD) == 0):
-                    mode = "Record"
-                    break
-                if not GPIO.input(GPIO_PLAY): 
-                    mode = "Playback"
-                    break
-        elif mode == "Record":
-            time.sleep(DEBOUNCE_TIME)
-            print("Recording...")
-            saveName = datetime.now().strftime("%Y-%m-%d-%H-%M-%S") + "_save"
-            recorder = LEDRecord([20])    # number of LED pixels on output 0
-            recorder.record(saveName, './saves/')
-            while True:
-                recorder.refreshStrips()
-                time.sleep(0.1)
-                if not GPIO.input(GPIO_RECORD):
-                    recorder.deinit()
-                    del recorder
-                    mode = "Idle"
-                    break
-        elif mode == "Playback":
-            time.sleep(DEBOUNCE_TIME)
-            print("Playback...")
-            folders = glob.glob("./saves/*_save/")
-            if folders:
-                newestFolder = max(folders, key=os.path.getctime)
-            #TO DO: error check if newestFolder doesn't exist
-            playback = LEDPlayback(newestFolder)
-            playback.play()
-            while True:
-                playback.refreshStrips()
-                if (playback.finished):
-                    playback.play()
-                if not GPIO.input(GPIO_PLAY):
-                    playback.deinit()
-                    del playback
-                    mode = "Idle"
-                    break
-        else:
-            print(f"Invalid mode {mode}!")
-            mode = "Idle"
-except (KeyboardInterrupt, SystemExit):
-    if mode == "Record":
-        pass
-    if mode == "Playback":
-        playback.deinit()
-        del playback
-    sys.exit()
-except Exception as e:
-    print("Unknown error: ")
-    print(e)
-    if mode == "Record":
+
+
+class ComboActions:
+    # what each Idle/Record/Playback transition of the controller does
+    def __init__(self, session:LEDSession, takeIndex:TakeIndex, takeCache:TakeCache, idleEffect:dict = None):
+        # idleEffect: {"name": effect, parameters...} looped while idle (ledConfig.json), None leaves the strips off
+        self.session = session
+        self.takeIndex = takeIndex
+        self.takeCache = takeCache
+        self.recorder = None
+        self.playback = None
+        self.idle = None
+        self.idlePath = None
+        self.saveName = None
+        if idleEffect:
+            from ledEffects import cacheEffect      # only loaded with an idle effect configured
+            try:
+                self.idlePath = cacheEffect(takeCache, session.config, **idleEffect)     # pre-rendered once, pinned in the cache
+            except (ValueError, TypeError, KeyError) as e:
+                print(f"  Invalid idle effect {idleEffect} ({e}), strips stay off while idle.")
+
+    def startIdle(self):
+        if self.idlePath is None or self.idle is not None: return
+        self.idle = LEDPlayback(self.idlePath, audioPath=None, takeCache=self.takeCache, session=self.session)
+        self.idle.play(loop=True)
+
+    def stopIdle(self):
+        if self.idle is not None:
+            self.idle.deinit()
+            self.idle = None
+
+    def startRecord(self):
+        print("Recording...")
+        self.stopIdle()
+        self.saveName = datetime.now().strftime("%Y-%m-%d-%H-%M-%S") + "_save"
+        self.recorder = LEDRecord(session=self.session)
+        self.recorder.record(self.saveName, './saves/')
+
+    def stopRecord(self):
+        self.recorder.deinit()
+        self.recorder = None
+        self.takeIndex.update(self.saveName)
+        self.startIdle()
+
+    def startPlayback(self):
+        print("Playback...")
+        newestFolder = self.takeIndex.newest()
+        if newestFolder is None:
+            print("No saves to play back!")
+            return False
+        self.stopIdle()
+        self.playback = LEDPlayback(newestFolder, takeCache=self.takeCache, session=self.session)
+        self.playback.play(loop=True)        # seamless loop, wraps to the start on the same timeline
+
+    def stopPlayback(self):
+        self.playback.deinit()
+        self.playback = None
+        self.startIdle()
+
+    def reset(self):
+        # after a failed transition (LEDController.recover): close whatever is open, back to the idle effect
+        if self.playback is not None:
+            playback, self.playback = self.playback, None
+            playback.deinit()
+        if self.recorder is not None:
+            recorder, self.recorder = self.recorder, None
+            recorder.deinit()
+            self.takeIndex.update(self.saveName)
+        self.startIdle()
+
+    def status(self):
+        # for the control socket's replies
+        status = {"idle": self.idle is not None, "take": None}
+        if self.playback is not None:
+            firstFrame = self.playback.scheduler.firstBatchTime
+            status.update(take=self.playback.filePath, clock=self.playback.clock(), loops=self.playback.loopCount,
+                          firstFrameTime=firstFrame)
+        elif self.recorder is not None:
+            status.update(take=self.saveName, recording=self.recorder.postStartFlag)
+        return status
+
+
+if __name__ == "__main__":
+    # resident controller: everything below is set up once, then buttons and the control socket (controlSocket.py)
+    # only switch modes, a press costs no imports, device probes or take parsing
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', default=CONTROL_SOCKET, help='control socket path, "" disables it')
+    args = parser.parse_args()
+
+    session = LEDSession(config=loadConfig("./ledConfig.json", [20]))    # outputs/pixel mapping from the config file (20 LEDs on output 0 without one), strips and Art-Net socket live for the whole run
+    session.enableMetrics(statsPath="./ingestStats.json")     # ingest summary every 10 s, saved with each take too
+    session.installSignalHandlers()
+    try:
+        session.audioDevice()           # PortAudio device probe now instead of on the first play, kept open
+    except Exception as e:
+        print(f"  No audio output ({e}), playback runs on the system clock.")
+
+    os.makedirs("./saves/", exist_ok=True)
+    takeIndex = TakeIndex("./saves/")       # persistent index of the save folders, only new/changed takes are parsed
+    takeIndex.refresh()
+    takeCache = TakeCache()                 # decoded frames of recently played takes, LRU within the byte budget
+    if takeIndex.newest() is not None:
+        takeCache.get(takeIndex.newest())   # warm the cache so the first play is instant
+
+    actions = ComboActions(session, takeIndex, takeCache, session.config.idleEffect)
+    controller = LEDController(actions)
+    buttons = GPIOButtonInput({"record": GPIO_RECORD, "play": GPIO_PLAY}, controller.buttonPressed)
+    control = ControlServer(controller, args.socket, actions.status) if args.socket else None
+
+    try:
+        actions.startIdle()
+        controller.run()                    # sleeps until a button edge or control command arrives
+    except (KeyboardInterrupt, SystemExit):
         pass
-    if mode == "Playback":
-        playback.deinit()
-        del playback
-    sys.exit()
-
-#FOR LATER!
-#Make sure to hook a signal handler for SIGKILL to do cleanup. From the handler make sure to call ws2811_fini(). 
-#It'll make sure that the DMA is finished before program execution stops and cleans up after itself.
+    except Exception as e:
+        print("Unknown error: ")
+        print(e)
+    finally:
+        if control is not None:
+            control.close()
+        controller.shutdown()
+        actions.stopIdle()
+        buttons.close()
+        session.close()
+        sys.exit()
@@ -0,0 +1,74 @@
+import sys
+import time
+from ledSession import LEDSession
+
+# Live Art-Net passthrough: incoming universes go straight to the strips, nothing is recorded
+# Each packet's DMX payload is copied once, from the receive buffer into the strip's frame buffer. Without ArtSync a
+# strip is pushed as soon as all of its universes have arrived (or coalesceTime after the first one). Once an ArtSync
+# arrives the sender is in sync mode: universes are only buffered and every strip written since the last sync is
+# latched on the next ArtSync, so multi-universe frames change atomically. Sync mode ends after SYNC_TIMEOUT without
+# ArtSync, as in the Art-Net spec.
+
+SYNC_TIMEOUT = 4.0
+
+
+class LEDLive:
+    def __init__(self, ledCounts:list = [20], maxRefreshRate:float = None, coalesceTime:float = 0.002, session:LEDSession = None):
+        # session: shared LEDSession owning the strips and Art-Net socket, a private one is created (and closed by deinit) if None
+        self.ownsSession = session is None
+        self.session = LEDSession(ledCounts) if session is None else session
+        self.frameBuffers = self.session.frameBuffers
+        self.router = self.session.router           # universe -> strip slices, see ledConfig.py
+        self.syncMode = False
+        self.lastSync = 0.0
+        self.refresher = self.session.createRefresher(coalesceTime, maxRefreshRate)
+
+    def start(self):
+        print("  Live Art-Net passthrough, waiting for packets...")
+        self.refresher.start()
+        self.session.attachArtnet(self)
+
+    def recordCallback(self, data, universe:int):
+        # called by the session for every ArtDmx packet (data: memoryview of the DMX channels)
+        if not self.router.isRouted(universe): return
+        if self.syncMode and time.perf_counter() - self.lastSync > SYNC_TIMEOUT:
+            print("  No ArtSync for 4 s, back to immediate output")
+            self.syncMode = False
+            self.refresher.hold(False)
+        self.router.route(universe, data)
+        self.refresher.universeUpdated(universe)
+
+    def syncCallback(self):
+        self.lastSync = time.perf_counter()
+        if not self.syncMode:
+            print("  Got ArtSync, latching frames on sync")
+            self.syncMode = True
+            self.refresher.hold(True)
+        self.refresher.refreshDirty()
+
+    def stop(self):
+        self.session.detachArtnet(self)
+        self.refresher.stop()
+        print(f"  {self.refresher.stats()}")
+
+    def clear(self):
+        self.session.clear()
+
+    def deinit(self):
+        self.stop()
+        self.clear()
+        if self.ownsSession:
+            self.session.close()
+
+
+if __name__ == "__main__":
+    live = LEDLive([20])
+    live.session.installSignalHandlers()
+    live.start()
+
+    try:
+        while True:
+            time.sleep(0.1)
+    except (KeyboardInterrupt, SystemExit):
+        live.deinit()
+        sys.exit()
@@ -1,140 +1,239 @@
 import sys
 import time
-import threading
-import subprocess
-from rpi_ws281x import PixelStrip, Color
+import wave
+from ledSession import LEDSession
+from takeFormat import readTakeMetadata, openTakeReader
+from playbackScheduler import FrameScheduler
+from takeTimeline import buildTimeline, TIMELINE_TOLERANCE
+from audioEngine import AudioEngine
 
 class LEDPlayback:
-    def __init__(self, filePath:str):
+    def __init__(self, filePath:str, mapped:bool = True, maxRefreshRate:float = None, audioPath:str = './audio/TestAudio.wav',
+                 takeCache = None, session:LEDSession = None, tolerance:float = TIMELINE_TOLERANCE):
+        # session: shared LEDSession owning the strips, a private one is created (and closed by deinit) if None
+        # tolerance: universe records this close after a frame's first one belong to the same frame (see takeTimeline.py)
         print(f"  Playing back LED data: {filePath}...")
-        metadataFile = open(filePath + "/metadata.txt")
-        self.universeCount =        int(metadataFile.readline().split("#")[0].strip())
-        self.stripCount =           int(metadataFile.readline().split("#")[0].strip())
-        self.ledCounts =            [int(x) for x in metadataFile.readline().split("#")[0].strip().split(", ")]
-        self.universe2strip =       [int(x) for x in metadataFile.readline().split("#")[0].strip().split(", ")]
-        self.universe2substrip =    [int(x) for x in metadataFile.readline().split("#")[0].strip().split(", ")]
-        self.strips = [None] * self.stripCount
+        self.filePath = filePath
+        self.cachedTake = takeCache.get(filePath) if takeCache is not None else None      # frames already in RAM
+        if self.cachedTake is not None:
+            metadata = self.cachedTake.metadata
+        else:
+            metadata = readTakeMetadata(filePath)     # U0.bin header for binary takes, metadata.txt for legacy text takes
+        self.universeCount =        metadata.universeCount
+        self.stripCount =           metadata.stripCount
+        self.ledCounts =            metadata.ledCounts
+        self.universe2strip =       metadata.universe2strip
+        self.universe2substrip =    metadata.universe2substrip
+        self.ownsSession = session is None
+        self.session = LEDSession(self.ledCounts) if session is None else session
+        self.strips = self.session.strips
+        self.frameBuffers = self.session.frameBuffers
+        self.stripOutputs = self.session.stripOutputs
+        self.router = self.session.router           # universes are output through the session's routing table
+        self.activeUniverses = [universe for universe in range(self.universeCount) if self.router.isRouted(universe)]
+        if len(self.activeUniverses) < self.universeCount:
+            print(f"  Take has {self.universeCount} universes but only {len(self.activeUniverses)} are mapped to outputs, skipping the rest.")
+        self.mapped = mapped                # memory-map binary takes and copy frames straight from the map
         self.playbackFiles = [None] * self.universeCount
-        self.playbackFrame = [0] * self.universeCount
-        self.playbackDones = 0
+        self.timeline = None                # whole frames of the active universes, built by openFiles()
+        self.playbackFrame = 0              # next timeline frame
+        self.nextRecords = [False] * self.universeCount        # next unread record of each universe, belongs to a later frame
+        self.cuedFrames = {}                # universe -> pixels showing at the start position, applied on the first tick
+        self.maxRefreshRate = maxRefreshRate
+        self.looping = False
+        self.loopLength = None              # seconds, measured on the first play(loop=True)
+        self.loopCount = 0
+        self.loopOffset = 0.0               # take time of the current loop's frame 0
         self.finished = True
         self.startTime = 0
-        self.audioPlaybackProcess = None
-        self.initStrips()
-        self.openFiles(filePath)
-
-    def initStrips(self):
-        strip2GPIO = [18, 19, 21, 10]
-        strip2Channel = [0, 1, 0, 0]  # NOTE: this should be called stripOutputs to avoid confusion with DMX channels
-        for strip in range(self.stripCount):
-            self.strips[strip] = PixelStrip(self.ledCounts[strip],  # PIXEL COUNT
-                                        strip2GPIO[strip],          # DOUT PIN (10 for SPI)
-                                        800000,                     # DOUT FREQUENCY (800khz is standard)
-                                        10,                         # DMA CHANNEL (10 is a safe bet)
-                                        False,                      # DOUT POLARITY (True to invert signal)
-                                        255,                        # LED BRIGHTNESS
-                                        strip2Channel[strip])       # LED OUTPUT
-            self.strips[strip].begin()
-
-    def openFiles(self, path:str):
-        for universe in range(self.universeCount):
-            self.playbackFiles[universe] = open(f"{path}/U{universe}.txt")
+        self.audioEngine = None
+        self.initAudio(audioPath)
+        self.refresher = self.session.createRefresher(maxRate=maxRefreshRate)
+        self.scheduler = FrameScheduler(self.clock, self.playCallback, self.refresher.refreshDirty, self.playFinished)
+        self.openFiles(filePath, tolerance)
 
-    def parseLine(self, universe:int):
-        rawLine = self.playbackFiles[universe].readline()
-        if rawLine == '': return False
-        cleanLine = rawLine.strip().split()
-        frameData = [float(cleanLine[0])]
-        for i in range(1, len(cleanLine)):
-            frameData.append(int(cleanLine[i]))
-        return frameData
-
-    def playCallback(self, universe:int):
-#        print("  playCallback start")
-        if self.finished: return
-        frameData = self.parseLine(universe)
-        if frameData == False:
-            self.playbackDones += 1
-            if self.playbackDones == self.universeCount:
-                print("  no frame data, terminating audio.")
-                self.audioPlaybackProcess.terminate()
-                self.finished = True
+    def initAudio(self, audioPath:str):
+        # TODO: make file name based on LED data save, or based on argument in metadata.txt
+        if audioPath is None: return
+        try:
+            audioFile = wave.open(audioPath, 'rb')
+        except FileNotFoundError:
+            print(f"  Audio file {audioPath} not found! Playing LEDs on the system clock.")
             return
-        for ledCount in range(170):
-            if ledCount >= self.ledCounts[self.universe2strip[universe]]: break
-            dataIndex = (ledCount*3)+1
-            pixColor = Color(frameData[dataIndex], 
-                             frameData[dataIndex+1], 
-                             frameData[dataIndex+2])
-            stripIndex = 170*self.universe2substrip[universe] + ledCount
-            self.strips[self.universe2strip[universe]].setPixelColor(stripIndex, pixColor)
-        self.playbackFrame[universe]+=1
-        # NOTE: this always calls back twice before audio is started, something not quite right
-        # NOTE: is this why audio playback skips tiny bit at start? 
-        frameTimeStamp = frameData[0]
-#        print(f"  {time.time()} - {self.startTime} = ")
-        timeWait = frameTimeStamp - (time.time() - self.startTime)
-#        print(f"  timeWait: {timeWait}")
-        if timeWait < 0: timeWait = 0
-        threading.Timer(timeWait, lambda: self.playCallback(universe)).start()
- #       print("  playCallback done")
+        try:
+            self.audioEngine = AudioEngine(audioFile, self.session.audioDevice())      # the session's PyAudio stays open
+            self.audioEngine.open()
+        except Exception as e:
+            print(f"  Unable to open audio output ({e}), playing LEDs on the system clock.")
+            audioFile.close()
+            self.audioEngine = None
+
+    def openFiles(self, path:str, tolerance:float = TIMELINE_TOLERANCE):
+        if self.cachedTake is not None:
+            self.playbackFiles = self.cachedTake.readers()
+        else:
+            for universe in range(self.universeCount):
+                self.playbackFiles[universe] = openTakeReader(path, universe, self.mapped)
+        self.timeline = buildTimeline(self.playbackFiles, self.activeUniverses, tolerance)
+        print(f"  Timeline: {self.timeline.summary()}")
+
+    def parseLine(self, universe:int):
+        # returns (time stamp, pixel bytes) for the next frame, or False at end of take
+        return self.playbackFiles[universe].readFrame()
+
+    def cue(self, start:float):
+        # readers to the timeline frame showing at start: the record of every universe at or before that frame goes to
+        # cuedFrames, the next one is the universe's record in a later frame
+        timeline = self.timeline
+        index = timeline.frameIndex(start)
+        self.cuedFrames = {}
+        for universe in self.activeUniverses:
+            reader = self.playbackFiles[universe]
+            if index < 0:
+                reader.rewind()
+            else:
+                reader.seek(timeline.frameEnds[index])      # binary search / keyframe index, see takeFormat.py
+            record = self.parseLine(universe)
+            if index >= 0 and record != False and record[0] <= timeline.frameEnds[index]:
+                self.cuedFrames[universe] = record[1]
+                record = self.parseLine(universe)
+            self.nextRecords[universe] = record
+        self.playbackFrame = index + 1
+
+    def loopTimeline(self):
+        # end of the take when looping: frame 0 again, shifted by the loop length
+        for universe in self.activeUniverses:
+            self.playbackFiles[universe].rewind()
+            self.nextRecords[universe] = self.parseLine(universe)
+        self.playbackFrame = 0
+        self.loopCount += 1
+        self.loopOffset += self.loopLength
+        print(f"  loop {self.loopCount}")
+
+    def nextDeadline(self):
+        # take time of the next timeline frame, None at the end of the take
+        timeline = self.timeline
+        if self.playbackFrame >= timeline.frameCount:
+            if not (self.looping and self.loopLength and timeline.frameCount): return None
+            self.loopTimeline()
+        return timeline.frameTimes[self.playbackFrame] + self.loopOffset
+
+    def takeDuration(self):
+        # loop length: the audio length when playing audio (LEDs hold their last frame until it wraps), else the LED take's
+        if self.audioEngine is not None:
+            return self.audioEngine.duration()
+        # 0.0 without any routed universe (or a single frame take): nothing to wrap, play(loop=True) plays it once
+        return max((self.playbackFiles[universe].duration() for universe in self.activeUniverses), default=0.0)
+
+    def playCallback(self, stream:int, now:float):
+        # called by the scheduler when the next timeline frame is due: every universe of the frame is applied in this
+        # one call (refreshed together right after), returns the next frame's time stamp. More than a frame behind,
+        # the due frames are merged and only each universe's newest pixels are routed
+        due = self.cuedFrames
+        self.cuedFrames = {}
+        frameUniverses = self.timeline.frameUniverses
+        nextRecords = self.nextRecords
+        applied = 0
+        deadline = self.nextDeadline()
+        while deadline is not None and deadline <= now:
+            for universe in frameUniverses[self.playbackFrame]:
+                record = nextRecords[universe]
+                if record == False: continue
+                due[universe] = record[1]
+                nextRecords[universe] = self.parseLine(universe)
+            self.playbackFrame += 1
+            applied += 1
+            deadline = self.nextDeadline()
+        if applied > 1: self.scheduler.droppedFrames += applied - 1
+        for universe, pixelData in due.items():
+            self.router.route(universe, pixelData)
+            self.refresher.universeUpdated(universe)
+        return deadline
+
+    def playFinished(self):
+        print(f"  no frame data, stopping audio. {self.scheduler.stats()}")
+        print(f"  {self.refresher.stats()}")
+        if self.audioEngine is not None:
+            self.audioEngine.stop()
+        self.finished = True
+
+    def clock(self):
+        # take time: the audio output (DAC) clock when playing audio, otherwise the system clock
+        if self.audioEngine is not None:
+            return self.audioEngine.clock()
+        return time.time() - self.startTime
 
     def refreshStrips(self):
-        for strip in self.strips:
-            strip.show()
+        # strips are pushed by the scheduler after every batch of frames, this forces a refresh of all of them
+        self.refresher.refreshAll()
 
-    def play(self):
+    def play(self, loop:bool = False, start:float = 0.0):
+        # loop: wrap to frame 0 on the same timeline (audio wraps inside its callback), play() is not called again
+        # start: take time in seconds to start from, the frame showing at that time is output right away
+        self.scheduler.stop()
         self.finished = False
-        self.playbackDones = 0
-        self.startTime = time.time()        # used to be AFTER audioPlaybackProcess, doublecheck this doesn't cause other issues...
-        # TODO: make file name based on LED data save, or based on argument in metadata.txt
-        audioPlaybackArgs = ['./audio/TestAudio.wav', str(self.startTime)]
-        # TODO: make path work for any venv name
-        self.audioPlaybackProcess = subprocess.Popen(['./venv/bin/python3', './code/playbackAudio.py'] + audioPlaybackArgs)
-        #self.startTime = time.time()       # moved above, because otherwise startTime is 0 for playbackAudio, which throws errors when syncing
-        for universe in range(self.universeCount):
-            self.playbackFiles[universe].seek(0)
- #           print("before playCallback")
-            self.playCallback(universe)
- #           print("after playCallback")
+        self.looping = loop
+        self.loopCount = 0
+        if loop and self.loopLength is None:
+            self.loopLength = self.takeDuration()
+            if not self.loopLength:
+                print("  Take has no length to loop, playing it once.")
+        if loop and self.loopLength:
+            start %= self.loopLength
+        start = max(0.0, start)
+        self.loopOffset = 0.0
+        self.cue(start)
+        if loop:
+            for universe in self.activeUniverses:
+                self.playbackFiles[universe].preload()
+        deadline = start if self.cuedFrames else self.nextDeadline()      # the frame showing at start goes out right away
+        self.startTime = time.time() - start
+        if self.audioEngine is not None:
+            self.audioEngine.start(start, loop)   # LED frames wait for the first audio buffer to reach the DAC
+        self.scheduler.start([(deadline, 0)] if deadline is not None else [])
+
+    def seek(self, timeStamp:float):
+        # while playing: continue from timeStamp (LEDs and audio). Stopped: scrub, show the frame at timeStamp
+        if not self.finished:
+            self.play(self.looping, timeStamp)
+            return
+        if self.looping and self.loopLength:
+            timeStamp %= self.loopLength
+        self.cue(timeStamp)
+        for universe, pixelData in self.cuedFrames.items():
+            self.router.route(universe, pixelData)
+            self.refresher.universeUpdated(universe)
+        self.cuedFrames = {}
+        self.refresher.refreshDirty()
 
     def stop(self):
         self.finished = True
-        self.audioPlaybackProcess.terminate()
-
-    def clear(self):                        # TO DO: make this function work for all files
-        for universe in range(self.universeCount):
-            for ledCount in range(170):
-                if ledCount > self.ledCounts[self.universe2strip[universe]]: break
-                dataIndex = (ledCount*3)+1
-                pixColor = Color(0,0,0)
-                stripIndex = 170*self.universe2substrip[universe] + ledCount
-                self.strips[self.universe2strip[universe]].setPixelColor(stripIndex, pixColor)
-        self.refreshStrips()
+        self.scheduler.stop()
+        if self.audioEngine is not None:
+            self.audioEngine.stop()
 
+    def clear(self):
+        self.session.clear()
 
     def deinit(self):
         self.stop()
-        time.sleep(0.2)
         for universe in range(self.universeCount):
             self.playbackFiles[universe].close()
+        if self.audioEngine is not None:
+            self.audioEngine.close()
         self.clear()
+        if self.ownsSession:
+            self.session.close()
 
 
 if __name__ == "__main__":
     playback = LEDPlayback("./saves/liveTest")
-    playback.play()
+    playback.session.installSignalHandlers()
+    playback.play(loop=True)
 
     try:
         while True:
-            playback.refreshStrips()
-            if (playback.finished):
-                print("test looping...")
-                playback.play()                 # loop
+            time.sleep(0.1)
     except (KeyboardInterrupt, SystemExit):
         playback.deinit()
         sys.exit()
-
-#FOR LATER!
-#Make sure to hook a signal handler for SIGKILL to do cleanup. From the handler make sure to call ws2811_fini(). 
-#It'll make sure that the DMA is finished before program execution stops and cleans up after itself.
@@ -1,3 +1,5 @@
+# Standalone audio player (LEDPlayback now plays audio in-process, see audioEngine.py)
+
 import sys
 import time
 import wave
@@ -0,0 +1,113 @@
+import time
+import heapq
+import threading
+
+# Single thread deadline scheduler for playback
+# Keeps a min-heap of (next frame time stamp, stream), sleeps until the earliest one is due, then applies every
+# frame that is due in one batch and refreshes the strips once, instead of one threading.Timer per frame
+# LEDPlayback schedules one stream, its frame aligned timeline (takeTimeline.py), so a frame's universes go out together
+
+SPIN_TIME = 0.001           # coarse sleep until this close to a deadline, then spin for sub-millisecond accuracy
+LATE_THRESHOLD = 0.005      # frames applied later than this after their time stamp count as late
+
+
+class FrameScheduler:
+    def __init__(self, clock, frameCallback, refreshCallback, finishedCallback = None):
+        # clock():                      current take time in seconds
+        # frameCallback(stream, now):   applies the due frame of stream, returns next frame time stamp or None when done
+        # refreshCallback():            pushes the strips after a batch of frames
+        # finishedCallback():           called once every stream is done
+        self.clock = clock
+        self.frameCallback = frameCallback
+        self.refreshCallback = refreshCallback
+        self.finishedCallback = finishedCallback
+        self.deadlines = []
+        self.thread = None
+        self.threaded = True        # False: no thread, the caller drives step() (simulated time in benchAudioSync.py)
+        self.stopEvent = threading.Event()
+        self.resetStats()
+
+    def resetStats(self):
+        self.frameCount = 0         # frames applied
+        self.batchCount = 0         # strip refreshes
+        self.lateFrames = 0         # applied more than LATE_THRESHOLD after their time stamp
+        self.droppedFrames = 0      # skipped because the next frame of that stream was already due (updated by frameCallback)
+        self.maxLateness = 0.0
+        self.offsetSum = 0.0        # clock time after show() - time stamp of the newest frame in the batch (A/V offset
+        self.offsetMax = 0.0        # when the clock is the audio clock)
+        self.firstBatchTime = None  # time.monotonic() after the first refresh: start -> first LED frame latency
+
+    def start(self, deadlines:list):
+        # deadlines: [(first frame time stamp, stream), ...]
+        self.stop()
+        self.resetStats()
+        self.deadlines = list(deadlines)
+        heapq.heapify(self.deadlines)
+        self.stopEvent.clear()
+        if not self.threaded: return
+        self.thread = threading.Thread(target=self.run, name="FrameScheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopEvent.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.thread = None
+
+    def waitUntil(self, deadline:float):
+        while not self.stopEvent.is_set():
+            remaining = deadline - self.clock()
+            if remaining <= 0: return True
+            if remaining > SPIN_TIME:
+                self.stopEvent.wait(remaining - SPIN_TIME)
+            else:
+                time.sleep(0)
+        return False
+
+    def run(self):
+        deadlines = self.deadlines
+        while deadlines:
+            if not self.waitUntil(deadlines[0][0]): return
+            self.runBatch()
+        if self.finishedCallback is not None and not self.stopEvent.is_set():
+            self.finishedCallback()
+
+    def runBatch(self):
+        # applies every frame due on the clock and refreshes the strips once, returns the newest frame's time stamp
+        deadlines = self.deadlines
+        now = self.clock()
+        batchDeadline = deadlines[0][0]
+        while deadlines and deadlines[0][0] <= now:
+            deadline, stream = heapq.heappop(deadlines)
+            batchDeadline = deadline
+            lateness = now - deadline
+            if lateness > LATE_THRESHOLD: self.lateFrames += 1
+            if lateness > self.maxLateness: self.maxLateness = lateness
+            nextDeadline = self.frameCallback(stream, now)
+            self.frameCount += 1
+            if nextDeadline is not None:
+                heapq.heappush(deadlines, (nextDeadline, stream))
+        self.refreshCallback()
+        if self.firstBatchTime is None: self.firstBatchTime = time.monotonic()
+        self.batchCount += 1
+        offset = self.clock() - batchDeadline
+        self.offsetSum += offset
+        if abs(offset) > abs(self.offsetMax): self.offsetMax = offset
+        return batchDeadline
+
+    def step(self):
+        # threaded=False: one pass of the thread's loop without waiting, returns the time stamp of the newest frame
+        # it applied (None if nothing was due). The finished callback runs once the last stream is done
+        if not self.deadlines or self.deadlines[0][0] > self.clock(): return None
+        deadline = self.runBatch()
+        if not self.deadlines and self.finishedCallback is not None:
+            self.finishedCallback()
+        return deadline
+
+    def stats(self):
+        return (f"{self.frameCount} frames in {self.batchCount} refreshes, {self.lateFrames} late, "
+                f"{self.droppedFrames} dropped, max lateness {self.maxLateness*1000:.1f} ms, "
+                f"output offset avg {self.averageOffset()*1000:.1f} ms / max {self.offsetMax*1000:.1f} ms")
+
+    def averageOffset(self):
+        return self.offsetSum/self.batchCount if self.batchCount else 0.0
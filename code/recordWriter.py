@@ -0,0 +1,107 @@
+import time
+import array
+import threading
+from takeFormat import TIMESTAMP_STRUCT, RECORD_SIZE, UNIVERSE_BYTES
+from ingestMetrics import HISTOGRAM_BUCKETS, histogramBucket
+
+# Asynchronous take writer for recording
+# The Art-Net callback only copies the packet into a preallocated ring of take records (push() never touches the disk),
+# a writer thread drains the ring in batches with one writev() per universe file and applies the fsync policy.
+# Single producer (Art-Net receive thread) / single consumer (writer thread): head is only advanced by push(),
+# tail only by the writer, so no lock is needed on the hot path.
+
+class AsyncTakeWriter:
+    def __init__(self, writers:list, slotCount:int = 4096, fsyncInterval:float = None, drainInterval:float = 0.05):
+        # writers:       one BinaryTakeWriter/TextTakeWriter per universe
+        # slotCount:     ring capacity in packets (4096 = ~6 s of 16 universes at 44 Hz, 2.1 MB)
+        # fsyncInterval: None = leave it to the OS, 0 = fsync after every batch, > 0 = at most every fsyncInterval seconds
+        self.writers = writers
+        self.slotCount = slotCount
+        self.ring = bytearray(slotCount * RECORD_SIZE)
+        self.ringView = memoryview(self.ring)
+        self.slotUniverse = array.array("H", [0]) * slotCount
+        self.head = 0               # total packets pushed
+        self.tail = 0               # total packets written
+        self.fsyncInterval = fsyncInterval
+        self.drainInterval = drainInterval
+        self.lastSync = time.monotonic()
+        self.wakeup = threading.Event()
+        self.running = False
+        self.thread = None
+        self.overflowCount = 0      # packets dropped because the ring was full
+        self.highWater = 0          # most packets ever waiting in the ring
+        self.batchCount = 0
+        self.maxBatchTime = 0.0     # longest drain (write + fsync), i.e. worst SD card stall
+        self.batchTimes = [0] * HISTOGRAM_BUCKETS       # drain time histogram, see ingestMetrics.py
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name="AsyncTakeWriter", daemon=True)
+        self.thread.start()
+
+    def push(self, universe:int, timeStamp:float, data:bytes):
+        head = self.head
+        pending = head - self.tail
+        if pending >= self.slotCount:
+            self.overflowCount += 1
+            return
+        if pending >= self.highWater:
+            self.highWater = pending + 1
+        slot = head % self.slotCount
+        offset = slot * RECORD_SIZE
+        ring = self.ring
+        TIMESTAMP_STRUCT.pack_into(ring, offset, timeStamp)
+        start = offset + TIMESTAMP_STRUCT.size
+        count = min(len(data), UNIVERSE_BYTES)
+        ring[start:start+count] = data[:count]
+        if count < UNIVERSE_BYTES:
+            ring[start+count:offset+RECORD_SIZE] = bytes(UNIVERSE_BYTES - count)
+        self.slotUniverse[slot] = universe
+        self.head = head + 1
+        if pending+1 >= self.slotCount // 2:
+            self.wakeup.set()           # don't wait for the drain interval when the ring is filling up
+
+    def drain(self):
+        head = self.head
+        tail = self.tail
+        if head == tail: return
+        batchStart = time.monotonic()
+        batches = [[] for writer in self.writers]
+        ringView = self.ringView
+        slotUniverse = self.slotUniverse
+        for index in range(tail, head):
+            slot = index % self.slotCount
+            offset = slot * RECORD_SIZE
+            batches[slotUniverse[slot]].append(ringView[offset:offset+RECORD_SIZE])
+        for universe, records in enumerate(batches):
+            if records:
+                self.writers[universe].writeBatch(records)
+        if self.fsyncInterval is not None and batchStart - self.lastSync >= self.fsyncInterval:
+            for writer in self.writers:
+                writer.sync()
+            self.lastSync = batchStart
+        self.tail = head
+        self.batchCount += 1
+        batchTime = time.monotonic() - batchStart
+        if batchTime > self.maxBatchTime: self.maxBatchTime = batchTime
+        self.batchTimes[histogramBucket(batchTime)] += 1
+
+    def run(self):
+        while self.running:
+            self.wakeup.wait(self.drainInterval)
+            self.wakeup.clear()
+            self.drain()
+
+    def stop(self):
+        self.running = False
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.thread = None
+        self.drain()
+        for writer in self.writers:
+            writer.close()
+
+    def stats(self):
+        return (f"{self.tail} packets written in {self.batchCount} batches, {self.overflowCount} dropped (ring full), "
+                f"high water {self.highWater}/{self.slotCount} packets, slowest batch {self.maxBatchTime*1000:.1f} ms")
@@ -0,0 +1,205 @@
+import os
+import io
+import json
+import time
+from collections import OrderedDict
+from takeFormat import (readTakeMetadata, readHeader, openTakeReader, takeFormat, takeDataPath, BinaryTakeWriter,
+                        BufferTakeReader, TakeHeader, RECORD_SIZE)
+
+# Take index and in-RAM take cache
+# TakeIndex keeps ./saves/index.json (name, ctime, duration, frame count, universes per save folder) up to date
+# incrementally, so picking a take doesn't glob and stat every folder. TakeCache keeps the packed frames of the most
+# recently used takes in RAM within a byte budget (LRU eviction), so starting a cached take doesn't touch the SD card.
+# Takes generated in memory (pre-rendered effects, see ledEffects.py) are put() in pinned: outside the budget, never
+# evicted, since there is no file to reload them from. Takes larger than the whole budget are never loaded, get()
+# returns None for them and playback streams them from disk.
+
+class TakeIndex:
+    def __init__(self, saveDir:str = "./saves/", indexName:str = "index.json"):
+        self.saveDir = saveDir
+        self.indexPath = os.path.join(saveDir, indexName)
+        self.entries = {}
+        try:
+            with open(self.indexPath) as indexFile:
+                self.entries = json.load(indexFile)
+        except (FileNotFoundError, ValueError):
+            self.entries = {}
+
+    def save(self):
+        tempPath = self.indexPath + ".tmp"
+        with open(tempPath, "w") as indexFile:
+            json.dump(self.entries, indexFile, indent=1)
+        os.replace(tempPath, self.indexPath)
+
+    def scanTake(self, path:str):
+        # frame count and duration of the first universe with frames (takeTools --universes leaves the others empty)
+        metadata = readTakeMetadata(path)
+        dataPath = takeDataPath(path)
+        format = takeFormat(path)
+        duration, frameCount = 0.0, 0
+        for universe in range(metadata.universeCount):
+            reader = openTakeReader(path, universe, mapped=False)
+            duration = reader.duration()
+            if format == "bin":
+                frameCount = (os.path.getsize(takeDataPath(path, universe)) - reader.header.headerSize) // RECORD_SIZE
+            elif format == "delta":
+                frameCount = reader.frameCount
+            else:
+                frameCount = sum(1 for line in reader.file)
+            reader.close()
+            if frameCount: break
+        return {"ctime": os.path.getctime(path),
+                "mtime": os.path.getmtime(dataPath),
+                "duration": duration,
+                "frameCount": frameCount,
+                "universes": metadata.universeCount,
+                "ledCounts": metadata.ledCounts}
+
+    def update(self, name:str):
+        # (re)index a single save folder, e.g. right after recording it
+        path = os.path.join(self.saveDir, name)
+        try:
+            self.entries[name] = self.scanTake(path)
+        except (OSError, ValueError, IndexError) as e:
+            print(f"  Unable to index {path}: {e}")
+            self.entries.pop(name, None)
+        self.save()
+
+    def refresh(self):
+        # one directory listing, only new or modified save folders are parsed
+        changed = False
+        found = set()
+        for entry in os.scandir(self.saveDir):
+            if not entry.is_dir() or not os.path.exists(os.path.join(entry.path, "metadata.txt")): continue
+            found.add(entry.name)
+            known = self.entries.get(entry.name)
+            try:
+                dataPath = takeDataPath(entry.path)
+            except FileNotFoundError:
+                continue
+            if known is not None and os.path.getmtime(dataPath) == known["mtime"]: continue
+            try:
+                self.entries[entry.name] = self.scanTake(entry.path)
+            except (OSError, ValueError, IndexError) as e:
+                print(f"  Unable to index {entry.path}: {e}")
+                continue
+            changed = True
+        for name in list(self.entries):
+            if name not in found:
+                del self.entries[name]
+                changed = True
+        if changed:
+            self.save()
+
+    def newest(self, suffix:str = "_save"):
+        # takes without a frame (recording armed but never triggered) are indexed but never picked
+        names = [name for name in self.entries if name.endswith(suffix) and self.entries[name]["frameCount"]]
+        if not names: return None
+        return os.path.join(self.saveDir, max(names, key=lambda name: self.entries[name]["ctime"]))
+
+
+def packedTakeSize(path:str):
+    # bytes a CachedTake of the save folder would hold, from file sizes and headers without decoding any frame
+    metadata = readTakeMetadata(path)
+    size = 0
+    for universe in range(metadata.universeCount):
+        format = takeFormat(path, universe)
+        dataPath = takeDataPath(path, universe)
+        if format == "bin":
+            size += os.path.getsize(dataPath)
+            continue
+        if format == "delta":
+            reader = openTakeReader(path, universe, mapped=False)      # reads the block index only
+            frameCount = reader.frameCount
+            reader.close()
+        else:
+            frameCount = 0
+            with open(dataPath, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    frameCount += chunk.count(b"\n")
+        size += metadata.headerSize + frameCount*RECORD_SIZE
+    return size
+
+
+def loadUniverse(path:str, metadata:TakeHeader, universe:int):
+    if takeFormat(path, universe) == "bin":
+        with open(f"{path}/U{universe}.bin", "rb") as file:
+            return file.read()
+    # legacy text or delta take: decode once into the packed binary layout
+    packed = io.BytesIO()
+    writer = BinaryTakeWriter(packed, metadata.forUniverse(universe))
+    reader = openTakeReader(path, universe, mapped=False)
+    while True:
+        frameData = reader.readFrame()
+        if frameData == False: break
+        writer.write(*frameData)
+    reader.close()
+    return packed.getvalue()
+
+
+class CachedTake:
+    def __init__(self, metadata:TakeHeader, buffers:list):
+        self.metadata = metadata
+        self.buffers = buffers
+        self.byteSize = sum(len(buffer) for buffer in self.buffers)
+
+    @classmethod
+    def load(cls, path:str):
+        metadata = readTakeMetadata(path)
+        return cls(metadata, [loadUniverse(path, metadata, universe) for universe in range(metadata.universeCount)])
+
+    def readers(self):
+        return [BufferTakeReader(buffer, readHeader(io.BytesIO(buffer))) for buffer in self.buffers]
+
+
+class TakeCache:
+    def __init__(self, byteBudget:int = 64*1024*1024):
+        self.byteBudget = byteBudget
+        self.takes = OrderedDict()      # path -> CachedTake, most recently used last
+        self.pinned = {}                # path -> take put() in with pinned=True
+        self.byteSize = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path:str):
+        path = os.path.normpath(path)
+        take = self.takes.get(path) or self.pinned.get(path)
+        if take is not None:
+            if path in self.takes: self.takes.move_to_end(path)
+            self.hits += 1
+            return take
+        self.misses += 1
+        byteSize = packedTakeSize(path)
+        if byteSize > self.byteBudget:
+            # too big to keep: None, LEDPlayback streams it with openTakeReader (memory-mapped for binary takes)
+            print(f"  {path} is {byteSize/1e6:.1f} MB, over the {self.byteBudget/1e6:.0f} MB take cache, streaming it from disk")
+            return None
+        loadStart = time.perf_counter()
+        take = CachedTake.load(path)
+        print(f"  Loaded {path}: {take.byteSize/1e6:.1f} MB in {time.perf_counter()-loadStart:.2f} s")
+        self.put(path, take)
+        return take
+
+    def put(self, path:str, take, pinned:bool = False):
+        # take: anything with the CachedTake interface (metadata, byteSize, readers())
+        path = os.path.normpath(path)
+        self.evict(path)
+        if pinned:
+            self.pinned[path] = take
+            return
+        self.takes[path] = take
+        self.byteSize += take.byteSize
+        while self.byteSize > self.byteBudget and len(self.takes) > 1:
+            evictedPath, evicted = self.takes.popitem(last=False)
+            self.byteSize -= evicted.byteSize
+            print(f"  Evicted {evictedPath} from take cache")
+
+    def contains(self, path:str):
+        path = os.path.normpath(path)
+        return path in self.takes or path in self.pinned
+
+    def evict(self, path:str):
+        self.pinned.pop(os.path.normpath(path), None)
+        take = self.takes.pop(os.path.normpath(path), None)
+        if take is not None:
+            self.byteSize -= take.byteSize
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# Convert a save folder between the legacy U{n}.txt text format, the packed U{n}.bin format and the keyframe/delta
+# compressed U{n}.dlt format
+#   python3 ./code/takeConvert.py ./saves/2024-01-01-12-00-00_save              (text -> binary)
+#   python3 ./code/takeConvert.py ./saves/2024-01-01-12-00-00_save --to txt     (binary -> text)
+#   python3 ./code/takeConvert.py ./saves/*_save --to delta --remove            (compress, delete the uncompressed files)
+
+import os
+import sys
+import argparse
+from takeFormat import readTakeMetadata, takeFormat, takeDataPath, openTakeReader, openTakeWriter, TAKE_EXTENSIONS
+
+
+def convertTake(path:str, toFormat:str = "bin", removeSource:bool = False):
+    header = readTakeMetadata(path)
+    frameCount = 0
+    sourceBytes, destBytes = 0, 0
+    for universe in range(header.universeCount):
+        fromFormat = takeFormat(path, universe)
+        if fromFormat == toFormat:
+            print(f"  {path} U{universe} is already {toFormat}, skipping")
+            continue
+        sourcePath, destPath = takeDataPath(path, universe), f"{path}/U{universe}.{TAKE_EXTENSIONS[toFormat]}"
+        reader = openTakeReader(path, universe, mapped=False)
+        writer = openTakeWriter(path, universe, header, toFormat)
+        while True:
+            frameData = reader.readFrame()
+            if frameData == False: break
+            writer.write(*frameData)
+            frameCount += 1
+        reader.close()
+        writer.close()
+        sourceBytes += os.path.getsize(sourcePath)
+        destBytes += os.path.getsize(destPath)
+        if removeSource:
+            os.remove(sourcePath)
+    print(f"  Converted {path} to {toFormat}: {header.universeCount} universes, {frameCount} frames, "
+          f"{sourceBytes/1e6:.1f} MB -> {destBytes/1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('saves', nargs='+', help='save folder(s) to convert')
+    parser.add_argument('--to', choices=list(TAKE_EXTENSIONS), default='bin', help='output format (default: bin)')
+    parser.add_argument('--remove', action='store_true', help='delete the source U{n} files after converting')
+    args = parser.parse_args()
+
+    for save in args.saves:
+        try:
+            convertTake(save, args.to, args.remove)
+        except (FileNotFoundError, ValueError) as e:
+            print(f"  Unable to convert {save}: {e}")
+            sys.exit(1)
@@ -0,0 +1,379 @@
+import os
+import mmap
+import array
+import struct
+
+# Take (save folder) formats:
+#   legacy text:  metadata.txt + U{n}.txt, one line per frame: "<time stamp> R G B R G B ..."
+#   binary:       metadata.txt + U{n}.bin, one file per universe:
+#                   header:  magic, version, header size, record size, universe, universe count, strip count,
+#                            then LED counts (uint16 per strip), universe2strip and universe2substrip (uint8 per universe),
+#                            zero padded to header size
+#                   records: float64 time stamp + 510 raw DMX bytes (170 RGB pixels, channels 511/512 not stored)
+#   delta:        metadata.txt + U{n}.dlt, the same header (magic "LEDD") followed by keyframe/delta blocks, see deltaTake.py
+
+TAKE_MAGIC = b"LEDT"
+DELTA_MAGIC = b"LEDD"
+TAKE_EXTENSIONS = {"bin": "bin", "delta": "dlt", "txt": "txt"}      # take format -> U{n} file extension
+TAKE_VERSION = 1
+PIXELS_PER_UNIVERSE = 170
+UNIVERSE_BYTES = PIXELS_PER_UNIVERSE * 3
+TIMESTAMP_STRUCT = struct.Struct("<d")
+RECORD_SIZE = TIMESTAMP_STRUCT.size + UNIVERSE_BYTES
+HEADER_STRUCT = struct.Struct("<4sHHHHHH")
+IOV_MAX = 1024      # max buffers per os.writev() call on Linux
+
+
+class TakeHeader:
+    def __init__(self, ledCounts:list, universe2strip:list, universe2substrip:list, universe:int = 0):
+        self.ledCounts = list(ledCounts)
+        self.universe2strip = list(universe2strip)
+        self.universe2substrip = list(universe2substrip)
+        self.stripCount = len(self.ledCounts)
+        self.universeCount = len(self.universe2strip)
+        self.universe = universe
+        self.headerSize = self.packedSize()
+
+    def packedSize(self):
+        size = HEADER_STRUCT.size + 2*self.stripCount + 2*self.universeCount
+        return (size + 7) & ~7          # keep records 8 byte aligned from the start of the file
+
+    def forUniverse(self, universe:int):
+        return TakeHeader(self.ledCounts, self.universe2strip, self.universe2substrip, universe)
+
+    def pixelCount(self, universe:int):
+        # pixels stored per line by the legacy text recorder (NOTE: ledCounts of the whole strip, not of the universe)
+        return min(PIXELS_PER_UNIVERSE, self.ledCounts[self.universe2strip[universe]])
+
+    def pack(self, magic:bytes = TAKE_MAGIC):
+        raw = HEADER_STRUCT.pack(magic, TAKE_VERSION, self.headerSize, RECORD_SIZE,
+                                 self.universe, self.universeCount, self.stripCount)
+        raw += struct.pack(f"<{self.stripCount}H", *self.ledCounts)
+        raw += bytes(self.universe2strip) + bytes(self.universe2substrip)
+        return raw.ljust(self.headerSize, b"\0")
+
+
+def unpackHeader(raw:bytes):
+    if len(raw) < HEADER_STRUCT.size:
+        raise ValueError(f"Truncated binary LED take header ({len(raw)} bytes)")     # e.g. power cut before the first write
+    magic, version, headerSize, recordSize, universe, universeCount, stripCount = HEADER_STRUCT.unpack_from(raw)
+    if magic != TAKE_MAGIC and magic != DELTA_MAGIC:
+        raise ValueError("Not a binary LED take (bad magic)")
+    if version != TAKE_VERSION or recordSize != RECORD_SIZE:
+        raise ValueError(f"Unsupported binary LED take version {version} (record size {recordSize})")
+    offset = HEADER_STRUCT.size
+    if headerSize < offset + 2*stripCount + 2*universeCount or len(raw) < headerSize:
+        raise ValueError(f"Truncated binary LED take header ({len(raw)} of {headerSize} bytes)")
+    ledCounts = struct.unpack_from(f"<{stripCount}H", raw, offset)
+    offset += 2*stripCount
+    universe2strip = raw[offset:offset+universeCount]
+    universe2substrip = raw[offset+universeCount:offset+2*universeCount]
+    header = TakeHeader(ledCounts, universe2strip, universe2substrip, universe)
+    header.headerSize = headerSize
+    return header
+
+
+def readHeader(file):
+    raw = file.read(HEADER_STRUCT.size)
+    headerSize = HEADER_STRUCT.unpack_from(raw)[2] if len(raw) == HEADER_STRUCT.size else 0
+    raw += file.read(max(0, headerSize - len(raw)))
+    return unpackHeader(raw)
+
+
+def readMetadata(path:str):
+    with open(f"{path}/metadata.txt") as metadataFile:
+        fields = [metadataFile.readline().split("#")[0].strip() for i in range(5)]
+    return TakeHeader([int(x) for x in fields[2].split(", ")],
+                      [int(x) for x in fields[3].split(", ")],
+                      [int(x) for x in fields[4].split(", ")])
+
+
+def writeMetadata(path:str, header:TakeHeader):
+    with open(f"{path}/metadata.txt", "w+") as metadataFile:
+        metadataFile.write(f"{header.universeCount} #UNIVERSE COUNT\n")
+        metadataFile.write(f"{header.stripCount} #STRIP COUNT\n")
+        metadataFile.write(f"{', '.join(str(count) for count in header.ledCounts)} #LED COUNTS\n")
+        metadataFile.write(f"{', '.join(str(strip) for strip in header.universe2strip)} #UNIVERSE 2 STRIP\n")
+        metadataFile.write(f"{', '.join(str(substrip) for substrip in header.universe2substrip)} #UNIVERSE 2 SUBSTRIP\n")
+
+
+def takeFormat(path:str, universe:int = 0):
+    # "bin", "delta" or "txt", from whichever U{n} file the save folder has
+    for format, extension in TAKE_EXTENSIONS.items():
+        if os.path.exists(f"{path}/U{universe}.{extension}"):
+            return format
+    raise FileNotFoundError(f"No take data for universe {universe} in {path}")
+
+
+def takeDataPath(path:str, universe:int = 0):
+    return f"{path}/U{universe}.{TAKE_EXTENSIONS[takeFormat(path, universe)]}"
+
+
+def readTakeMetadata(path:str):
+    if takeFormat(path) != "txt":
+        with open(takeDataPath(path), "rb") as file:
+            return readHeader(file).forUniverse(0)
+    return readMetadata(path)
+
+
+def takeDuration(frameCount:int, firstTimeStamp:float, lastTimeStamp:float):
+    # last time stamp + one average frame interval, i.e. when frame 0 of the next loop is due
+    if frameCount < 2: return lastTimeStamp
+    return lastTimeStamp + (lastTimeStamp - firstTimeStamp)/(frameCount-1)
+
+
+def searchTimeStamp(timeStamp:float, frameCount:int, frameTime):
+    # index of the last frame at or before timeStamp (0 if the take starts later), frameTime(index) -> its time stamp
+    low, high = 0, frameCount
+    while low < high:
+        middle = (low + high) // 2
+        if frameTime(middle) <= timeStamp:
+            low = middle + 1
+        else:
+            high = middle
+    return max(0, low - 1)
+
+
+def parseTextLine(rawLine:str):
+    cleanLine = rawLine.split(" ", 1)
+    pixelData = bytes(int(x) for x in cleanLine[1].split()) if len(cleanLine) > 1 else b""
+    return float(cleanLine[0]), pixelData
+
+
+class BinaryTakeWriter:
+    def __init__(self, filePath, header:TakeHeader):
+        # filePath: path of the U{n}.bin file, or an open binary file object
+        self.file = open(filePath, "wb") if isinstance(filePath, str) else filePath
+        self.file.write(header.pack())
+        self.file.flush()           # a take cut off before its first batch still has a readable header
+        self.record = bytearray(RECORD_SIZE)
+
+    def write(self, timeStamp:float, data):
+        if len(data) == UNIVERSE_BYTES:         # full frame: straight into the file's buffer, no copies
+            self.file.write(TIMESTAMP_STRUCT.pack(timeStamp))
+            self.file.write(data)
+            return
+        record = self.record
+        TIMESTAMP_STRUCT.pack_into(record, 0, timeStamp)
+        pixelData = bytes(data[:UNIVERSE_BYTES])
+        end = TIMESTAMP_STRUCT.size + len(pixelData)
+        record[TIMESTAMP_STRUCT.size:end] = pixelData
+        if end < RECORD_SIZE:
+            record[end:] = bytes(RECORD_SIZE - end)     # short DMX packet, don't keep stale pixels
+        self.file.write(record)
+
+    def writeBatch(self, records:list):
+        # records: packed take records, written with as few syscalls as possible
+        self.file.flush()
+        fileno = self.file.fileno()
+        for start in range(0, len(records), IOV_MAX):
+            chunk = records[start:start+IOV_MAX]
+            written = os.writev(fileno, chunk)
+            total = sum(len(record) for record in chunk)
+            if written < total:
+                # short write (disk full, signal): the rest goes out with plain writes, so records stay aligned
+                # or OSError is raised
+                remaining = memoryview(b"".join(chunk))[written:]
+                while remaining:
+                    remaining = remaining[os.write(fileno, remaining):]
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class TextTakeWriter:
+    def __init__(self, filePath:str, pixelCount:int):
+        self.file = open(filePath, "w+")
+        self.channelCount = pixelCount*3
+
+    def write(self, timeStamp:float, data):
+        channels = " ".join(str(x) for x in data[:self.channelCount])
+        self.file.write(f"{timeStamp} {channels} \n")
+
+    def writeBatch(self, records:list):
+        for record in records:
+            self.write(TIMESTAMP_STRUCT.unpack_from(record)[0], record[TIMESTAMP_STRUCT.size:])
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+class BinaryTakeReader:
+    def __init__(self, filePath:str):
+        self.file = open(filePath, "rb")
+        self.header = readHeader(self.file)
+
+    def rewind(self):
+        self.file.seek(self.header.headerSize)
+
+    def preload(self):
+        pass
+
+    def frameCount(self):
+        return (os.fstat(self.file.fileno()).st_size - self.header.headerSize) // RECORD_SIZE
+
+    def timeStamp(self, index:int):
+        # moves the file position, callers restore it
+        self.file.seek(self.header.headerSize + index*RECORD_SIZE)
+        return TIMESTAMP_STRUCT.unpack(self.file.read(TIMESTAMP_STRUCT.size))[0]
+
+    def duration(self):
+        position = self.file.tell()
+        frameCount = self.frameCount()
+        duration = takeDuration(frameCount, self.timeStamp(0), self.timeStamp(frameCount-1)) if frameCount else 0.0
+        self.file.seek(position)
+        return duration
+
+    def seek(self, timeStamp:float):
+        # next readFrame() returns the frame showing at timeStamp: fixed size records, so a binary search on the file
+        index = searchTimeStamp(timeStamp, self.frameCount(), self.timeStamp)
+        self.file.seek(self.header.headerSize + index*RECORD_SIZE)
+
+    def readFrame(self):
+        record = self.file.read(RECORD_SIZE)
+        if len(record) < RECORD_SIZE: return False
+        return TIMESTAMP_STRUCT.unpack_from(record)[0], memoryview(record)[TIMESTAMP_STRUCT.size:]
+
+    def close(self):
+        self.file.close()
+
+
+class BufferTakeReader:
+    # zero-copy reader over a binary take already in memory: frames are memoryview slices of the buffer
+    def __init__(self, buffer, header:TakeHeader):
+        self.buffer = buffer
+        self.header = header
+        self.view = memoryview(buffer)
+        self.frameCount = (len(buffer) - self.header.headerSize) // RECORD_SIZE
+        self.end = self.header.headerSize + self.frameCount*RECORD_SIZE
+        self.position = self.header.headerSize
+
+    def rewind(self):
+        self.position = self.header.headerSize
+
+    def preload(self):
+        pass
+
+    def timeStamp(self, index:int):
+        return TIMESTAMP_STRUCT.unpack_from(self.buffer, self.header.headerSize + index*RECORD_SIZE)[0]
+
+    def duration(self):
+        if self.frameCount == 0: return 0.0
+        return takeDuration(self.frameCount, self.timeStamp(0), self.timeStamp(self.frameCount-1))
+
+    def seek(self, timeStamp:float):
+        # next readFrame() returns the frame showing at timeStamp
+        self.position = self.header.headerSize + searchTimeStamp(timeStamp, self.frameCount, self.timeStamp)*RECORD_SIZE
+
+    def readFrame(self):
+        position = self.position
+        if position >= self.end: return False
+        self.position = position + RECORD_SIZE
+        return (TIMESTAMP_STRUCT.unpack_from(self.buffer, position)[0],
+                self.view[position+TIMESTAMP_STRUCT.size:position+RECORD_SIZE])
+
+    def close(self):
+        self.view.release()
+
+
+class MappedTakeReader(BufferTakeReader):
+    # frames are memoryview slices straight out of the memory-mapped U{n}.bin file
+    def __init__(self, filePath:str):
+        self.file = open(filePath, "rb")
+        header = readHeader(self.file)
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        super().__init__(self.map, header)
+
+    def preload(self, frames:int = 64):
+        # ask the kernel to page in the head of the take so a loop wrap doesn't wait on the SD card
+        if hasattr(self.map, "madvise"):
+            self.map.madvise(mmap.MADV_WILLNEED, 0, min(len(self.map), self.header.headerSize + frames*RECORD_SIZE))
+
+    def close(self):
+        super().close()
+        try:
+            self.map.close()
+        except BufferError:
+            pass        # frames still referenced somewhere, the map is closed once they are garbage collected
+        self.file.close()
+
+
+class TextTakeReader:
+    def __init__(self, filePath:str):
+        self.file = open(filePath)
+        self.lineTimes = None       # time stamp and byte offset of every line, built on the first seek()
+        self.lineOffsets = None
+
+    def rewind(self):
+        self.file.seek(0)
+
+    def preload(self):
+        pass
+
+    def duration(self):
+        position = self.file.tell()
+        self.file.seek(0)
+        frameCount, first, last = 0, 0.0, 0.0
+        for rawLine in self.file:
+            last = float(rawLine.split(" ", 1)[0])
+            if frameCount == 0: first = last
+            frameCount += 1
+        self.file.seek(position)
+        return takeDuration(frameCount, first, last) if frameCount else 0.0
+
+    def buildIndex(self):
+        # one pass over the file reading only the time stamps (convert the take to binary to skip this)
+        self.lineTimes, self.lineOffsets = array.array("d"), array.array("Q")
+        offset = 0
+        with open(self.file.name, "rb") as rawFile:
+            for rawLine in rawFile:
+                self.lineTimes.append(float(rawLine.split(b" ", 1)[0]))
+                self.lineOffsets.append(offset)
+                offset += len(rawLine)
+
+    def seek(self, timeStamp:float):
+        # next readFrame() returns the frame showing at timeStamp
+        if self.lineTimes is None:
+            self.buildIndex()
+        if not self.lineOffsets:
+            self.file.seek(0)
+            return
+        self.file.seek(self.lineOffsets[searchTimeStamp(timeStamp, len(self.lineTimes), self.lineTimes.__getitem__)])
+
+    def readFrame(self):
+        rawLine = self.file.readline()
+        if rawLine == '': return False
+        return parseTextLine(rawLine)
+
+    def close(self):
+        self.file.close()
+
+
+def openTakeReader(path:str, universe:int, mapped:bool = True):
+    format = takeFormat(path, universe)
+    if format == "bin":
+        if mapped:
+            return MappedTakeReader(f"{path}/U{universe}.bin")
+        return BinaryTakeReader(f"{path}/U{universe}.bin")
+    if format == "delta":
+        from deltaTake import DeltaTakeReader       # deltaTake imports this module
+        return DeltaTakeReader(f"{path}/U{universe}.dlt")
+    return TextTakeReader(f"{path}/U{universe}.txt")
+
+
+def openTakeWriter(path:str, universe:int, header:TakeHeader, format:str = "bin"):
+    # writer for U{universe} of the save folder path in the given take format
+    if format == "txt":
+        return TextTakeWriter(f"{path}/U{universe}.txt", header.pixelCount(universe))
+    if format == "delta":
+        from deltaTake import DeltaTakeWriter
+        return DeltaTakeWriter(f"{path}/U{universe}.dlt", header.forUniverse(universe))
+    return BinaryTakeWriter(f"{path}/U{universe}.bin", header.forUniverse(universe))
@@ -0,0 +1,138 @@
+import array
+import bisect
+import numpy as np
+from takeFormat import BufferTakeReader, TextTakeReader, RECORD_SIZE
+from deltaTake import DeltaTakeReader
+
+# Frame aligned timeline of a take: the per universe U{n} streams merged into one time ordered list of whole frames,
+# so playback applies every universe of a frame in the same tick and refresh (no tearing across a strip whose
+# universes arrived a few ms apart)
+# A frame starts at a universe record and collects the following records of other universes up to tolerance seconds
+# later; a universe showing up twice within the window starts a new frame (counted as a split). The timeline only
+# keeps each frame's start/end time stamps and the universes it holds (interned tuples, every complete frame shares
+# one), the pixels stay in the readers: every record belongs to exactly one frame, so playback reads the next record
+# of each universe of the frame it applies and the readers stay in step with the timeline. O(1) per tick, about 24
+# bytes per frame.
+# Building it reads only the time stamps: a strided view of the buffer for binary takes (mapped or cached), the line
+# index for text takes, the stored frame time stamps (or only the frame headers) for delta takes. Gaps longer than
+# the tolerance always start a frame and split the take into clusters with numpy, only clusters that aren't a single
+# frame (long or repeating a universe) are split in Python.
+
+TIMELINE_TOLERANCE = 0.005      # seconds, universes of one frame sent in a burst arrive well within this
+
+
+def readerTimeStamps(reader):
+    # every frame time stamp of a take reader, leaves it rewound
+    if isinstance(reader, BufferTakeReader):
+        return np.ndarray(reader.frameCount, "<f8", reader.buffer, reader.header.headerSize, (RECORD_SIZE,)).copy()
+    if isinstance(reader, TextTakeReader):
+        if reader.lineTimes is None:
+            reader.buildIndex()
+        return np.array(reader.lineTimes)
+    if isinstance(reader, DeltaTakeReader):
+        return reader.timeStamps()
+    timeStamps = array.array("d")
+    reader.rewind()
+    while True:
+        frameData = reader.readFrame()
+        if frameData == False: break
+        timeStamps.append(frameData[0])
+    reader.rewind()
+    return np.array(timeStamps)
+
+
+class FrameTimeline:
+    def __init__(self, universes:list, tolerance:float = TIMELINE_TOLERANCE):
+        self.universes = list(universes)
+        self.tolerance = tolerance
+        self.frameTimes = array.array("d")      # frame start: when playback applies it
+        self.frameEnds = array.array("d")       # last record of the frame, seek target of a start position
+        self.frameUniverses = []                # universes with a record in the frame (shared tuples)
+        self.universeTuples = {}                # universe bit mask -> tuple
+        self.frameCount = 0
+        self.recordCount = 0
+        self.completeFrames = 0
+        self.splitFrames = 0
+        self.missing = {}                       # universe -> frames without a record of it
+        self.emptyUniverses = []                # universes without any record (e.g. dropped by takeTools --universes)
+
+    def addFrame(self, start:float, end:float, mask:int):
+        universes = self.universeTuples.get(mask)
+        if universes is None:
+            universes = self.universeTuples[mask] = tuple(universe for universe in self.universes if mask >> universe & 1)
+        self.frameTimes.append(start)
+        self.frameEnds.append(end)
+        self.frameUniverses.append(universes)
+
+    def splitCluster(self, timeStamps:list, universes:list):
+        # records of a cluster in time order, frames started by the tolerance or a repeated universe
+        tolerance = self.tolerance
+        start, end, mask = timeStamps[0], timeStamps[0], 0
+        for timeStamp, universe in zip(timeStamps, universes):
+            bit = 1 << universe
+            repeated = mask & bit
+            if repeated or timeStamp - start > tolerance:
+                if repeated and timeStamp - start <= tolerance: self.splitFrames += 1
+                self.addFrame(start, end, mask)
+                start, mask = timeStamp, 0
+            mask |= bit
+            end = timeStamp
+        self.addFrame(start, end, mask)
+
+    def build(self, readers:list):
+        # readers: take readers indexed by universe, only self.universes are read
+        timeStamps = [readerTimeStamps(readers[universe]) for universe in self.universes]
+        times = np.concatenate(timeStamps) if timeStamps else np.zeros(0)
+        universes = np.concatenate([np.full(len(stamps), universe, np.int64) for universe, stamps in zip(self.universes, timeStamps)]) \
+                    if timeStamps else np.zeros(0, np.int64)
+        order = np.lexsort((universes, times))
+        times, universes = times[order], universes[order]
+        recordCount = len(times)
+        if recordCount:
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(times) > self.tolerance) + 1))
+            ends = np.append(starts[1:], recordCount)
+            single = times[ends - 1] - times[starts] <= self.tolerance
+            clusters = np.repeat(np.arange(len(starts)), ends - starts)
+            byUniverse = np.lexsort((universes, clusters))
+            repeats = (clusters[byUniverse][1:] == clusters[byUniverse][:-1]) & (universes[byUniverse][1:] == universes[byUniverse][:-1])
+            single[clusters[byUniverse][1:][repeats]] = False
+            if max(self.universes) < 63:
+                masks = np.bitwise_or.reduceat(np.left_shift(1, universes), starts).tolist()
+            else:
+                single[:] = False           # masks don't fit in int64, every cluster goes through splitCluster
+                masks = None
+            startTimes, endTimes = times[starts].tolist(), times[ends - 1].tolist()
+            for cluster, (start, end, isSingle) in enumerate(zip(starts.tolist(), ends.tolist(), single.tolist())):
+                if isSingle:
+                    self.addFrame(startTimes[cluster], endTimes[cluster], masks[cluster])
+                else:
+                    self.splitCluster(times[start:end].tolist(), universes[start:end].tolist())
+        self.frameCount = len(self.frameTimes)
+        self.recordCount = recordCount
+        self.emptyUniverses = [universe for universe, stamps in zip(self.universes, timeStamps) if not len(stamps)]
+        recorded = [universe for universe in self.universes if universe not in self.emptyUniverses]
+        complete = tuple(recorded)
+        self.completeFrames = sum(1 for universes in self.frameUniverses if universes is complete or universes == complete)
+        counts = np.bincount(universes, minlength=max(self.universes, default=0) + 1) if recordCount else None
+        self.missing = {universe: self.frameCount - int(counts[universe]) for universe in recorded}
+        return self
+
+    def frameIndex(self, timeStamp:float):
+        # last frame starting at or before timeStamp, -1 before the first one
+        return bisect.bisect_right(self.frameTimes, timeStamp) - 1
+
+    def summary(self):
+        partial = self.frameCount - self.completeFrames
+        line = f"{self.frameCount} frames of {len(self.universes)} universes, {self.completeFrames} complete, {partial} partial"
+        if partial:
+            worst = sorted((count, universe) for universe, count in self.missing.items() if count)[::-1][:4]
+            line += " (missing " + ", ".join(f"U{universe} in {count}" for count, universe in worst) + ")"
+        if self.splitFrames:
+            line += f", {self.splitFrames} split (universe repeated within {self.tolerance*1000:.0f} ms)"
+        if self.emptyUniverses:
+            line += ", no records of " + ", ".join(f"U{universe}" for universe in self.emptyUniverses)
+        return line
+
+
+def buildTimeline(readers:list, universes:list, tolerance:float = TIMELINE_TOLERANCE):
+    return FrameTimeline(universes, tolerance).build(readers)
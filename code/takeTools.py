@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# Take post-processing: every tool streams the take through in one pass, constant memory whatever the take size
+#   trim       cut to [--start, --end) seconds and/or drop the dark wait before the first lit frame (--skip-dark),
+#              the take then starts at 0 with every universe's state at the cut. --universes keeps only some universes:
+#              the others are left empty, universe numbers, files and the strip mapping stay as in the source so the
+#              take still routes to the same pixels (playback routes by universe number, see ledConfig.py)
+#   retime     time stamps / --speed (or stretched to --duration seconds) + --offset
+#   resample   fixed --rate frame grid: every tick writes the latest frame of every universe, smooths the irregular
+#              Art-Net arrival times
+#   merge      universes of several takes (e.g. recorded in separate sessions) into one, strips appended in order,
+#              --offsets shifts each source in time
+# Readers of the source universes are merge-joined by time stamp (heapq.merge of per universe generators, records
+# compare as (time stamp, universe) tuples, universes are unique so the pixels are never compared), the
+# (time stamp, universe, pixels) records go through the tool's generator and straight into the writers of a new save
+# folder with a regenerated metadata.txt. The folder is written as <output>.partial and renamed when complete.
+#   python3 ./code/takeTools.py trim ./saves/2024-01-01-12-00-00_save --skip-dark -o ./saves/2024-01-01-12-00-00_trim
+#   python3 ./code/takeTools.py resample ./saves/show_save --rate 40 --to delta -o ./saves/show40_save
+#   python3 ./code/takeTools.py merge ./saves/front_save ./saves/back_save --offsets 0,-1.25 -o ./saves/both_save
+
+import os
+import sys
+import time
+import heapq
+import shutil
+import argparse
+from takeFormat import TakeHeader, readTakeMetadata, openTakeReader, openTakeWriter, writeMetadata, TAKE_EXTENSIONS
+
+
+def parseUniverses(text:str):
+    # "0-3,6" -> [0, 1, 2, 3, 6]
+    universes = []
+    for part in text.split(","):
+        first, _, last = part.partition("-")
+        universes.extend(range(int(first), int(last or first) + 1))
+    return sorted(set(universes))
+
+
+def mergeHeaders(headers:list):
+    # universes and strips of every header in order, universe2strip shifted past the strips before it (255: universe
+    # feeds no strip). universe2substrip counts within a strip, so it carries over as is
+    ledCounts, universe2strip, universe2substrip = [], [], []
+    for header in headers:
+        universe2strip += [strip + len(ledCounts) if strip != 255 else 255 for strip in header.universe2strip]
+        universe2substrip += header.universe2substrip
+        ledCounts += header.ledCounts
+    return TakeHeader(ledCounts, universe2strip, universe2substrip)
+
+
+def universeRecords(reader, universe:int, offset:float = 0.0):
+    while True:
+        frameData = reader.readFrame()
+        if frameData == False: return
+        yield frameData[0] + offset, universe, frameData[1]
+
+
+def takeRecords(path:str, universes:list = None, firstUniverse:int = 0, offset:float = 0.0, start:float = None):
+    # (time stamp, universe, pixels) of the take's universes in time stamp order (ties in universe order), universe u
+    # comes out as firstUniverse + u. With start every universe begins at its frame showing at start
+    if universes is None:
+        universes = range(readTakeMetadata(path).universeCount)
+    readers = [openTakeReader(path, universe, mapped=False) for universe in universes]
+    if start:
+        for reader in readers:
+            reader.seek(start)
+    try:
+        yield from heapq.merge(*[universeRecords(reader, firstUniverse + universe, offset) for universe, reader in zip(universes, readers)])
+    finally:
+        for reader in readers:
+            reader.close()
+
+
+def sourceDuration(path:str, universes:list = None):
+    if universes is None:
+        universes = range(readTakeMetadata(path).universeCount)
+    duration = 0.0
+    for universe in universes:
+        reader = openTakeReader(path, universe, mapped=False)
+        duration = max(duration, reader.duration())
+        reader.close()
+    return duration
+
+
+def trim(records, universeCount:int, start:float = 0.0, end:float = None, skipDark:bool = False):
+    # records from start (or the first lit frame after it with skipDark) up to end, moved to start at 0. The last
+    # frame of every universe before the cut is written at 0 so the trimmed take starts with the full picture
+    state = [None] * universeCount
+    started = False
+    for timeStamp, universe, data in records:
+        if not started:
+            if timeStamp < start or (skipDark and not any(data)):
+                state[universe] = bytes(data)
+                continue
+            start = timeStamp if skipDark else start
+            started = True
+            for stateUniverse, stateData in enumerate(state):
+                if stateData is not None: yield 0.0, stateUniverse, stateData
+        if end is not None and timeStamp >= end: return
+        yield timeStamp - start, universe, data
+
+
+def retime(records, speed:float = 1.0, offset:float = 0.0):
+    for timeStamp, universe, data in records:
+        yield timeStamp/speed + offset, universe, data
+
+
+def resample(records, universeCount:int, rate:float):
+    # every 1/rate seconds (from the first frame's tick) the latest frame at or before the tick of every universe
+    # seen so far. Tick times are index/rate so long takes don't drift
+    state = [None] * universeCount
+    tick = None
+    dirty = False
+    for timeStamp, universe, data in records:
+        if tick is None:
+            tick = int(timeStamp * rate)
+        while tick / rate < timeStamp:          # every frame at or before the tick is in the state
+            tickTime = tick / rate
+            for stateUniverse, stateData in enumerate(state):
+                if stateData is not None: yield tickTime, stateUniverse, stateData
+            tick += 1
+            dirty = False
+        state[universe] = bytes(data)
+        dirty = True
+    if dirty:
+        for stateUniverse, stateData in enumerate(state):
+            if stateData is not None: yield tick / rate, stateUniverse, stateData
+
+
+def writeTake(path:str, header:TakeHeader, records, format:str = "bin"):
+    # streams the records into a new save folder at path, returns the number of frames written
+    partialPath = path.rstrip("/") + ".partial"
+    if os.path.exists(path) or os.path.exists(partialPath):
+        raise FileExistsError(f"{path} already exists")
+    os.mkdir(partialPath)
+    frameCount = 0
+    writers = []
+    try:
+        writers = [openTakeWriter(partialPath, universe, header, format) for universe in range(header.universeCount)]
+        for timeStamp, universe, data in records:
+            writers[universe].write(timeStamp, data)
+            frameCount += 1
+        for writer in writers:
+            writer.close()
+        writeMetadata(partialPath, header)      # last, so a half written take is never indexed
+    except BaseException:
+        for writer in writers:
+            writer.close()
+        shutil.rmtree(partialPath)
+        raise
+    os.rename(partialPath, path)
+    return frameCount
+
+
+def takeSize(path:str):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    tools = parser.add_subparsers(dest="tool", required=True)
+    trimParser = tools.add_parser("trim", help="cut a take to a time range")
+    trimParser.add_argument('--start', type=float, default=0.0, help='seconds')
+    trimParser.add_argument('--end', type=float, default=None, help='seconds (source time stamps)')
+    trimParser.add_argument('--skip-dark', action='store_true', help='start at the first frame with a lit pixel')
+    retimeParser = tools.add_parser("retime", help="scale and shift the time stamps")
+    speed = retimeParser.add_mutually_exclusive_group()
+    speed.add_argument('--speed', type=float, default=1.0, help='playback speed factor')
+    speed.add_argument('--duration', type=float, default=None, help='stretch the take to this many seconds')
+    retimeParser.add_argument('--offset', type=float, default=0.0, help='seconds added after scaling')
+    resampleParser = tools.add_parser("resample", help="resample to a fixed frame rate")
+    resampleParser.add_argument('--rate', type=float, default=40.0, help='frames/s')
+    mergeParser = tools.add_parser("merge", help="combine the universes of several takes")
+    mergeParser.add_argument('--offsets', default=None, help='comma separated seconds added to each source')
+    for toolParser in (trimParser, retimeParser, resampleParser):
+        toolParser.add_argument('source', help='save folder')
+        toolParser.add_argument('--universes', default=None, help='only these source universes, e.g. 0-3,6')
+    mergeParser.add_argument('sources', nargs='+', help='save folders, universes in this order')
+    for toolParser in (trimParser, retimeParser, resampleParser, mergeParser):
+        toolParser.add_argument('-o', '--output', required=True, help='new save folder')
+        toolParser.add_argument('--to', choices=list(TAKE_EXTENSIONS), default='bin', help='output format (default: bin)')
+    args = parser.parse_args()
+
+    try:
+        if args.tool == "merge":
+            sources = args.sources
+            offsets = [float(offset) for offset in args.offsets.split(",")] if args.offsets else [0.0]*len(sources)
+            if len(offsets) != len(sources):
+                raise ValueError(f"{len(offsets)} offsets for {len(sources)} sources")
+            headers = [readTakeMetadata(source) for source in sources]
+            header = mergeHeaders(headers)
+            firstUniverses = [sum(source.universeCount for source in headers[:index]) for index in range(len(sources))]
+            records = heapq.merge(*[takeRecords(source, None, firstUniverse, offset)
+                                    for source, firstUniverse, offset in zip(sources, firstUniverses, offsets)])
+        else:
+            sources = [args.source]
+            header = readTakeMetadata(args.source)
+            universes = parseUniverses(args.universes) if args.universes else list(range(header.universeCount))
+            if max(universes) >= header.universeCount:
+                raise ValueError(f"{args.source} only has {header.universeCount} universes")
+            records = takeRecords(args.source, universes, start=args.start if args.tool == "trim" else None)
+            if args.tool == "trim":
+                records = trim(records, header.universeCount, args.start, args.end, args.skip_dark)
+            elif args.tool == "retime":
+                speed = args.speed
+                if args.duration is not None:
+                    speed = sourceDuration(args.source, universes) / args.duration
+                if speed <= 0:
+                    raise ValueError("the speed must be positive")
+                records = retime(records, speed, args.offset)
+            else:
+                if args.rate <= 0:
+                    raise ValueError("the rate must be positive")
+                records = resample(records, header.universeCount, args.rate)
+        start = time.perf_counter()
+        frameCount = writeTake(args.output, header, records, args.to)
+        elapsed = max(1e-9, time.perf_counter() - start)
+        sourceBytes = sum(takeSize(source) for source in sources)
+        print(f"  Wrote {args.output}: {header.universeCount} universes, {frameCount} frames, "
+              f"{sourceBytes/1e6:.1f} MB -> {takeSize(args.output)/1e6:.1f} MB in {elapsed:.1f} s ({frameCount/elapsed:.0f} frames/s)")
+    except (FileNotFoundError, FileExistsError, ValueError) as e:
+        print(f"  Unable to {args.tool}: {e}")
+        sys.exit(1)